@@ -1,5 +1,12 @@
 """description:
-  Link entities using SpaCy opentapioca, pywikibot and a match file.
+  Link entities using SpaCy opentapioca, Wikidata and a match file.
+
+  Wikidata is queried concurrently and its responses are cached, see
+  wikidata_client.py. Short mentions are resolved to longer ones with the
+  index of mention_index.py. What opentapioca found in each file is recorded
+  in a journal (link_journal.py) as soon as the file is done, so that a run
+  can be resumed (--resume) or only new and changed files linked
+  (--incremental).
 """
 
 import spacy
@@ -13,35 +20,12 @@ import spacy
 from lxml import etree
 import collections
 
-import pywikibot
-from pywikibot.data import api
-from wikidataintegrator import wdi_core
+from link_journal import LinkJournal, file_digest
+from mention_index import MentionIndex, is_short, expand_aliases
+from wikidata_client import WikidataClient, WIKIDATA_API
 
 
-__wikidata_site = pywikibot.Site("wikidata", "wikidata")
-
-
-def query_wikidata(name, lang, limit=10):
-    """Query Wikidata to fetch information about a term."""
-
-    params = {
-        'action': 'wbsearchentities' ,
-        'format': 'json',
-        'language': lang,
-        'type' : 'item',
-        'search': name,
-        "limit": limit
-    }
-    request = api.Request(site=__wikidata_site, parameters=params)
-    return request.submit()
-
-
-def from_qid(qid):
-    """Return the Wikidata entry given the Wikidata identifier (QID) given in argument."""
-
-    entry = wdi_core.WDItemEngine(wd_item_id=qid).get_wd_json_representation()
-    entry["id"] = qid
-    return entry
+xmlns = "http://www.tei-c.org/ns/1.0"
 
 
 def wikidata_properties(item):
@@ -89,10 +73,33 @@ def simplify_name(name):
     return name
 
 
-def main(inputdir, outputdir, candidatefile, minidumpfile, match_file):
+def iter_gold_sentences(inputfiles, trees, records):
+    """Yield the (text, (file, gold entities)) pairs of the sentences with
+    <Entity> tags of the XML files given in argument. Each file is parsed
+    once, its tree is kept in trees and an empty record of its mentions is
+    added to records."""
+
+    for inputfile in tqdm(inputfiles):
+        root = etree.parse(str(inputfile))
+        trees[inputfile] = root
+        records[inputfile] = {"found": {}, "remaining": set()}
+        for sentence in root.iterfind(f".//{{{xmlns}}}s"):
+            entities_gold = set(node.text for node in sentence.iterfind(f"{{{xmlns}}}Entity"))
+
+            if not entities_gold:
+                continue
+
+            text = normalize(etree.tostring(sentence, method="text", encoding="utf-8").decode("utf-8").strip())
+            yield text, (inputfile, entities_gold)
+
+
+def main(
+    inputdir, outputdir, candidatefile, minidumpfile, match_file, cache="wikidata-cache.sqlite3",
+    wikidata_api=WIKIDATA_API, workers=8, rate=10.0, batch_size=64, validate=False, knowledge_base=None,
+    journal="link-entities-journal.sqlite3", resume=False, incremental=False,
+):
     inputpath = pathlib.Path(inputdir)
     outputpath = pathlib.Path(outputdir)
-    xmlns = "http://www.tei-c.org/ns/1.0"
 
     try:
         outputpath.mkdir()
@@ -112,60 +119,96 @@ def main(inputdir, outputdir, candidatefile, minidumpfile, match_file):
 
     nlp = spacy.blank('fr')
     nlp.add_pipe('opentapioca')
+    wikidata = WikidataClient(cache, api_url=wikidata_api, max_workers=workers, rate=rate)
+    link_journal = LinkJournal(journal)
 
     minidump = []
     candidate_entries = {}
-    for inputfile in tqdm(sorted(inputpath.glob("*.xml"))):
-        root = etree.parse(str(inputfile))
-        for sentence in root.iterfind(f".//{{{xmlns}}}s"):
-            common = set()
-            entities_gold = set(node.text for node in sentence.iterfind(f"{{{xmlns}}}Entity"))
-
-            if not entities_gold:
+    known = {}  # mention -> QID, from the aliases of the knowledge base
+    if knowledge_base:
+        with open(knowledge_base) as input_stream:
+            kb = json.load(input_stream)
+        known = {
+            alias: kb["qids"][name] for alias, name in expand_aliases(kb["aliases"]).items() if name in kb["qids"]
+        }
+
+    # files whose record in the journal is up to date are not linked again
+    inputfiles = sorted(inputpath.glob("*.xml"))
+    digests = {inputfile: file_digest(inputfile) for inputfile in inputfiles}
+    linked = {}  # input file -> (found, remaining) mentions
+    if resume or incremental:
+        for inputfile in inputfiles:
+            record = link_journal.get(inputfile.name, digests[inputfile])
+            if record is not None:
+                linked[inputfile] = record
+        print(f"journal: {len(linked)} of {len(inputfiles)} files already linked")
+    to_link = [inputfile for inputfile in inputfiles if inputfile not in linked]
+
+    trees = {}  # input file -> parsed XML, annotated then written
+    records = {}  # input file -> mentions of the files being linked
+
+    def checkpoint(until=None):
+        # records are in the order of the files, those before until are complete
+        for inputfile in list(records):
+            if inputfile == until:
+                break
+            record = records.pop(inputfile)
+            found, remaining = record["found"], sorted(record["remaining"])
+            link_journal.put(inputfile.name, digests[inputfile], found, remaining)
+            linked[inputfile] = (found, remaining)
+
+    sentences = iter_gold_sentences(to_link, trees, records)
+    for document, (inputfile, entities_gold) in nlp.pipe(sentences, as_tuples=True, batch_size=batch_size):
+        checkpoint(until=inputfile)
+        record = records[inputfile]
+        common = set()
+        for entity in document.ents:
+            if entity.text in entities_gold:
+                print("found:", entity, entity.text, entity.kb_id_, entity.label_, entity._.description)
+                common.add(entity.text)
+                record["found"][entity.text] = entity.kb_id_
+        record["remaining"].update(entities_gold - common)
+    checkpoint()
+
+    to_search = {}  # mention -> search term, searched once every file is read
+    for inputfile in inputfiles:
+        candidate_entries.update((mention, [qid]) for mention, qid in linked[inputfile][0].items())
+    for inputfile in inputfiles:
+        for rem in linked[inputfile][1]:
+            if rem in candidate_entries or rem in to_search:
                 continue
-
-            text = normalize(etree.tostring(sentence, method="text", encoding="utf-8").decode("utf-8").strip())
-            entities_OT = nlp(text).ents
-
-            for entity in entities_OT:
-                if entity.text in entities_gold:
-                    print("found:", entity, entity.text, entity.kb_id_, entity.label_, entity._.description)
-                    common.add(entity.text)
-                    candidate_entries[entity.text] = [entity.kb_id_]
-
-            remaining = entities_gold - common - set(candidate_entries.keys())
-            for rem in remaining:
-                mention = simplify_name(rem)
-                print("remaining:", rem, "==>", mention)
-                candidates = []
-                for lang in ["fr", "it", "en"]:
-                    candidates = query_wikidata(mention, lang)["search"]
-                    if candidates:
-                        break
-                if candidates:
-                    candidate_entries[rem] = [item["id"] for item in candidates]
-                else:
-                    candidate_entries[rem] = ["NIL"]
+            if rem in known:
+                candidate_entries[rem] = [known[rem]]
+                continue
+            mention = simplify_name(rem)
+            print("remaining:", rem, "==>", mention)
+            to_search[rem] = mention
 
     # always adding true names so you can safely look for matches later on
     for truename in sorted(set(pseudo2name.values())):
-        if truename in candidate_entries:
+        if truename in candidate_entries or truename in to_search:
             continue
         print("searching", truename)
-        candidates = []
-        for lang in ["fr", "it", "en"]:
-            candidates = query_wikidata(mention, lang)["search"]
-            if candidates:
-                break
+        to_search[truename] = truename
+
+    # mentions found by opentapioca in a later sentence keep its candidate
+    to_search = {mention: term for mention, term in to_search.items() if mention not in candidate_entries}
+    with tqdm(total=len(set(to_search.values())), desc="searching") as progress_bar:
+        results = wikidata.search_many(to_search.values(), progress=lambda term: progress_bar.update())
+    for mention, term in to_search.items():
+        candidates = results[term]
         if candidates:
-            candidate_entries[truename] = [item["id"] for item in candidates]
+            candidate_entries[mention] = [item["id"] for item in candidates]
         else:
-            candidate_entries[truename] = ["NIL"]
+            candidate_entries[mention] = ["NIL"]
 
+    ambiguous = [candidate_ids for candidate_ids in candidate_entries.values() if len(candidate_ids) > 1]
+    entries = wikidata.entities(qid for candidate_ids in ambiguous for qid in candidate_ids)
+    print(f"wikidata: {wikidata.requests} requests, {wikidata.cache_hits} cached responses")
     for mention, candidate_ids in list(candidate_entries.items()):
         if len(candidate_ids) == 1:
             continue
-        candidates = [from_qid(candidate_id) for candidate_id in candidate_ids]
+        candidates = [entries[candidate_id] for candidate_id in candidate_ids if candidate_id in entries]
         candidates = [item for item in candidates if is_human(item) and (wikidata_occupations(item) & TARGET_OCCUPATIONS)]
         if candidates:
             candidate_entries[mention] = [item["id"] for item in candidates]
@@ -176,21 +219,14 @@ def main(inputdir, outputdir, candidatefile, minidumpfile, match_file):
     # Short mentions (name or initial+name) have a higher risk of being mislabeled by opentapioca.
     # Since we are in a very restricted case, we try to link together short mentions with longer ones.
     # When we find a match, we simply transfert the candidate ids of the longer mention to the shorter one.
-    errorprone_mentions = set(mention for mention in candidate_entries if ' ' not in mention or mention[1] == ".")
-    safe_mentions = set(candidate_entries.keys()) - errorprone_mentions
+    # Longer mentions are indexed by surname and initial+surname, the first one in sorted order is used.
+    errorprone_mentions = sorted(mention for mention in candidate_entries if is_short(mention))
+    safe_index = MentionIndex(mention for mention in candidate_entries if not is_short(mention))
     for errorprone in errorprone_mentions:
-        ep_tokens = errorprone.lower().split()
-        for safe in safe_mentions:
-            s_tokens = safe.lower().split()
-            if ep_tokens[-1] == s_tokens[-1]:
-                if len(ep_tokens) == 1:
-                    print("1", errorprone, "=", safe)
-                    candidate_entries[errorprone] = candidate_entries[safe][:]
-                    break
-                elif errorprone[0] == safe[0]:
-                    print("2", errorprone, "=", safe)
-                    candidate_entries[errorprone] = candidate_entries[safe][:]
-                    break
+        safe = safe_index.resolve(errorprone)
+        if safe is not None:
+            print("1" if " " not in errorprone else "2", errorprone, "=", safe)
+            candidate_entries[errorprone] = candidate_entries[safe][:]
 
     for mention in candidate_entries:
         match = pseudo2name.get(mention)
@@ -198,6 +234,19 @@ def main(inputdir, outputdir, candidatefile, minidumpfile, match_file):
             print("found match!", mention, "<->", match)
             candidate_entries[mention] = candidate_entries[match]
 
+    # the entries of the previous runs are kept, so that the files already written stay consistent
+    if incremental and pathlib.Path(candidatefile).exists():
+        with open(candidatefile) as input_stream:
+            previous_entries = json.load(input_stream)
+        for mention, candidate_ids in candidate_entries.items():
+            previous_entries.setdefault(mention, candidate_ids)
+        candidate_entries = previous_entries
+    if incremental and pathlib.Path(minidumpfile).exists():
+        with open(minidumpfile) as input_stream:
+            previous_items = json.load(input_stream)
+        fetched = set(item["id"] for item in minidump)
+        minidump.extend(item for item in previous_items if item["id"] not in fetched)
+
     with open(candidatefile, "w") as output_stream:
         json.dump(candidate_entries, output_stream, indent=1)
 
@@ -217,19 +266,22 @@ def main(inputdir, outputdir, candidatefile, minidumpfile, match_file):
             json.dump(item, output_stream)
         output_stream.write("\n]\n")
 
-    for inputfile in tqdm(sorted(inputpath.glob("*.xml"))):
-        outfile = pathlib.Path(outputdir) / inputfile.name
-        root = etree.parse(str(inputfile))
+    # in incremental mode, only the files linked by this run are written
+    to_write = to_link if incremental else inputfiles
+    for inputfile in tqdm(to_write):
+        outfile = outputpath / inputfile.name
+        root = trees.pop(inputfile) if inputfile in trees else etree.parse(str(inputfile))
         for sentence in root.iterfind(f".//{{{xmlns}}}s"):
             for node in sentence.iterfind(f"{{{xmlns}}}Entity"):
                 wikidata_id = candidate_entries[node.text][0]
                 node.attrib["annotation"] = "PER"
                 node.attrib["wikidata_id"] = wikidata_id
 
-        with open(outfile, "w") as output_stream:
-            output_stream.write(etree.tostring(root, pretty_print=True, encoding="utf-8").decode("utf-8"))
+        root.write(str(outfile), pretty_print=True, encoding="utf-8")
+        if validate:
+            etree.parse(str(outfile))
 
-        etree.parse(str(outfile))
+    link_journal.close()
 
 
 if __name__ == "__main__":
@@ -260,6 +312,60 @@ if __name__ == "__main__":
         "-m", "--match-file",
         help="The file where some [pseudonym -> name] matches are given (.json)."
     )
+    parser.add_argument(
+        "-c", "--cache",
+        default="wikidata-cache.sqlite3",
+        help="The file where Wikidata responses are cached (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--wikidata-api",
+        default=WIKIDATA_API,
+        help="The URL of the Wikidata API, for instance of a local stub server (default: %(default)s)."
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=8,
+        help="The number of concurrent requests to Wikidata (default: %(default)s)."
+    )
+    parser.add_argument(
+        "-k", "--knowledge-base",
+        help="A knowledge base (mdf-knowledge-base.json) whose aliases, and their short forms, are linked"
+             " to its QIDs without querying Wikidata."
+    )
+    parser.add_argument(
+        "-j", "--journal",
+        default="link-entities-journal.sqlite3",
+        help="The SQLite file where the mentions of each linked file are recorded (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Do not link again the files recorded in the journal that did not change since."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Like --resume, only write the new or changed files and merge their entries into the existing"
+             " candidate file and minidump."
+    )
+    parser.add_argument(
+        "-b", "--batch-size",
+        type=int,
+        default=64,
+        help="The number of sentences given to opentapioca at once (default: %(default)s)."
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Parse the output files again once written, to check them."
+    )
+    parser.add_argument(
+        "-r", "--rate",
+        type=float,
+        default=10.0,
+        help="The maximum number of requests per second to Wikidata (default: %(default)s)."
+    )
     args = parser.parse_args()
 
     main(**vars(args))
@@ -0,0 +1,64 @@
+"""description:
+  A journal of the linking of the XML files of a corpus, kept in a SQLite
+  file so that a run that stops can be resumed and new issues can be linked
+  without linking the whole corpus again.
+
+  For each file, the journal keeps the SHA-256 of its content, the mentions
+  opentapioca linked in it ({mention: QID}) and the mentions it did not link.
+  A record is only reused if the file did not change since. The responses of
+  Wikidata are kept by the cache of wikidata_client.py.
+"""
+
+import hashlib
+import json
+import sqlite3
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Return the SHA-256 of the content of the file given in argument."""
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as input_stream:
+        for chunk in iter(lambda: input_stream.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LinkJournal:
+    """
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        the SQLite file of the journal.
+    """
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(str(path), timeout=30)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files"
+            " (name TEXT PRIMARY KEY, digest TEXT NOT NULL, found TEXT NOT NULL, remaining TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, name, digest):
+        """Return the (found, remaining) mentions of the file name, None if it
+        is not in the journal or if its digest changed."""
+
+        row = self._connection.execute(
+            "SELECT found, remaining FROM files WHERE name = ? AND digest = ?", (name, digest)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, name, digest, found, remaining):
+        """Record the mentions of the file name, committed at once."""
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (name, digest, json.dumps(found), json.dumps(remaining)),
+        )
+        self._connection.commit()
@@ -0,0 +1,87 @@
+"""description:
+  Resolution of short person mentions (surname alone, or initial and surname)
+  to the full mentions they abbreviate.
+
+  Full mentions are indexed by their lowercased last token and by their first
+  letter and lowercased last token, so that resolving a short mention is a
+  dictionary lookup. Full mentions sharing a key are kept sorted, which makes
+  the resolution deterministic.
+"""
+
+import bisect
+
+
+def is_short(mention):
+    """Whether mention is a surname alone ("Aganoor") or an initial and a
+    surname ("V. Aganoor")."""
+
+    return " " not in mention or mention[1] == "."
+
+
+def short_forms(mention):
+    """Return the short forms of a full mention: its initial and surname, then
+    its surname alone."""
+
+    surname = mention.split()[-1]
+    return [f"{mention[0]}. {surname}", surname]
+
+
+class MentionIndex:
+    """
+    Parameters
+    ----------
+    mentions : iterable of str
+        the full mentions to index.
+    """
+
+    def __init__(self, mentions=()):
+        self._by_surname = {}
+        self._by_initial = {}
+        for mention in mentions:
+            self.add(mention)
+
+    def add(self, mention):
+        surname = mention.lower().split()[-1]
+        for index, key in ((self._by_surname, surname), (self._by_initial, (mention[0], surname))):
+            full_mentions = index.setdefault(key, [])
+            position = bisect.bisect_left(full_mentions, mention)
+            if position == len(full_mentions) or full_mentions[position] != mention:
+                full_mentions.insert(position, mention)
+
+    def candidates(self, short):
+        """Return the sorted full mentions the short mention given in argument
+        may abbreviate."""
+
+        tokens = short.lower().split()
+        if len(tokens) == 1:
+            return self._by_surname.get(tokens[0], [])
+        return self._by_initial.get((short[0], tokens[-1]), [])
+
+    def resolve(self, short):
+        """Return the first full mention the short mention given in argument
+        may abbreviate, None if there is none."""
+
+        candidates = self.candidates(short)
+        return candidates[0] if candidates else None
+
+
+def expand_aliases(aliases):
+    """Return the aliases of a knowledge base ({alias: name}) with the short
+    forms of its full aliases added, when they do not already exist and all
+    the full aliases they may abbreviate refer to the same name.
+
+    For example, "Vittoria Aganoor-Pompily" adds "V. Aganoor-Pompily" and
+    "Aganoor-Pompily".
+    """
+
+    index = MentionIndex(alias for alias in aliases if not is_short(alias))
+    expanded = dict(aliases)
+    for alias in sorted(aliases):
+        if is_short(alias):
+            continue
+        for short in short_forms(alias):
+            if short in expanded:
+                continue
+            if len(set(aliases[full] for full in index.candidates(short))) == 1:
+                expanded[short] = aliases[alias]
+    return expanded
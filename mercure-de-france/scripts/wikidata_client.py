@@ -0,0 +1,192 @@
+"""description:
+  Concurrent and cached access to the Wikidata API: entity search
+  (wbsearchentities) and entity data (wbgetentities).
+
+  Requests run on a bounded pool of threads and are rate limited. Responses
+  are kept in a SQLite cache, keyed by (search term, language, limit) for
+  searches and by QID for entities, so that running a script again does not
+  query Wikidata for what it already fetched. Empty results are cached too.
+
+  The API URL can be changed, for example to a local stub server.
+"""
+
+import concurrent.futures
+import json
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+WIKIDATA_API = "https://www.wikidata.org/w/api.php"
+USER_AGENT = "minerva-link-entities/1.0 (https://github.com/YoannDupont/minerva)"
+MAX_IDS = 50  # per wbgetentities request
+
+
+class RateLimiter:
+    """Let at most rate calls of wait() return per second, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class WikidataClient:
+    """
+    Parameters
+    ----------
+    cache_path : str or pathlib.Path
+        the SQLite file where responses are cached (":memory:" for no
+        persistent cache).
+    api_url : str
+        the URL of the MediaWiki API of Wikidata.
+    max_workers : int
+        the number of requests sent at the same time.
+    rate : float
+        the maximum number of requests per second (0 for no limit).
+    retries : int
+        the number of times a request is sent again after a network error or
+        a 429/5xx status, waiting longer each time.
+    """
+
+    def __init__(self, cache_path, api_url=WIKIDATA_API, max_workers=8, rate=10.0, retries=3, timeout=30):
+        self.api_url = api_url
+        self.max_workers = max_workers
+        self.retries = retries
+        self.timeout = timeout
+        self.requests = 0
+        self.cache_hits = 0
+        self._limiter = RateLimiter(rate)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(cache_path), timeout=30, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS searches"
+            " (term TEXT NOT NULL, lang TEXT NOT NULL, lim INTEGER NOT NULL, results TEXT NOT NULL,"
+            " PRIMARY KEY (term, lang, lim))"
+        )
+        self._connection.execute("CREATE TABLE IF NOT EXISTS entities (qid TEXT PRIMARY KEY, entity TEXT NOT NULL)")
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+    def _get(self, params):
+        """Return the JSON response of the API to the parameters given in
+        argument."""
+
+        url = f"{self.api_url}?{urllib.parse.urlencode({**params, 'format': 'json'})}"
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        for attempt in range(self.retries + 1):
+            self._limiter.wait()
+            with self._lock:
+                self.requests += 1
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    content = json.load(response)
+            except urllib.error.HTTPError as error:
+                if attempt == self.retries or (error.code != 429 and error.code < 500):
+                    raise
+                delay = float(error.headers.get("Retry-After") or 2 ** attempt)
+            except (urllib.error.URLError, TimeoutError):
+                if attempt == self.retries:
+                    raise
+                delay = 2 ** attempt
+            else:
+                if "error" in content:
+                    raise RuntimeError(f"Wikidata API error: {content['error']}")
+                return content
+            time.sleep(delay)
+
+    def search(self, term, lang, limit=10):
+        """Return the results (list of dicts with an "id") of the search of
+        term in the language lang."""
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT results FROM searches WHERE term = ? AND lang = ? AND lim = ?", (term, lang, limit)
+            ).fetchone()
+            if row is not None:
+                self.cache_hits += 1
+                return json.loads(row[0])
+
+        results = self._get(
+            {"action": "wbsearchentities", "language": lang, "type": "item", "search": term, "limit": limit}
+        ).get("search", [])
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)", (term, lang, limit, json.dumps(results))
+            )
+            self._connection.commit()
+        return results
+
+    def search_first(self, term, langs=("fr", "it", "en"), limit=10):
+        """Return the results of the search of term in the first language of
+        langs that gives some, [] if none does."""
+
+        for lang in langs:
+            results = self.search(term, lang, limit=limit)
+            if results:
+                return results
+        return []
+
+    def search_many(self, terms, langs=("fr", "it", "en"), limit=10, progress=None):
+        """Return {term: search_first(term)} for the terms given in argument,
+        searched concurrently. progress is called with each finished term."""
+
+        terms = list(dict.fromkeys(terms))
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.search_first, term, langs, limit): term for term in terms}
+            for future in concurrent.futures.as_completed(futures):
+                results[futures[future]] = future.result()
+                if progress is not None:
+                    progress(futures[future])
+        return {term: results[term] for term in terms}
+
+    def entities(self, qids):
+        """Return {qid: entity} for the QIDs given in argument, entities being
+        the JSON of wbgetentities. Unknown QIDs are missing from the result."""
+
+        qids = list(dict.fromkeys(qids))
+        found = {}
+        with self._lock:
+            for i in range(0, len(qids), 500):  # stay below SQLite's parameter limit
+                chunk = qids[i: i+500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT qid, entity FROM entities WHERE qid IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((qid, json.loads(entity)) for qid, entity in rows)
+            self.cache_hits += len(found)
+
+        missing = [qid for qid in qids if qid not in found]
+        batches = [missing[i: i+MAX_IDS] for i in range(0, len(missing), MAX_IDS)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for entities in executor.map(self._fetch_entities, batches):
+                found.update(entities)
+        return {qid: found[qid] for qid in qids if "missing" not in found[qid]}
+
+    def _fetch_entities(self, qids):
+        entities = self._get({"action": "wbgetentities", "ids": "|".join(qids)}).get("entities", {})
+        for entity in list(entities.values()):
+            if "redirects" in entity:  # given under the QID it redirects to
+                entities[entity["redirects"]["from"]] = entity
+        entities = {qid: entities.get(qid, {"id": qid, "missing": ""}) for qid in qids}
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?)",
+                [(qid, json.dumps(entity)) for qid, entity in entities.items()],
+            )
+            self._connection.commit()
+        return entities
@@ -1,24 +1,238 @@
-from flask import (Flask, render_template, jsonify, request, abort, Response, stream_with_context)
+from flask import (Flask, render_template, jsonify, request, abort, Response, stream_with_context, url_for)
 
 import pathlib
 import json
 import zipfile
+import functools
+import gzip
+import itertools
+import re
+import shutil
+import tempfile
+import pickle
 
-from io import StringIO
-import csv
-
-from process_annotated_zip import process_annotated_zip
-from process_zip_annotated_cooc import process_zip_cooc as make_cooc_json_annotated
+from process_annotated_zip import process_annotated_zip, process_annotated_index
+from process_zip_annotated_cooc import count_cooccurrences, count_index_cooccurrences, score_cooccurrences
+from process_zip_annotated_cooc import get_tagger, tagger_loaded, tagger_signature
+from pos_cache import PosTagCache
+from image_index import ImageIndex
+from association import MEASURES
+from result_cache import ResultCache, fingerprint
+import corpus_index
+import compact_graph
+import graph_export
+from mapped_table import load_table, JSON
+import jobs
+from jobs import JobQueue, QueueFull
+from instrumentation import Timings, Metrics
 
 
 app = Flask(__name__)
+app.config["WIKIDATA_IMAGE_FALLBACK"] = False  # query Wikidata for images missing from qid_to_claims
+app.config["RESULT_CACHE_ENTRIES"] = 32  # responses kept in memory
+app.config["RESULT_CACHE_DISK_BYTES"] = 1 << 30
+app.config["RESULT_CACHE_TTL"] = 7 * 24 * 3600  # seconds
+app.config["COUNTS_CACHE_ENTRIES"] = 4  # cooccurrence counts kept in memory
+app.config["COUNTS_CACHE_DISK_BYTES"] = 1 << 30
+app.config["JOB_WORKERS"] = 2  # analyses running at the same time
+app.config["JOB_QUEUE_SIZE"] = 16  # analyses queued or running
+app.config["JOB_TTL"] = 3600  # seconds a finished job is kept
+app.config["WORKER_MAX_RSS"] = 4 << 30  # bytes, server workers are recycled beyond
+app.config.from_prefixed_env()
+
+
+pathlib.Path(app.instance_path).mkdir(parents=True, exist_ok=True)
+
+# compiled once into memory-mapped tables, shared by the worker processes
+table_directory = pathlib.Path(app.instance_path) / "tables"
+knowledge_base_path = pathlib.Path(app.static_folder) / "json" / "mdf-knowledge-base.json"
+knowledge_base = {
+    "qids": load_table(knowledge_base_path, table_directory, select="qids"),
+    "aliases": load_table(knowledge_base_path, table_directory, select="aliases"),
+}
+qid_to_claims = load_table(
+    pathlib.Path(app.static_folder) / "json" / "qid_to_claims.json", table_directory, kind=JSON
+)
+
+index_directory = pathlib.Path(app.instance_path) / "indexes"
+
+# what results depend on besides the corpus and the parameters of analyses,
+# see result_cache.fingerprint: the compiled tables are named after the size
+# and modification time of their source.
+analysis_signature = [
+    pathlib.Path(table.path).name
+    for table in (knowledge_base["qids"], knowledge_base["aliases"], qid_to_claims)
+] + list(tagger_signature())
+
+
+def init_process():
+    """Create the resources of the current process. SQLite connections and
+    thread pools cannot be shared with forked processes, so server workers
+    call it again after the fork."""
+
+    global image_index, tag_cache, result_cache, counts_cache, metrics, job_queue
+    image_index = ImageIndex(
+        knowledge_base["qids"], qid_to_claims, wikidata_fallback=app.config["WIKIDATA_IMAGE_FALLBACK"]
+    )
+    tag_cache = PosTagCache(pathlib.Path(app.instance_path) / "pos-tags.sqlite3", *tagger_signature())
+    result_cache = ResultCache(
+        pathlib.Path(app.instance_path) / "results",
+        max_entries=app.config["RESULT_CACHE_ENTRIES"],
+        max_disk_bytes=app.config["RESULT_CACHE_DISK_BYTES"],
+        ttl=app.config["RESULT_CACHE_TTL"],
+    )
+    # pickled CooccurrenceCounts, so that changing the measure or max degree
+    # only scores them again
+    counts_cache = ResultCache(
+        pathlib.Path(app.instance_path) / "counts",
+        max_entries=app.config["COUNTS_CACHE_ENTRIES"],
+        max_disk_bytes=app.config["COUNTS_CACHE_DISK_BYTES"],
+        ttl=app.config["RESULT_CACHE_TTL"],
+        suffix=".pickle",
+    )
+    metrics = Metrics()
+    job_queue = JobQueue(
+        max_workers=app.config["JOB_WORKERS"],
+        max_pending=app.config["JOB_QUEUE_SIZE"],
+        ttl=app.config["JOB_TTL"],
+    )
+
+
+def warm_up():
+    """Load the tagger and run it once, so that it is ready before the first
+    cooccurrence analysis."""
+
+    get_tagger()("Le Mercure de France.")
+
+
+def configure(config):
+    """Apply config (a mapping) over the defaults and the FLASK_* environment
+    variables, then create the resources of the current process again."""
+
+    app.config.from_mapping(config)
+    init_process()
+
+
+init_process()
+
+
+@functools.lru_cache(maxsize=8)
+def load_index(identifier):
+    """Return the corpus index given by the "index id" of a request, aborting
+    with 404 (Not Found) if there is none and 409 (Conflict) if it has another
+    format or was tagged with another model than the current one."""
+
+    if not re.fullmatch("[0-9a-f]{64}", identifier) or not (index_directory / identifier).is_dir():
+        abort(404, f"unknown corpus index: {identifier}")
+    try:
+        index = corpus_index.CorpusIndex(index_directory / identifier)
+    except ValueError as error:
+        abort(409, f"{error}, the corpus must be ingested again")
+    if index.model != tagger_signature():
+        abort(409, f"corpus index tagged with {' '.join(index.model)}, the corpus must be ingested again")
+    return index
+
+
+def cached_body(route, key, compute, with_timings=False, cached=True):
+    """Return the JSON body of compute(timings=...), reusing the one stored
+    under key if there is one. The timings of computed bodies are added to the
+    metrics of route.
+
+    If with_timings is True, the body is always computed and has an extra
+    "timings" block. If cached is False, the body is neither looked up nor
+    stored.
+    """
+
+    if cached and not with_timings:
+        body = result_cache.get(key)
+        if body is not None:
+            return body
+
+    timings = Timings()
+    result = compute(timings=timings)
+    with timings.phase("serialization"):
+        body = app.json.dumps(result).encode("utf-8")
+    if cached:
+        result_cache.put(key, body)
+    metrics.observe(route, timings)
+    if with_timings:
+        # appended to the serialized body, so that serialization is measured too.
+        body = body[:-1] + b', "timings": ' + app.json.dumps(timings.report()).encode("utf-8") + b"}"
+    return body
+
+
+def wants_timings():
+    """Whether the request asks for a "timings" block in the response."""
+
+    return (request.form.get("timings") or "").lower() in ("1", "true", "yes", "on")
 
 
-with open(pathlib.Path(app.static_folder) / "json" / "mdf-knowledge-base.json") as input_stream:
-    knowledge_base = json.load(input_stream)
+def wants_compact():
+    """Whether the request asks for the compact encoding of graph data, see
+    compact_graph. It is gzip compressed if the client accepts it."""
 
-with open(pathlib.Path(app.static_folder) / "json" / "qid_to_claims.json") as input_stream:
-    qid_to_claims = json.load(input_stream)
+    return request.values.get("format") == "compact"
+
+
+def response_etag(key, with_timings=False):
+    """The ETag of the response for key: the key, with the encoding of the
+    response if it is not plain JSON, and "-timings" if it has a "timings"
+    block."""
+
+    if with_timings:
+        key = f"{key}-timings"
+    if not wants_compact():
+        return key
+    return f"{key}-compact-gzip" if request.accept_encodings["gzip"] else f"{key}-compact"
+
+
+def json_response(key, body, with_timings=False):
+    """Return body as a JSON response, see response_etag for its ETag. A
+    matching If-None-Match gives a 304 (Not Modified) response, unless the
+    body has timings: they are measured again for each request."""
+
+    etag = response_etag(key, with_timings)
+    if not with_timings and etag in request.if_none_match:
+        response = app.response_class(status=304)
+    elif wants_compact():
+        body = json.dumps(compact_graph.encode(json.loads(body)), ensure_ascii=False, separators=(",", ":"))
+        response = app.response_class(body, mimetype="application/json")
+        if request.accept_encodings["gzip"]:
+            response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+            response.content_encoding = "gzip"
+    else:
+        response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_json(route, key, compute):
+    """Return the JSON response of compute(timings=...), see cached_body and
+    json_response."""
+
+    with_timings = wants_timings()
+    if not with_timings and response_etag(key) in request.if_none_match:
+        return json_response(key, b"")
+    return json_response(key, cached_body(route, key, compute, with_timings=with_timings), with_timings)
+
+
+def uploaded_zip(copy=False):
+    """Return the uploaded "input zip" as a binary file, None if there is
+    none. If copy is True, the upload is copied to a temporary file that
+    outlives the request."""
+
+    input_zip = request.files.get("input zip")
+    if input_zip is None:
+        return None
+    if not copy:
+        return input_zip.stream._file
+    stream = tempfile.TemporaryFile()
+    shutil.copyfileobj(input_zip.stream, stream)
+    stream.seek(0)
+    return stream
 
 
 @app.route('/')
@@ -26,59 +240,381 @@ def index():
     return render_template('index.html')
 
 
-@app.route('/process_zip', methods=["POST"])
-def process_zip():
-    input_zip = request.files.get("input zip")
-    annotation_filter = request.form.get("annotation filter")
-    author_xpath = request.form.get("author xpath")  # teiHeader/profileDesc/textClass/keywords/term[@type='author']
-    file_like_object = input_zip.stream._file  
-    zipfile_object = zipfile.ZipFile(file_like_object)
+def opinion_analysis(file_like_object):
+    """Return the cache key of the /process_zip analysis of the request and a
+    function that computes it, given optional progress and timings."""
 
-    return process_annotated_zip(zipfile_object, knowledge_base, annotation_filter=annotation_filter, author_xpath=author_xpath)
+    annotation_filter = request.form.get("annotation filter") or ""
+    author_xpath = request.form.get("author xpath") or ""  # teiHeader/profileDesc/textClass/keywords/term[@type='author']
+    n_workers = int(request.form.get("n workers") or 1)
+    params = {"annotation filter": annotation_filter, "author xpath": author_xpath}
+    identifier = request.form.get("index id") or ""
+    if identifier:
+        index = load_index(identifier)
+        key = fingerprint(None, "process_zip", {**params, "index id": identifier}, analysis_signature)
 
+        def compute(progress=None, timings=None):
+            return process_annotated_index(
+                index,
+                knowledge_base,
+                annotation_filter=annotation_filter,
+                author_xpath=author_xpath,
+                image_index=image_index,
+                progress=progress,
+                timings=timings,
+            )
+
+        return key, compute
+
+    if file_like_object is None:
+        abort(400, "no input zip nor index id")
+    key = fingerprint(file_like_object, "process_zip", params, analysis_signature)
+
+    def compute(progress=None, timings=None):
+        zipfile_object = zipfile.ZipFile(file_like_object)
+        return process_annotated_zip(
+            zipfile_object,
+            knowledge_base,
+            annotation_filter=annotation_filter,
+            author_xpath=author_xpath,
+            image_index=image_index,
+            n_workers=n_workers,
+            progress=progress,
+            timings=timings,
+        )
+
+    return key, compute
+
+
+def cached_counts(key, count):
+    """Return the CooccurrenceCounts stored under key in the counts cache,
+    computing them with count() and storing them if there are none."""
+
+    body = counts_cache.get(key)
+    if body is not None:
+        return pickle.loads(body)
+    counts = count()
+    counts_cache.put(key, pickle.dumps(counts, protocol=pickle.HIGHEST_PROTOCOL))
+    return counts
+
+
+def cooccurrence_analysis(file_like_object):
+    """Return the cache key of the /process_zip_cooc analysis of the request
+    and a function that computes it, given optional progress and timings.
+    The counts of the corpus are cached under a key of their own, that does
+    not depend on the measure and max degree."""
 
-@app.route('/process_zip_cooc', methods=["POST"])
-def process_zip_cooc():
-    input_zip = request.files.get("input zip")
     pos_filter = request.form.get("POS filter")
     pos_filter = set(pos_filter.split(",") if pos_filter else set())
     ne_filter = request.form.get("NE filter")
     target_property = request.form.get("target property")
     max_degree = int(request.form.get("max degree"))
-    file_like_object = input_zip.stream._file
-    zipfile_object = zipfile.ZipFile(file_like_object)
-
-    return make_cooc_json_annotated(
-        zipfile_object,
-        knowledge_base,
-        qid_to_claims,
-        pos_filter=pos_filter,
-        target_property=target_property,
-        max_degree=max_degree
+    n_process = int(request.form.get("n process") or 1)
+    n_workers = int(request.form.get("n workers") or 1)
+    measure = request.form.get("association measure") or "smoothed_dice"
+    if measure not in MEASURES:
+        abort(400, f"unknown association measure: {measure}")
+    counts_params = {
+        "POS filter": sorted(pos_filter),
+        "target property": target_property or "",
+    }
+    params = {**counts_params, "max degree": max_degree, "association measure": measure}
+    identifier = request.form.get("index id") or ""
+    if identifier:
+        index = load_index(identifier)
+        source = {"index id": identifier}
+
+        def count(progress, timings):
+            return count_index_cooccurrences(
+                index,
+                knowledge_base,
+                qid_to_claims,
+                pos_filter=pos_filter,
+                target_property=target_property,
+                image_index=image_index,
+                progress=progress,
+                timings=timings,
+            )
+    else:
+        if file_like_object is None:
+            abort(400, "no input zip nor index id")
+        source = {"upload": corpus_index.index_id(file_like_object)}
+
+        def count(progress, timings):
+            return count_cooccurrences(
+                zipfile.ZipFile(file_like_object),
+                knowledge_base,
+                qid_to_claims,
+                pos_filter=pos_filter,
+                target_property=target_property,
+                n_process=n_process,
+                tag_cache=tag_cache,
+                image_index=image_index,
+                n_workers=n_workers,
+                progress=progress,
+                timings=timings,
+            )
+
+    key = fingerprint(None, "process_zip_cooc", {**params, **source}, analysis_signature)
+    counts_key = fingerprint(None, "cooccurrence counts", {**counts_params, **source}, analysis_signature)
+
+    def compute(progress=None, timings=None):
+        counts = cached_counts(counts_key, lambda: count(progress, timings))
+        return score_cooccurrences(
+            counts,
+            target_property=target_property,
+            max_degree=max_degree,
+            measure=measure,
+            progress=progress,
+            timings=timings,
+        )
+
+    return key, compute
+
+
+def ingest_analysis(file_like_object):
+    """Return the key of the /ingest job of the request and a function that
+    builds the index of the uploaded corpus, given optional progress and
+    timings."""
+
+    if file_like_object is None:
+        abort(400, "no input zip")
+    n_process = int(request.form.get("n process") or 1)
+    identifier = corpus_index.index_id(file_like_object)
+    key = fingerprint(None, "ingest", {"index id": identifier}, analysis_signature)
+
+    def compute(progress=None, timings=None):
+        with timings.phase("indexing"):
+            index = corpus_index.ingest(
+                zipfile.ZipFile(file_like_object), index_directory, identifier, get_tagger(), n_process=n_process,
+                progress=progress,
+            )
+        return {"index id": identifier, "n files": len(index.names), "n sentences": len(index)}
+
+    return key, compute
+
+
+def submit_job(route, analysis, cached=True):
+    """Submit the analysis of the request to the job queue. The response gives
+    the job id and the URLs of its status and result. If cached is False, its
+    result is not kept in the result cache, see cached_body."""
+
+    with_timings = wants_timings()
+    file_like_object = uploaded_zip(copy=True)
+    try:
+        key, compute = analysis(file_like_object)
+    except Exception:
+        if file_like_object is not None:
+            file_like_object.close()
+        raise
+
+    def run(progress):
+        return cached_body(
+            route, key, lambda timings: compute(progress=progress, timings=timings), with_timings=with_timings,
+            cached=cached,
+        )
+
+    try:
+        # the ETag of the job result, see response_etag
+        job = job_queue.submit(f"{key}-timings" if with_timings else key, run)
+    except QueueFull as exception:
+        if file_like_object is not None:
+            file_like_object.close()
+        abort(503, str(exception))
+    if file_like_object is not None:
+        # once the job ran, or was cancelled before it started
+        job.future.add_done_callback(lambda future: file_like_object.close())
+    response = jsonify({
+        **job.status(),
+        "status url": url_for("job_status", job_id=job.identifier),
+        "events url": url_for("job_events", job_id=job.identifier),
+        "result url": url_for("job_result", job_id=job.identifier),
+        "result id": key,
+        "export url": url_for("export_result", result_id=key),
+    })
+    response.status_code = 202
+    return response
+
+
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404, f"unknown job: {job_id}")
+    return job
+
+
+@app.route('/process_zip', methods=["POST"])
+def process_zip():
+    return cached_json("process_zip", *opinion_analysis(uploaded_zip()))
+
+
+@app.route('/process_zip_cooc', methods=["POST"])
+def process_zip_cooc():
+    return cached_json("process_zip_cooc", *cooccurrence_analysis(uploaded_zip()))
+
+
+@app.route('/ingest', methods=["POST"])
+def ingest():
+    # the index may be removed since, ingest only rebuilds it if needed
+    return submit_job("ingest", ingest_analysis, cached=False)
+
+
+@app.route('/process_zip/jobs', methods=["POST"])
+def submit_process_zip():
+    return submit_job("process_zip", opinion_analysis)
+
+
+@app.route('/process_zip_cooc/jobs', methods=["POST"])
+def submit_process_zip_cooc():
+    return submit_job("process_zip_cooc", cooccurrence_analysis)
+
+
+@app.route('/jobs/<job_id>', methods=["GET"])
+def job_status(job_id):
+    return jsonify(get_job(job_id).status())
+
+
+@app.route('/jobs/<job_id>', methods=["DELETE"])
+def cancel_job(job_id):
+    get_job(job_id)
+    return jsonify(job_queue.cancel(job_id).status())
+
+
+@app.route('/jobs/<job_id>/events', methods=["GET"])
+def job_events(job_id):
+    """Stream the progress events of a job as Server-Sent Events, until it
+    finishes. Each event is a JSON status with its elapsed time and the rate
+    of its phase (items per second)."""
+
+    job = get_job(job_id)
+    # a malformed Last-Event-ID replays the events from the first one
+    start = max(request.headers.get("Last-Event-ID", -1, type=int) + 1, 0)
+
+    def stream():
+        sent = start
+        while True:
+            events = job.wait_events(sent, timeout=15)
+            for event in events:
+                yield f"id: {sent}\ndata: {json.dumps(event)}\n\n"
+                sent += 1
+            if not events:
+                if job.finished is not None:
+                    return
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@app.route('/jobs/<job_id>/result', methods=["GET"])
+def job_result(job_id):
+    """Return the result of a finished job, 409 (Conflict) if it did not
+    finish (yet)."""
+
+    job = get_job(job_id)
+    if job.state != jobs.DONE:
+        abort(409, f"job {job_id} is {job.state}")
+    return json_response(job.key, job.result)
+
+
+@app.route('/metrics', methods=["GET"])
+def prometheus_metrics():
+    """Metrics in the Prometheus text format."""
+
+    body = metrics.render(extra=[
+        ("minerva_result_cache_hits_total", "counter", "Responses served from the result cache.", result_cache.hits),
+        ("minerva_result_cache_misses_total", "counter", "Responses missing from the result cache.", result_cache.misses),
+        ("minerva_counts_cache_hits_total", "counter", "Cooccurrence counts found in the counts cache.", counts_cache.hits),
+        ("minerva_counts_cache_misses_total", "counter", "Cooccurrence counts missing from the counts cache.", counts_cache.misses),
+        ("minerva_tag_cache_hits_total", "counter", "Sentences found in the POS tag cache.", tag_cache.hits),
+        ("minerva_tag_cache_misses_total", "counter", "Sentences missing from the POS tag cache.", tag_cache.misses),
+        ("minerva_jobs_pending", "gauge", "Jobs queued or running.", job_queue.pending()),
+    ])
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/health', methods=["GET"])
+def health():
+    """Liveness: the process answers requests."""
+
+    return jsonify({"status": "ok"})
+
+
+@app.route('/ready', methods=["GET"])
+def ready():
+    """Readiness: the tagger is loaded, cooccurrence analyses do not wait for
+    it."""
+
+    if not tagger_loaded():
+        return jsonify({"status": "warming up"}), 503
+    return jsonify({"status": "ready"})
+
+
 @app.route('/data_to_csv', methods=["POST"])
-@stream_with_context
 def data_to_csv():
-    input_json_str = request.data
-    input_json = json.loads(input_json_str)
-    keys = ["source", "target", "strength"]
-    output_stream = StringIO()
-    writer = csv.DictWriter(output_stream, fieldnames=keys, delimiter="\t")
-    writer.writeheader()
-    for link in input_json["data"]["links"]:
-        row = {
-            "source" : link["source"]["id"],
-            "target" : link["target"]["id"],
-            "strength" : link["value"],
-        }
-        writer.writerow(row)
-    # name not useful, will be handled in javascript
-    response = Response(output_stream.getvalue(), mimetype='text/csv', headers={"Content-disposition": "attachment; filename=export.csv"})
-    output_stream.seek(0)
-    output_stream.truncate(0)
-    return response
+    """Export the graph data posted by the page as it is read, see
+    graph_export. The query string gives the format ("tsv", "gexf" or
+    "graphml") and whether the export is compressed ("gzip")."""
+
+    export_format = request.args.get("format") or "tsv"
+    if export_format not in graph_export.FORMATS:
+        abort(400, f"unknown export format: {export_format}")
+    export, mimetype, extension = graph_export.FORMATS[export_format]
+    try:
+        chunks = export(graph_export.iter_graph_items(request.stream))
+        first = next(chunks, "")  # errors at the start of the body are still reported
+    except (ValueError, KeyError, TypeError) as error:
+        abort(400, f"invalid graph data: {error}")
+    return download_response(itertools.chain([first], chunks), mimetype, f"export.{extension}")
+
+
+def download_response(chunks, mimetype, filename):
+    """Return the chunks as a streamed attachment, gzip compressed if the query
+    string asks for it ("gzip")."""
+
+    if (request.args.get("gzip") or "").lower() in ("1", "true", "yes", "on"):
+        chunks = graph_export.gzip_chunks(chunks)
+        mimetype = "application/gzip"
+        filename += ".gz"
+    return Response(
+        stream_with_context(chunks), mimetype=mimetype, headers={"Content-disposition": f"attachment; filename={filename}"}
+    )
+
+
+@app.route('/results/<result_id>/export', methods=["GET"])
+def export_result(result_id):
+    """Export a result kept on the server, so that the page does not post it
+    back. result_id is the key of the analysis: the ETag of /process_zip*
+    responses, the "result id" of jobs.
+
+    The query string gives the format: "tsv", "gexf" or "graphml" for the
+    graph (see data_to_csv), "csv", "jsonl" or "parquet" for the table given
+    by "table" ("nodes", "links", "back_to_text", or "all" for a zip of every
+    table). "gzip" compresses the export."""
+
+    export_format = request.args.get("format") or "csv"
+    table = request.args.get("table") or "all"
+    if export_format not in graph_export.FORMATS and export_format not in graph_export.TABLE_FORMATS:
+        abort(400, f"unknown export format: {export_format}")
+    if table != "all" and table not in graph_export.TABLES:
+        abort(400, f"unknown table: {table}")
+    if export_format == "parquet" and graph_export.pyarrow is None:
+        abort(501, "the parquet format needs pyarrow")
+    body = result_cache.get(result_id) if re.fullmatch("[0-9a-f]{64}", result_id) else None
+    if body is None:
+        abort(404, f"unknown or expired result: {result_id}")
+    result = json.loads(body)
+
+    if export_format in graph_export.FORMATS:
+        export, mimetype, extension = graph_export.FORMATS[export_format]
+        return download_response(export(graph_export.iter_result_items(result)), mimetype, f"export.{extension}")
+    if table == "all":
+        return download_response(graph_export.iter_zip(result, export_format), "application/zip", "export.zip")
+    export, mimetype, extension = graph_export.TABLE_FORMATS[export_format]
+    return download_response(graph_export.iter_table(result, table, export_format), mimetype, f"{table}.{extension}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,180 @@
+"""description:
+    Association scores between mentions and their cooccurrents. The counts are
+    stored as parallel arrays (one cell per (mention, cooccurrent) link, like a
+    sparse matrix in coordinate format) so that every score is computed for
+    all links at once.
+"""
+
+import collections
+
+import numpy as np
+
+
+def dice(kij, ki, kj, n):
+    return 2 * kij / np.maximum(ki + kj, 1)
+
+
+def smoothed_dice(kij, ki, kj, n, smooth=1):
+    return (2 * kij + smooth) / (ki + kj + smooth)
+
+
+def contingency(kij, ki, kj, n):
+    """Return the observed (o11, o12, o21, o22) and expected (e11, e12, e21,
+    e22) frequencies of the 2x2 contingency tables of the links."""
+
+    n = np.maximum(n, 1)
+    o11 = kij.astype(float)
+    o12 = np.maximum(ki - kij, 0).astype(float)
+    o21 = np.maximum(kj - kij, 0).astype(float)
+    o22 = np.maximum(n - ki - kj + kij, 0).astype(float)
+    r1, r2 = o11 + o12, o21 + o22
+    c1, c2 = o11 + o21, o12 + o22
+    total = r1 + r2
+    return (o11, o12, o21, o22), (r1 * c1 / total, r1 * c2 / total, r2 * c1 / total, r2 * c2 / total)
+
+
+def pmi(kij, ki, kj, n):
+    """Pointwise mutual information. A null frequency is replaced by 0.5 so
+    that the score stays finite."""
+
+    (o11, _, _, _), (e11, _, _, _) = contingency(kij, ki, kj, n)
+    return np.log2(np.maximum(o11, 0.5) / np.maximum(e11, 0.5))
+
+
+def ppmi(kij, ki, kj, n):
+    return np.maximum(pmi(kij, ki, kj, n), 0.0)
+
+
+def log_likelihood(kij, ki, kj, n):
+    """Signed log-likelihood ratio (G2): negative values are for links that
+    appear less than expected."""
+
+    observed, expected = contingency(kij, ki, kj, n)
+    g2 = 0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for o, e in zip(observed, expected):
+            g2 = g2 + np.where((o > 0) & (e > 0), o * np.log(o / e), 0.0)
+    return np.where(observed[0] >= expected[0], 2 * g2, -2 * g2)
+
+
+def t_score(kij, ki, kj, n):
+    (o11, _, _, _), (e11, _, _, _) = contingency(kij, ki, kj, n)
+    return (o11 - e11) / np.sqrt(np.maximum(o11, 1))
+
+
+def chi2(kij, ki, kj, n):
+    """Signed chi-squared: negative values are for links that appear less than
+    expected."""
+
+    (o11, o12, o21, o22), (e11, _, _, _) = contingency(kij, ki, kj, n)
+    numerator = (o11 + o12 + o21 + o22) * (o11 * o22 - o12 * o21) ** 2
+    denominator = (o11 + o12) * (o21 + o22) * (o11 + o21) * (o12 + o22)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where(denominator > 0, numerator / denominator, 0.0)
+    return np.where(o11 >= e11, score, -score)
+
+
+# function: the score of links given their counts (kij, ki, kj, n)
+# contrast: how a score is compared to the one of the rest of the mentions
+# threshold: the minimum score for a link to be kept
+# scale: the factor from scores to link values in the graph
+Measure = collections.namedtuple("Measure", ["function", "contrast", "threshold", "scale"])
+
+
+MEASURES = {
+    "dice": Measure(dice, "difference", 0.02, 25.0),
+    "smoothed_dice": Measure(smoothed_dice, "ratio", 0.02, 25.0),
+    "pmi": Measure(pmi, "difference", 0.0, 1.0),
+    "ppmi": Measure(ppmi, "difference", 0.0, 1.0),
+    "log_likelihood": Measure(log_likelihood, "difference", 0.0, 1.0),
+    "t_score": Measure(t_score, "difference", 0.0, 1.0),
+    "chi2": Measure(chi2, "difference", 0.0, 1.0),
+}
+
+
+class CooccurrenceMatrix:
+    """Mention x cooccurrent counts.
+
+    Parameters
+    ----------
+    links : dict[tuple[str, str], int]
+        the number of sentences where (mention, cooccurrent) appear together.
+    single_count : dict[str, int]
+        the number of sentences where each mention or cooccurrent appears.
+    mention_set : set[str]
+        the mentions taken into account for the contrast ("rest of the
+        mentions") scores.
+    n : int
+        the number of sentences the counts were computed on.
+    """
+
+    def __init__(self, links, single_count, mention_set, n=0):
+        self.n = n
+        self.keys = list(links)
+        self.mentions = {}
+        self.cooccurrents = {}
+        for mention, cooccurrent in self.keys:
+            self.mentions.setdefault(mention, len(self.mentions))
+            self.cooccurrents.setdefault(cooccurrent, len(self.cooccurrents))
+
+        size = len(self.keys)
+        self.rows = np.fromiter((self.mentions[key[0]] for key in self.keys), dtype=np.int64, count=size)
+        self.cols = np.fromiter((self.cooccurrents[key[1]] for key in self.keys), dtype=np.int64, count=size)
+        self.kij = np.fromiter(links.values(), dtype=np.int64, count=size)
+
+        row_counts = np.fromiter(
+            (single_count.get(mention, 0) for mention in self.mentions), dtype=np.int64, count=len(self.mentions)
+        )
+        col_counts = np.fromiter(
+            (single_count.get(cooccurrent, 0) for cooccurrent in self.cooccurrents),
+            dtype=np.int64,
+            count=len(self.cooccurrents)
+        )
+        self.ki = row_counts[self.rows]
+        self.kj = col_counts[self.cols]
+
+        # counts for the rest of the mentions
+        total = sum(single_count.get(mention, 0) for mention in mention_set)
+        in_mention_set = np.fromiter(
+            (mention in mention_set for mention in self.mentions), dtype=bool, count=len(self.mentions)
+        )
+        self.ki_bar = total - np.where(in_mention_set[self.rows], self.ki, 0)
+        self.kij_bar = np.bincount(self.cols, weights=self.kij, minlength=len(self.cooccurrents))
+        self.kij_bar = self.kij_bar.astype(np.int64)[self.cols] - self.kij
+
+    def __len__(self):
+        return len(self.keys)
+
+    def scores(self, measure="smoothed_dice", contrast=False):
+        """Return the score of every link for the measure given in argument
+        (a key of MEASURES). If contrast is True, the score is compared to the
+        one of the rest of the mentions with the same cooccurrent.
+
+        Raises
+        ------
+        KeyError
+            if the measure is unknown.
+        """
+
+        measure = MEASURES[measure]
+        score = measure.function(self.kij, self.ki, self.kj, self.n)
+        if contrast:
+            score_bar = measure.function(self.kij_bar, self.ki_bar, self.kj, self.n)
+            if measure.contrast == "ratio":
+                score = score / score_bar
+            else:
+                score = score - score_bar
+        return score
+
+    def top_k(self, scores, threshold, max_degree):
+        """Return the indices of the links whose score is positive and at least
+        threshold, keeping at most max_degree links per mention (best scores
+        first, ties broken by link order)."""
+
+        candidates = np.flatnonzero((scores >= threshold) & (scores > 0))
+        order = np.lexsort((candidates, -scores[candidates], self.rows[candidates]))
+        candidates = candidates[order]
+        rows = self.rows[candidates]
+        starts = np.searchsorted(rows, rows, side="left")
+        rank = np.arange(len(candidates)) - starts
+        return np.sort(candidates[rank < max_degree])
@@ -0,0 +1,318 @@
+"""description:
+    Benchmark the analyses of the application on synthetic corpora. For every
+    corpus size and every route/parameter combination, the analysis is run a
+    few times in a fresh process and its wall time, throughput (sentences per
+    second), peak memory and per-phase timings are recorded. Results are saved
+    as JSON, and can be compared with a previous run.
+
+    Routes are benchmarked through the processors, not through HTTP, so that
+    caches (result cache, POS tag cache) do not interfere unless asked for.
+
+    With --pruning, only the removal of outliers of process_zip_cooc is timed,
+    on synthetic counts of growing vocabularies, against the loop it replaced.
+"""
+
+import collections
+import copy
+import json
+import multiprocessing
+import pathlib
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import random
+import time
+import zipfile
+
+import synthetic_corpus
+
+
+STATIC = pathlib.Path(__file__).parent / "static" / "json"
+
+
+# route -> list of parameter combinations, the keyword arguments of the
+# processor of the route.
+CONFIGURATIONS = {
+    "process_zip": [
+        {},
+        {"annotation_filter": "a"},
+        {"author_xpath": "teiHeader/profileDesc/textClass/keywords/term[@type='author']"},
+    ],
+    "process_zip_cooc": [
+        {},
+        {"pos_filter": ["NOUN", "ADJ"], "max_degree": 5},
+        {"target_property": "P21"},
+        {"measure": "log_likelihood"},
+    ],
+}
+
+
+def run_configuration(route, params, zip_path, repeat, tag_cache_path=None):
+    """Run one configuration repeat times and return its measures. Meant to be
+    run in a fresh process, so that peak memory is its own."""
+
+    from instrumentation import Timings
+
+    with open(STATIC / "mdf-knowledge-base.json") as input_stream:
+        knowledge_base = json.load(input_stream)
+    params = dict(params)
+    if route == "process_zip":
+        from process_annotated_zip import process_annotated_zip
+
+        def analysis(ziparchive, timings):
+            return process_annotated_zip(ziparchive, knowledge_base, timings=timings, **params)
+    else:
+        from process_zip_annotated_cooc import process_zip_cooc, get_tagger, tagger_signature
+        from pos_cache import PosTagCache
+
+        get_tagger()  # not part of the measures
+
+        with open(STATIC / "qid_to_claims.json") as input_stream:
+            qid_to_claims = json.load(input_stream)
+        if "pos_filter" in params:
+            params["pos_filter"] = set(params["pos_filter"])
+        tag_cache = None
+        if tag_cache_path is not None:
+            tag_cache = PosTagCache(tag_cache_path, *tagger_signature())
+
+        def analysis(ziparchive, timings):
+            return process_zip_cooc(
+                ziparchive, knowledge_base, qid_to_claims, tag_cache=tag_cache, timings=timings, **params
+            )
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    wall = []
+    reports = []
+    for _ in range(repeat):
+        timings = Timings()
+        with zipfile.ZipFile(zip_path) as ziparchive:
+            start = time.perf_counter()
+            analysis(ziparchive, timings)
+            wall.append(time.perf_counter() - start)
+        reports.append(timings.report())
+    return {
+        "wall seconds": wall,
+        "peak rss bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "rss before bytes": rss_before,
+        "timings": reports[-1],
+    }
+
+
+def legacy_prune_outliers(single_count, links, nodes, backtotext, cooccurrent_set, mention_set):
+    """The removal of outliers of process_zip_cooc before prune_outliers, that
+    filters links and nodes once per item seen only once. Kept as a reference
+    for the pruning benchmark and tests. The arguments are modified."""
+
+    counts = list(single_count.items())
+    for item, count in counts:
+        if count == 1:
+            try:
+                del single_count[item]
+            except KeyError:
+                pass
+            try:
+                del backtotext[item]
+            except KeyError:
+                pass
+            try:
+                cooccurrent_set.remove(item)
+            except KeyError:
+                pass
+            try:
+                mention_set.remove(item)
+            except KeyError:
+                pass
+            links = {key: val for key, val in links.items() if item not in key}
+            nodes = set((mention, annotation) for mention, annotation in nodes if item != mention)
+    return single_count, links, nodes, backtotext, cooccurrent_set, mention_set
+
+
+def synthetic_cooc_counts(vocabulary, n_mentions=None, links_per_word=4, seed=0):
+    """Return synthetic (single_count, links, nodes, backtotext,
+    cooccurrent_set, mention_set) counts of process_zip_cooc, with vocabulary
+    cooccurrent words. Counts follow a Zipf-like law, so that about half of
+    the words are seen once."""
+
+    rng = random.Random(seed)
+    n_mentions = n_mentions or max(1, vocabulary // 20)
+    mentions = [f"Mention {i}" for i in range(n_mentions)]
+    words = [f"mot{i}" for i in range(vocabulary)]
+    single_count = collections.Counter()
+    for rank, item in enumerate(mentions + words, 1):
+        single_count[item] = max(1, int(len(mentions + words) / rank ** 1.1 / 4)) if rng.random() < 0.7 else 1
+    links = {}
+    for word in words:
+        for mention in rng.sample(mentions, min(links_per_word, len(mentions))):
+            links[(mention, word)] = rng.randint(1, 5)
+    nodes = set((mention, f"Q{i}") for i, mention in enumerate(mentions)) | set((word, "NOUN") for word in words)
+    backtotext = {item: sorted(rng.sample(range(10 * vocabulary), 3)) for item in mentions + words}
+    return single_count, links, nodes, backtotext, set(words), set(mentions)
+
+
+def run_pruning(vocabularies, repeat=3, seed=0, verbose=True):
+    """Return the median times of prune_outliers and legacy_prune_outliers on
+    synthetic counts of growing vocabularies."""
+
+    from process_zip_annotated_cooc import prune_outliers
+
+    results = []
+    for vocabulary in vocabularies:
+        counts = synthetic_cooc_counts(vocabulary, seed=seed)
+        result = {"vocabulary": vocabulary, "links": len(counts[1])}
+        for name, function in (("single pass", prune_outliers), ("legacy", legacy_prune_outliers)):
+            wall = []
+            for _ in range(repeat):
+                arguments = copy.deepcopy(counts)
+                start = time.perf_counter()
+                function(*arguments)
+                wall.append(time.perf_counter() - start)
+            result[f"{name} seconds"] = statistics.median(wall)
+        results.append(result)
+        if verbose:
+            print(
+                "{:>7} words {:>8} links  single pass {:>8.4f}s  legacy {:>8.3f}s".format(
+                    vocabulary, result["links"], result["single pass seconds"], result["legacy seconds"]
+                ),
+                flush=True,
+            )
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=pathlib.Path(__file__).parent
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu count": multiprocessing.cpu_count(),
+    }
+
+
+def run(sizes, routes=None, repeat=3, sentences=40, seed=0, tag_cache=False, verbose=True):
+    """Return the benchmark results, see the module description.
+
+    Parameters
+    ----------
+    sizes : list[int]
+        the numbers of files of the generated corpora.
+    routes : list[str]
+        the routes to benchmark (default: every route of CONFIGURATIONS).
+    repeat : int
+        number of runs of each configuration, in the same process.
+    sentences : int
+        number of sentences per file.
+    seed : int
+        seed of the generated corpora.
+    tag_cache : bool
+        whether process_zip_cooc uses a POS tag cache (empty at first).
+    """
+
+    with open(STATIC / "mdf-knowledge-base.json") as input_stream:
+        knowledge_base = json.load(input_stream)
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n_files in sizes:
+            zip_path = pathlib.Path(directory) / f"corpus-{n_files}.zip"
+            corpus = {"n files": n_files, "sentences per file": sentences, "seed": seed}
+            synthetic_corpus.generate(zip_path, knowledge_base, n_files=n_files, sentences=sentences, seed=seed)
+            n_sentences = n_files * sentences
+            for route in routes or CONFIGURATIONS:
+                for params in CONFIGURATIONS[route]:
+                    tag_cache_path = pathlib.Path(directory) / "pos-tags.sqlite3" if tag_cache else None
+                    with context.Pool(1) as pool:
+                        measures = pool.apply(run_configuration, (route, params, str(zip_path), repeat, tag_cache_path))
+                    median = statistics.median(measures["wall seconds"])
+                    result = {
+                        "corpus": corpus,
+                        "route": route,
+                        "params": params,
+                        **measures,
+                        "median seconds": median,
+                        "sentences per second": n_sentences / median if median else None,
+                    }
+                    results.append(result)
+                    if verbose:
+                        print(format_result(result), flush=True)
+    return {"environment": environment(), "results": results}
+
+
+def result_key(result):
+    return json.dumps([result["corpus"], result["route"], result["params"]], sort_keys=True)
+
+
+def format_result(result, reference=None):
+    line = "{:>5} files  {:<17} {:<60} {:>8.3f}s {:>9.0f} sent/s {:>7.1f} MiB".format(
+        result["corpus"]["n files"],
+        result["route"],
+        json.dumps(result["params"], ensure_ascii=False)[:60],
+        result["median seconds"],
+        result["sentences per second"] or 0,
+        result["peak rss bytes"] / (1 << 20),
+    )
+    if reference is not None:
+        line += "  x{:.2f} time".format(result["median seconds"] / reference["median seconds"])
+    return line
+
+
+def compare(results, reference):
+    """Print the results next to the ratio of their time to the reference
+    ones."""
+
+    references = {result_key(result): result for result in reference["results"]}
+    for result in results["results"]:
+        print(format_result(result, references.get(result_key(result))))
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("output_file", help="The output .json file with the results")
+    parser.add_argument(
+        "-s", "--sizes", type=lambda x: [int(i) for i in x.split(",")], default=[12, 60],
+        help="Comma separated numbers of files of the generated corpora (default: 12,60)"
+    )
+    parser.add_argument(
+        "-r", "--routes", type=lambda x: x.split(","), default=None,
+        help=f"Comma separated routes (default: {','.join(CONFIGURATIONS)})"
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="Runs per configuration (default: %(default)s)")
+    parser.add_argument("--sentences", type=int, default=40, help="Sentences per file (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated corpora (default: %(default)s)")
+    parser.add_argument("--tag-cache", action="store_true", help="Use a POS tag cache in process_zip_cooc")
+    parser.add_argument("-c", "--compare", help="A previous output file to compare the results with")
+    parser.add_argument(
+        "-p", "--pruning", type=lambda x: [int(i) for i in x.split(",")], default=None,
+        help="Comma separated vocabulary sizes: only benchmark the pruning of outliers, against the legacy loop"
+    )
+
+    args = parser.parse_args()
+
+    if args.pruning:
+        results = {"environment": environment(), "pruning": run_pruning(args.pruning, repeat=args.repeat, seed=args.seed)}
+        with open(args.output_file, "w") as output_stream:
+            json.dump(results, output_stream, indent=2, ensure_ascii=False)
+        sys.exit(0)
+
+    results = run(
+        args.sizes, routes=args.routes, repeat=args.repeat, sentences=args.sentences, seed=args.seed,
+        tag_cache=args.tag_cache, verbose=not args.compare,
+    )
+    with open(args.output_file, "w") as output_stream:
+        json.dump(results, output_stream, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as input_stream:
+            compare(results, json.load(input_stream))
+    sys.exit(0)
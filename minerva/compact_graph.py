@@ -0,0 +1,98 @@
+"""description:
+    A compact encoding of the graph data returned by the analyses, for large
+    graphs. Every string is sent once in a string table and referred to by its
+    position, lists of numbers are sent as typed arrays: {"type": ..., "data":
+    ...} where data are the little-endian bytes of the values in base64 and
+    type the smallest of TYPES that holds them.
+
+        {
+            "format": "compact",
+            "strings": [...],  node ids first (one per node, in order), then
+                               the other strings
+            "nodes": {"name": ..., "label": ..., "group": ..., "class": ...},
+                               positions in strings, -1 when a node has no
+                               such attribute
+            "links": {"source": ..., "target": ..., "value": ...},
+                               positions of the ids of the ends in strings
+            "back_to_text": {"names": ..., "offsets": ..., "sentences": ...},
+                               the sentences of names[i] are
+                               sentences[offsets[i]:offsets[i+1]]
+            "sentences": {"source": ..., "text": [...]},
+            ...                other keys are kept as they are
+        }
+
+    static/js/graphs.js decodes it back into the graph data.
+"""
+
+import base64
+
+import numpy as np
+
+
+NODE_ATTRIBUTES = ("name", "label", "group", "class")
+TYPES = ("int8", "int16", "int32", "float64")
+
+
+def typed_array(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "f" and np.array_equal(values, np.round(values)):
+        values = values.astype(np.int64)
+    for name in TYPES:
+        dtype = np.dtype(name).newbyteorder("<")
+        if dtype.kind == "f" or values.dtype.kind != "f" and (
+            not values.size or np.iinfo(dtype).min <= values.min() and values.max() <= np.iinfo(dtype).max
+        ):
+            break
+    data = base64.b64encode(values.astype(dtype).tobytes()).decode("ascii")
+    return {"type": name, "data": data}
+
+
+def encode(result):
+    """Return the compact encoding of the graph data given in argument."""
+
+    nodes = result["data"]["nodes"]
+    strings = [node["id"] for node in nodes]
+    positions = {}
+    for i, string in enumerate(strings):
+        positions.setdefault(string, i)
+
+    def position(string):
+        if string not in positions:
+            positions[string] = len(strings)
+            strings.append(string)
+        return positions[string]
+
+    def end(value):
+        return position(value["id"] if isinstance(value, dict) else value)
+
+    links = result["data"]["links"]
+    back_to_text = result["back_to_text"]
+    sentences = result["sentences"]
+    offsets = np.zeros(len(back_to_text) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(pointers) for pointers in back_to_text.values()])
+    compact = {
+        "format": "compact",
+        "nodes": {
+            attribute: typed_array([position(node[attribute]) if attribute in node else -1 for node in nodes])
+            for attribute in NODE_ATTRIBUTES
+        },
+        "links": {
+            "source": typed_array([end(link["source"]) for link in links]),
+            "target": typed_array([end(link["target"]) for link in links]),
+            "value": typed_array([link["value"] for link in links]),
+        },
+        "back_to_text": {
+            "names": typed_array([position(name) for name in back_to_text]),
+            "offsets": typed_array(offsets),
+            "sentences": typed_array([i for pointers in back_to_text.values() for i in pointers]),
+        },
+        "sentences": {
+            "source": typed_array([position(sentence["source"]) for sentence in sentences]),
+            "text": [sentence["text"] for sentence in sentences],
+        },
+    }
+    compact["strings"] = strings
+    for key, value in result.items():
+        if key not in ("data", "back_to_text", "sentences"):
+            compact[key] = value
+    return compact
@@ -0,0 +1,290 @@
+"""description:
+    Precomputed index of an XML-TEI corpus, so that a corpus is parsed and
+    tagged once and then analysed many times. For every <s> (sentence) tag, the
+    index stores its text, its "annotation" attribute (sentiments), its
+    <Entity> mentions with their character offsets and annotations, and the
+    POS tokens of the sentences with mentions. The teiHeader of every file is
+    kept to query author metadata.
+
+    Columns are stored as NumPy arrays in a single .npz file, strings being
+    concatenated in UTF-8 and accessed through offset arrays. An index is
+    identified by the SHA-256 of the zip it was built from.
+"""
+
+import collections
+import hashlib
+import json
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+from lxml import etree
+
+import tei_reader
+from markup import read_mentions
+from parallel import track
+from pos_cache import Token, model_signature
+
+
+FORMAT_VERSION = 2  # 2: offsets of the mentions nested in other tags
+
+
+# annotation is None when the sentence has no "annotation" attribute.
+# valid is False when the sentence has children that are not <Entity> tags.
+# mentions are (text, annotation, start, end) tuples of the <Entity> tags at any
+# depth, offsets being relative to the non-normalized text.
+IndexedSentence = collections.namedtuple("IndexedSentence", ["annotation", "text", "valid", "mentions"])
+
+
+def normalize(name):
+    name = name.strip()
+    name = name[0].upper() + name[1:]
+    name = name.replace('’', "'")
+    name = name.replace("' ", "'")
+    name = name.replace("D'", "d'")
+    name = name.replace("L'", "l'")
+    name = name.replace(" De ", " de ")
+    name = name.replace(" Di ", " di ")
+    return name
+
+
+def index_id(stream, chunk_size=1 << 20):
+    """Return the identifier of the index of the zip stream given in argument.
+    The stream is read entirely then rewound."""
+
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class StringColumn:
+    """A list of strings stored as a UTF-8 blob and offsets."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, strings):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(item) for item in encoded], dtype=np.int64)
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]: self.offsets[i+1]].tobytes().decode("utf-8")
+
+
+def read_sentence(sentence):
+    """Return the IndexedSentence of the <s> element given in argument."""
+
+    entity_tag = f"{{{tei_reader.xmlns}}}Entity"
+    text, mentions = read_mentions(sentence, entity_tag)
+    valid = all(child.tag == entity_tag for child in sentence)
+    return IndexedSentence(sentence.attrib.get("annotation"), text, valid, mentions)
+
+
+def ingest(ziparchive, root, identifier, tagger, batch_size=1000, n_process=1, progress=None):
+    """Build the index of the zip archive given in argument in root/identifier
+    and return it. Nothing is done if the index already exists, unless it has
+    another format or was tagged with another model.
+
+    Sentences with mentions are tagged with tagger, a spacy model.
+    progress(phase, done, total) is called as files are read (phase
+    "reading") and once per batch of tagged sentences (phase "tagging").
+    """
+
+    directory = pathlib.Path(root) / identifier
+    if (directory / "meta.json").exists():
+        try:
+            index = CorpusIndex(directory)
+        except ValueError:  # older format
+            index = None
+        if index is not None and index.model == model_signature(tagger):
+            return index
+
+    names = [name for name in ziparchive.namelist() if name.endswith(".xml")]
+    root_tags = []
+    headers = []
+    file_starts = [0]
+    annotations = []
+    has_annotation = []
+    texts = []
+    valid = []
+    mention_starts = [0]
+    mention_texts = []
+    mention_annotations = []
+    mention_offsets = []
+    to_tag = []
+    for filename in track(names, progress, "reading", len(names)):
+        root_tag = ""
+        header = ""
+        with ziparchive.open(filename) as stream:
+            for element in tei_reader.iter_elements(stream):
+                if element.tag == f"{{{tei_reader.xmlns}}}teiHeader":
+                    root_tag = element.getparent().tag
+                    header = etree.tostring(element, encoding="utf-8").decode("utf-8")
+                    continue
+
+                sentence = read_sentence(element)
+                if sentence.valid and sentence.mentions and sentence.text.strip():
+                    to_tag.append((len(texts), normalize(sentence.text)))
+                annotations.append(sentence.annotation or "")
+                has_annotation.append(sentence.annotation is not None)
+                texts.append(sentence.text)
+                valid.append(sentence.valid)
+                for text, annotation, start, end in sentence.mentions:
+                    mention_texts.append(text)
+                    mention_annotations.append(annotation)
+                    mention_offsets.append((start, end))
+                mention_starts.append(len(mention_texts))
+        root_tags.append(root_tag)
+        headers.append(header)
+        file_starts.append(len(texts))
+
+    tags = {}
+    token_starts = np.zeros(len(texts) + 1, dtype=np.int64)
+    token_idx = []
+    token_len = []
+    token_tag = []
+    documents = tagger.pipe(
+        ((content, i) for i, content in to_tag), as_tuples=True, batch_size=batch_size, n_process=n_process
+    )
+    for done, (document, i) in enumerate(documents, 1):
+        for token in document:
+            token_idx.append(token.idx)
+            token_len.append(len(token.text))
+            token_tag.append(tags.setdefault(token.tag_, len(tags)))
+        token_starts[i+1] = len(document)
+        if progress is not None and (done % batch_size == 0 or done == len(to_tag)):
+            progress("tagging", done, len(to_tag))
+    token_starts = np.cumsum(token_starts)
+
+    # concurrent ingests of the same zip each write their own directory
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp_directory = pathlib.Path(tempfile.mkdtemp(prefix=f"{identifier}.", suffix=".tmp", dir=directory.parent))
+    texts = StringColumn.pack(texts)
+    annotations = StringColumn.pack(annotations)
+    mention_texts = StringColumn.pack(mention_texts)
+    mention_annotations = StringColumn.pack(mention_annotations)
+    np.savez(
+        tmp_directory / "index.npz",
+        file_starts=np.array(file_starts, dtype=np.int64),
+        sentence_text=texts.blob,
+        sentence_text_offsets=texts.offsets,
+        sentence_annotation=annotations.blob,
+        sentence_annotation_offsets=annotations.offsets,
+        sentence_has_annotation=np.array(has_annotation, dtype=bool),
+        sentence_valid=np.array(valid, dtype=bool),
+        mention_starts=np.array(mention_starts, dtype=np.int64),
+        mention_text=mention_texts.blob,
+        mention_text_offsets=mention_texts.offsets,
+        mention_annotation=mention_annotations.blob,
+        mention_annotation_offsets=mention_annotations.offsets,
+        mention_offsets=np.array(mention_offsets, dtype=np.int32).reshape(-1, 2),
+        token_starts=token_starts,
+        token_idx=np.array(token_idx, dtype=np.int32),
+        token_len=np.array(token_len, dtype=np.int32),
+        token_tag=np.array(token_tag, dtype=np.uint16),
+    )
+    with open(tmp_directory / "meta.json", "w") as output_stream:
+        json.dump(
+            {
+                "format": FORMAT_VERSION,
+                "names": names,
+                "root_tags": root_tags,
+                "headers": headers,
+                "tags": list(tags),
+                "model": model_signature(tagger),
+            },
+            output_stream,
+        )
+    shutil.rmtree(directory, ignore_errors=True)
+    try:
+        tmp_directory.rename(directory)
+    except OSError:  # renamed by another ingest in the meantime
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+    return CorpusIndex(directory)
+
+
+class CorpusIndex:
+    """Read access to an index built by ingest."""
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self.identifier = self.directory.name
+        with open(self.directory / "meta.json") as input_stream:
+            meta = json.load(input_stream)
+        if meta["format"] != FORMAT_VERSION:
+            raise ValueError(f"unsupported index format: {meta['format']}")
+        self.names = meta["names"]
+        self.tags = meta["tags"]
+        self.model = tuple(meta["model"])  # see pos_cache.model_signature
+        self._root_tags = meta["root_tags"]
+        self._headers = meta["headers"]
+
+        with np.load(self.directory / "index.npz") as arrays:
+            self._file_starts = arrays["file_starts"]
+            self._texts = StringColumn(arrays["sentence_text"], arrays["sentence_text_offsets"])
+            self._annotations = StringColumn(arrays["sentence_annotation"], arrays["sentence_annotation_offsets"])
+            self._has_annotation = arrays["sentence_has_annotation"]
+            self._valid = arrays["sentence_valid"]
+            self._mention_starts = arrays["mention_starts"]
+            self._mention_texts = StringColumn(arrays["mention_text"], arrays["mention_text_offsets"])
+            self._mention_annotations = StringColumn(
+                arrays["mention_annotation"], arrays["mention_annotation_offsets"]
+            )
+            self._mention_offsets = arrays["mention_offsets"]
+            self._token_starts = arrays["token_starts"]
+            self._token_idx = arrays["token_idx"]
+            self._token_len = arrays["token_len"]
+            self._token_tag = arrays["token_tag"]
+
+    def __len__(self):
+        return len(self._texts)
+
+    def file_sentences(self, file_id):
+        """Return the range of the sentence ids of file_id (an index in
+        names)."""
+
+        return range(int(self._file_starts[file_id]), int(self._file_starts[file_id + 1]))
+
+    def sentence(self, i):
+        annotation = self._annotations[i] if self._has_annotation[i] else None
+        start, end = self._mention_starts[i], self._mention_starts[i+1]
+        mentions = [
+            (self._mention_texts[j], self._mention_annotations[j], *offsets)
+            for j, offsets in zip(range(start, end), self._mention_offsets[start:end].tolist())
+        ]
+        return IndexedSentence(annotation, self._texts[i], bool(self._valid[i]), mentions)
+
+    def tokens(self, i, content):
+        """Return the POS tokens of sentence i, content being its normalized
+        text. The list is empty if the sentence was not tagged."""
+
+        start, end = self._token_starts[i], self._token_starts[i+1]
+        return [
+            Token(content[idx: idx + length], idx, self.tags[tag])
+            for idx, length, tag in zip(
+                self._token_idx[start:end].tolist(),
+                self._token_len[start:end].tolist(),
+                self._token_tag[start:end].tolist(),
+            )
+        ]
+
+    def author(self, file_id, author_query):
+        """Return the result of the author query (with namespaces) on file_id,
+        evaluated from the root with only the teiHeader."""
+
+        if not author_query:
+            return ''
+        root = etree.Element(self._root_tags[file_id])
+        root.append(etree.fromstring(self._headers[file_id].encode("utf-8")))
+        return root.findall(author_query)[0].text
@@ -0,0 +1,448 @@
+"""description:
+    Export the graph data of an analysis, as posted back by the page, without
+    holding it in memory: the JSON body is parsed incrementally and only the
+    items of its "links" and "nodes" arrays are decoded, one at a time. Exports
+    are generators of text chunks, in one of FORMATS:
+
+        - tsv: source, target and strength of each link;
+        - gexf and graphml: the graph for Gephi, with node labels, groups and
+          classes and link weights.
+
+    Nodes are written before links in GEXF and GraphML files, while the page
+    posts links first (keys are sorted): links are then spooled to a temporary
+    file until every node is known.
+
+    Results kept on the server are exported as TABLES (nodes, links and the
+    sentences of each node) in one of TABLE_FORMATS (csv, jsonl and parquet if
+    pyarrow is installed), or as a zip of the three tables.
+"""
+
+import codecs
+import csv
+import io
+import itertools
+import json
+import re
+import tempfile
+import zipfile
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|["\[\]{}]', re.S)  # a lone " is a string cut by the buffer end
+SCALAR = re.compile(r'[^,\]}\s]*')
+WHITESPACE = re.compile(r'\s*')
+
+# paths of the arrays whose items are yielded -> their name
+ARRAYS = {("data", "links"): "links", ("data", "nodes"): "nodes", ("links",): "links", ("nodes",): "nodes"}
+PREFIXES = {("data",)}
+
+
+class _Reader:
+    """Text read from a binary stream in chunks, consumed from pos."""
+
+    def __init__(self, stream, chunk_size=1 << 16):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk, return False at the end of the stream."""
+
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next character that is not whitespace, None at the
+        end."""
+
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise ValueError(f"expected one of {characters!r}, got {character!r}")
+        self.pos += 1
+        return character
+
+    def match(self, pattern):
+        """Match pattern at the next character that is not whitespace, reading
+        more while the match could go on."""
+
+        self.peek()
+        while True:
+            match = pattern.match(self.buffer, self.pos)
+            if match and (match.end() < len(self.buffer) or self.eof):
+                self.pos = match.end()
+                return match.group()
+            if not self.fill():
+                raise ValueError("unexpected end of JSON")
+
+    def decode(self):
+        """Decode the next value."""
+
+        self.peek()
+        while True:
+            try:
+                value, end = json.JSONDecoder().raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise ValueError("invalid JSON value")
+                continue
+            if end == len(self.buffer) and not self.eof and self.fill():  # a number may go on
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """Skip the next value."""
+
+        character = self.peek()
+        if character == '"':
+            self.match(STRING)
+        elif character in ("{", "["):
+            depth = 0
+            while True:
+                for match in STRUCTURE.finditer(self.buffer, self.pos):
+                    token = match.group()
+                    if token == '"':
+                        self.pos = match.start()
+                        break
+                    self.pos = match.end()
+                    if token in ("{", "["):
+                        depth += 1
+                    elif token in ("}", "]"):
+                        depth -= 1
+                        if depth == 0:
+                            return
+                else:
+                    self.pos = len(self.buffer)
+                if not self.fill():
+                    raise ValueError("unexpected end of JSON")
+        else:
+            self.match(SCALAR)
+
+
+def _iter_object(reader, path):
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = json.loads(reader.match(STRING))
+        reader.expect(":")
+        key_path = path + (key,)
+        if key_path in ARRAYS and reader.peek() == "[":
+            yield from _iter_array(reader, ARRAYS[key_path])
+        elif key_path in PREFIXES and reader.peek() == "{":
+            yield from _iter_object(reader, key_path)
+        else:
+            reader.skip()
+        if reader.expect(",}") == "}":
+            return
+
+
+def _iter_array(reader, name):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield name, reader.decode()
+        if reader.expect(",]") == "]":
+            return
+
+
+def iter_graph_items(stream, chunk_size=1 << 16):
+    """Yield the (array name, item) pairs of the links and nodes of the graph
+    JSON read from the binary stream given in argument, in the order of the
+    document. Raise ValueError if it is not valid JSON."""
+
+    reader = _Reader(stream, chunk_size=chunk_size)
+    yield from _iter_object(reader, ())
+    if reader.peek() is not None:
+        raise ValueError("unexpected data after JSON")
+
+
+def node_id(end):
+    """The id of the source or target of a link: the force layout of the page
+    replaces ids with node objects."""
+
+    return end["id"] if isinstance(end, dict) else end
+
+
+def chunked(lines, size=1 << 16):
+    """Join lines into chunks of about size characters."""
+
+    chunk = []
+    length = 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def iter_tsv(items):
+    def lines():
+        output_stream = io.StringIO()
+        writer = csv.writer(output_stream, delimiter="\t")
+        writer.writerow(["source", "target", "strength"])
+        for name, item in items:
+            if name == "links":
+                writer.writerow([node_id(item["source"]), node_id(item["target"]), item["value"]])
+                yield output_stream.getvalue()
+                output_stream.seek(0)
+                output_stream.truncate(0)
+        yield output_stream.getvalue()
+
+    return chunked(lines())
+
+
+def _collect(items):
+    """Return the nodes (id -> attributes) of the items and a file with the
+    (source, target, weight) of their links, one JSON array per line."""
+
+    nodes = {}
+    links = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode="w+", encoding="utf-8")
+
+    def add_node(node):
+        if isinstance(node, dict):
+            nodes[node["id"]] = {key: node.get(key) for key in ("label", "group", "class")}
+        else:
+            nodes.setdefault(node, {})
+
+    for name, item in items:
+        if name == "nodes":
+            add_node(item)
+        else:
+            add_node(item["source"])
+            add_node(item["target"])
+            links.write(json.dumps([node_id(item["source"]), node_id(item["target"]), item["value"]]) + "\n")
+    links.seek(0)
+    return nodes, links
+
+
+def _iter_links(links):
+    with links:
+        for line in links:
+            yield json.loads(line)
+
+
+def iter_gexf(items):
+    nodes, links = _collect(items)
+
+    def lines():
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<gexf xmlns="http://gexf.net/1.3" version="1.3">\n'
+        yield '<graph defaultedgetype="undirected">\n'
+        yield '<attributes class="node">\n'
+        yield '<attribute id="group" title="group" type="string"/>\n'
+        yield '<attribute id="class" title="class" type="string"/>\n'
+        yield '</attributes>\n<nodes>\n'
+        for identifier, attributes in nodes.items():
+            label = attributes.get("label") or identifier
+            values = "".join(
+                f'<attvalue for="{key}" value={quoteattr(str(attributes[key]))}/>'
+                for key in ("group", "class") if attributes.get(key) is not None
+            )
+            yield f'<node id={quoteattr(str(identifier))} label={quoteattr(str(label))}><attvalues>{values}</attvalues></node>\n'
+        yield '</nodes>\n<edges>\n'
+        for i, (source, target, weight) in enumerate(_iter_links(links)):
+            yield f'<edge id="{i}" source={quoteattr(str(source))} target={quoteattr(str(target))} weight="{weight}"/>\n'
+        yield '</edges>\n</graph>\n</gexf>\n'
+
+    return chunked(lines())
+
+
+def iter_graphml(items):
+    nodes, links = _collect(items)
+
+    def lines():
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+        for key in ("label", "group", "class"):
+            yield f'<key id="{key}" for="node" attr.name="{key}" attr.type="string"/>\n'
+        yield '<key id="weight" for="edge" attr.name="weight" attr.type="double"/>\n'
+        yield '<graph edgedefault="undirected">\n'
+        for identifier, attributes in nodes.items():
+            attributes = {"label": identifier, **{key: value for key, value in attributes.items() if value is not None}}
+            data = "".join(f'<data key="{key}">{escape(str(value))}</data>' for key, value in attributes.items())
+            yield f'<node id={quoteattr(str(identifier))}>{data}</node>\n'
+        for source, target, weight in _iter_links(links):
+            yield f'<edge source={quoteattr(str(source))} target={quoteattr(str(target))}><data key="weight">{weight}</data></edge>\n'
+        yield '</graph>\n</graphml>\n'
+
+    return chunked(lines())
+
+
+# format -> (export, mimetype, file extension)
+FORMATS = {
+    "tsv": (iter_tsv, "text/tab-separated-values", "tsv"),
+    "gexf": (iter_gexf, "application/gexf+xml", "gexf"),
+    "graphml": (iter_graphml, "application/graphml+xml", "graphml"),
+}
+
+
+def iter_result_items(result):
+    """Same as iter_graph_items, from the graph data of an analysis."""
+
+    for link in result["data"]["links"]:
+        yield "links", link
+    for node in result["data"]["nodes"]:
+        yield "nodes", node
+
+
+def gzip_chunks(chunks, level=6):
+    """Yield the gzip compressed bytes of the chunks (text or bytes) given in
+    argument."""
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# table -> its columns and their types
+TABLES = {
+    "nodes": {"id": "string", "name": "string", "label": "string", "group": "string", "class": "string"},
+    "links": {"source": "string", "target": "string", "value": "float64"},
+    "back_to_text": {"name": "string", "sentence": "int64", "source": "string", "text": "string"},
+}
+
+
+def iter_rows(result, table):
+    """Yield the rows (lists of values, see TABLES) of a table of the graph
+    data of an analysis."""
+
+    if table == "nodes":
+        columns = list(TABLES["nodes"])
+        for node in result["data"]["nodes"]:
+            yield [node.get(column) for column in columns]
+    elif table == "links":
+        for link in result["data"]["links"]:
+            yield [node_id(link["source"]), node_id(link["target"]), link["value"]]
+    else:
+        sentences = result["sentences"]
+        for name, pointers in result["back_to_text"].items():
+            for i in pointers:
+                yield [name, i, sentences[i]["source"], sentences[i]["text"]]
+
+
+def iter_csv(rows, columns):
+    def lines():
+        output_stream = io.StringIO()
+        writer = csv.writer(output_stream)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            yield output_stream.getvalue()
+            output_stream.seek(0)
+            output_stream.truncate(0)
+        yield output_stream.getvalue()
+
+    for chunk in chunked(lines()):
+        yield chunk.encode("utf-8")
+
+
+def iter_jsonl(rows, columns):
+    lines = (json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+    for chunk in chunked(lines):
+        yield chunk.encode("utf-8")
+
+
+def iter_parquet(rows, columns, batch_size=10_000):
+    """Row groups of batch_size rows are written to a temporary file, which is
+    then read in chunks: the footer of a parquet file comes last."""
+
+    if pyarrow is None:
+        raise RuntimeError("the parquet format needs pyarrow")
+    schema = pyarrow.schema([(column, column_type) for column, column_type in columns.items()])
+
+    with tempfile.SpooledTemporaryFile(max_size=1 << 24) as output_stream:
+        rows = iter(rows)
+        with pyarrow.parquet.ParquetWriter(output_stream, schema) as writer:
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                writer.write_table(
+                    pyarrow.table([[row[i] for row in batch] for i in range(len(schema))], schema=schema)
+                )
+        output_stream.seek(0)
+        yield from iter(lambda: output_stream.read(1 << 16), b"")
+
+
+# format -> (export, mimetype, file extension)
+TABLE_FORMATS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "jsonl": (iter_jsonl, "application/jsonl", "jsonl"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet", "parquet"),
+}
+
+
+def iter_table(result, table, table_format):
+    """Yield the bytes of a table of the graph data of an analysis."""
+
+    export = TABLE_FORMATS[table_format][0]
+    return export(iter_rows(result, table), TABLES[table])
+
+
+class _Sink(io.RawIOBase):
+    """An unseekable file that keeps what is written until it is taken."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(result, table_format):
+    """Yield the bytes of a zip file of every table of the graph data of an
+    analysis."""
+
+    sink = _Sink()
+    extension = TABLE_FORMATS[table_format][2]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as ziparchive:
+        for table in TABLES:
+            with ziparchive.open(f"{table}.{extension}", "w") as member:
+                for chunk in iter_table(result, table, table_format):
+                    member.write(chunk)
+                    yield sink.take()
+    yield sink.take()
@@ -0,0 +1,64 @@
+"""description:
+    Configuration of gunicorn to serve the application with several worker
+    processes. From the folder of app.py:
+
+        gunicorn
+
+    The application is loaded in the master process and the spacy tagger
+    warmed up there (when_ready) before the workers are forked, so that they share its memory
+    copy-on-write, as they share the memory-mapped knowledge base and claims.
+    Each worker then creates its own caches and job queue.
+
+    Workers are recycled gracefully after max_requests requests, or once
+    their resident memory goes beyond the WORKER_MAX_RSS setting of the
+    application.
+
+    Jobs are kept in the memory of the worker that runs them: with more than
+    one worker, job routes (/jobs/...) need sticky sessions in front of
+    gunicorn, the synchronous routes do not.
+
+    Settings can be overridden on the command line or with GUNICORN_CMD_ARGS,
+    the settings of the application with FLASK_* environment variables.
+"""
+
+import multiprocessing
+
+
+wsgi_app = "app:app"
+preload_app = True
+bind = "127.0.0.1:8000"
+workers = min(4, multiprocessing.cpu_count())
+worker_class = "gthread"
+threads = 8  # event streams hold a thread each
+timeout = 120
+graceful_timeout = 120
+max_requests = 1000
+max_requests_jitter = 100
+
+
+def when_ready(server):
+    import app
+
+    app.warm_up()
+
+
+def post_fork(server, worker):
+    import app
+
+    app.init_process()
+
+
+def post_request(worker, req, environ, resp):
+    import app
+    from instrumentation import rss_bytes
+
+    rss = rss_bytes()
+    if worker.alive and rss > app.app.config["WORKER_MAX_RSS"]:
+        worker.log.info("Worker %s uses %d bytes, recycling it", worker.pid, rss)
+        worker.alive = False
+
+
+def worker_exit(server, worker):
+    import app
+
+    app.job_queue.shutdown()
@@ -0,0 +1,128 @@
+"""description:
+    Map entity names to the URL of their Wikidata image (P18). The index is
+    built once from the local claims (qid_to_claims.json), Wikidata is only
+    queried, in background threads, for entities that are missing from it.
+"""
+
+import concurrent.futures
+import hashlib
+import threading
+
+from wikidataintegrator import wdi_core
+
+
+datatype2url = {
+    "commonsMedia": "https://upload.wikimedia.org/wikipedia/commons"
+}
+
+
+def url_from_filename(filename, datatype="commonsMedia"):
+    name = filename.replace(" ", "_")
+    md5 = hashlib.md5(name.encode("utf-8")).hexdigest()
+    datatypeurl = datatype2url[datatype]
+    p1 = md5[:1]
+    p2 = md5[:2]
+    url = f"{datatypeurl}/{p1}/{p2}/{name}"
+
+    return url
+
+
+def url_from_qid(qid, kb=None):
+    """
+    Raises
+    ------
+    KeyError
+        - If the QID does not exist / is not present.
+        - if there are no image claims for QID.
+    """
+
+    if kb is None:
+        item = wdi_core.WDItemEngine(wd_item_id=qid).get_wd_json_representation()
+    else:
+        item = kb[qid]
+
+    snak = item["claims"]["P18"][0]["mainsnak"]
+    datatype = snak["datatype"]
+    filename = snak["datavalue"]["value"]
+    return url_from_filename(filename, datatype=datatype)
+
+
+def url_from_wikidata(qid):
+    """
+    Raises
+    ------
+    KeyError
+        - If the QID does not exist.
+        - if there are no image claims for QID.
+    """
+
+    return url_from_qid(qid, kb=None)
+
+
+def build_name2image(to_qid, qid_to_claims):
+    """Return the {name: image URL} mapping of every name whose QID has a P18
+    claim in qid_to_claims."""
+
+    name2image = {}
+    for name, qid in to_qid.items():
+        filenames = qid_to_claims.get(qid, {}).get("P18")
+        if filenames:
+            name2image[name] = url_from_filename(filenames[0])
+    return name2image
+
+
+class ImageIndex:
+    """Image URLs of named entities.
+
+    Parameters
+    ----------
+    to_qid : dict[str, str]
+        the name to QID mapping of the knowledge base.
+    qid_to_claims : dict
+        the local Wikidata claims.
+    wikidata_fallback : bool
+        if True, names missing from the local claims are looked up on Wikidata
+        in background threads. The result will be available on the next calls
+        to get, the current one always returns immediately.
+    max_workers : int
+        the maximum number of concurrent Wikidata lookups.
+    """
+
+    def __init__(self, to_qid, qid_to_claims, wikidata_fallback=False, max_workers=4):
+        self.to_qid = to_qid
+        self.name2image = build_name2image(to_qid, qid_to_claims)
+        self.wikidata_fallback = wikidata_fallback
+        self._fetched = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        if wikidata_fallback:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def _fetch(self, name, qid):
+        try:
+            url = url_from_wikidata(qid)
+        except Exception:  # missing image, unknown QID or network error: do not retry
+            url = None
+        with self._lock:
+            self._fetched[name] = url
+            self._pending.discard(name)
+
+    def get(self, name):
+        """Return the image URL for name, None if it is not known (yet)."""
+
+        url = self.name2image.get(name)
+        if url or not self.wikidata_fallback:
+            return url
+
+        qid = self.to_qid.get(name, "NIL")
+        if qid == "NIL":
+            return None
+
+        with self._lock:
+            if name in self._fetched:
+                return self._fetched[name]
+            if name not in self._pending:
+                self._pending.add(name)
+                self._executor.submit(self._fetch, name, qid)
+        return None
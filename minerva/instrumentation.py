@@ -0,0 +1,139 @@
+"""description:
+    Lightweight instrumentation of analyses: time spent in each phase, counters
+    (sentences, mentions, links, cache hits...) and peak memory.
+
+    Phases nest: the time of a phase does not include the time of the phases
+    entered inside it, so that phases of a pipeline of generators (reading
+    feeding tagging feeding counting) are measured separately. Memory is
+    sampled at most every sample_interval seconds when a phase ends.
+
+    Metrics accumulates the timings of every analysis and renders them in the
+    Prometheus text format.
+"""
+
+import collections
+import contextlib
+import os
+import resource
+import threading
+import time
+
+
+def rss_bytes():
+    """Return the resident memory of the current process, its peak if the
+    current one is not available."""
+
+    try:
+        with open("/proc/self/statm") as input_stream:
+            return int(input_stream.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Timings:
+    def __init__(self, sample_interval=0.1):
+        self.seconds = collections.Counter()
+        self.counts = collections.Counter()
+        self.peak_rss = rss_bytes()
+        self.sample_interval = sample_interval
+        self._stack = []  # [phase, time it was (re)started]
+        self._sampled = time.monotonic()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Count the time spent in the block as name, pausing the enclosing
+        phase."""
+
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.seconds[parent[0]] += now - parent[1]
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            name, started = self._stack.pop()
+            self.seconds[name] += now - started
+            if self._stack:
+                self._stack[-1][1] = now
+            if time.monotonic() - self._sampled >= self.sample_interval:
+                self.sample_memory()
+
+    def timed(self, iterable, name):
+        """Yield the items of iterable, counting the time spent producing them
+        as name."""
+
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+
+    def sample_memory(self):
+        self._sampled = time.monotonic()
+        self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    def report(self):
+        """Return the timings as a JSON serializable dict."""
+
+        self.sample_memory()
+        return {
+            "seconds": {name: round(seconds, 6) for name, seconds in sorted(self.seconds.items())},
+            "total seconds": round(sum(self.seconds.values()), 6),
+            "counts": dict(sorted(self.counts.items())),
+            "peak rss bytes": self.peak_rss,
+        }
+
+
+class Metrics:
+    """Totals of the timings of every analysis, by route."""
+
+    def __init__(self):
+        self.requests = collections.Counter()  # route -> number of analyses
+        self.seconds = collections.Counter()  # (route, phase) -> seconds
+        self.counts = collections.Counter()  # (route, name) -> count
+        self.peak_rss = 0
+        self._lock = threading.Lock()
+
+    def observe(self, route, timings):
+        with self._lock:
+            self.requests[route] += 1
+            for phase, seconds in timings.seconds.items():
+                self.seconds[(route, phase)] += seconds
+            for name, count in timings.counts.items():
+                self.counts[(route, name)] += count
+            self.peak_rss = max(self.peak_rss, timings.peak_rss)
+
+    def render(self, extra=()):
+        """Return the metrics in the Prometheus text format. extra are more
+        (name, type, help, value) metrics."""
+
+        lines = []
+        with self._lock:
+            lines.append("# HELP minerva_analyses_total Analyses computed (not served from cache).")
+            lines.append("# TYPE minerva_analyses_total counter")
+            for route, n in sorted(self.requests.items()):
+                lines.append(f'minerva_analyses_total{{route="{route}"}} {n}')
+            lines.append("# HELP minerva_phase_seconds_total Time spent in each phase of analyses.")
+            lines.append("# TYPE minerva_phase_seconds_total counter")
+            for (route, phase), seconds in sorted(self.seconds.items()):
+                lines.append(f'minerva_phase_seconds_total{{route="{route}",phase="{phase}"}} {seconds:.6f}')
+            lines.append("# HELP minerva_items_total Items processed by analyses.")
+            lines.append("# TYPE minerva_items_total counter")
+            for (route, name), count in sorted(self.counts.items()):
+                lines.append(f'minerva_items_total{{route="{route}",item="{name}"}} {count}')
+            lines.append("# HELP minerva_analysis_peak_rss_bytes Highest resident memory seen during an analysis.")
+            lines.append("# TYPE minerva_analysis_peak_rss_bytes gauge")
+            lines.append(f"minerva_analysis_peak_rss_bytes {self.peak_rss}")
+        for name, metric_type, help_text, value in extra:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+"""description:
+    Run long analyses outside of HTTP requests. A job is submitted to a pool of
+    threads with a bounded number of workers, its status (phase, number of
+    files done) can be polled while it runs and its result is kept until it
+    expires.
+
+    Jobs are cancelled cooperatively: the progress callback given to the
+    analysis raises Cancelled once the job has been cancelled.
+
+    Every progress report and change of state is also recorded as an event,
+    with the time elapsed and the throughput of the current phase, so that
+    events can be streamed to clients as they happen.
+"""
+
+import concurrent.futures
+import threading
+import time
+import uuid
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Cancelled(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, identifier, key):
+        self.identifier = identifier
+        self.key = key
+        self.state = QUEUED
+        self.phase = ""
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.result = None
+        self.cancelled = threading.Event()
+        self.future = None
+        self.finished = None  # time the job stopped
+        self.events = []
+        self._created = time.monotonic()
+        self._phase_started = {}  # phase -> time of its first report
+        self._changed = threading.Condition()
+
+    def progress(self, phase, done, total):
+        """The callback given to analyses."""
+
+        if self.cancelled.is_set():
+            raise Cancelled(self.identifier)
+        self.phase = phase
+        self.done = done
+        self.total = total
+        self._publish()
+
+    def set_state(self, state):
+        self.state = state
+        self._publish(finished=state in (DONE, FAILED, CANCELLED))
+
+    def _publish(self, finished=False):
+        now = time.monotonic()
+        started = self._phase_started.setdefault(self.phase, now)
+        event = self.status()
+        event["elapsed"] = round(now - self._created, 3)
+        event["rate"] = round(self.done / (now - started), 1) if now > started else 0.0  # per second
+        with self._changed:
+            self.events.append(event)
+            if finished:
+                self.finished = time.time()  # with the last event, for wait_events
+            self._changed.notify_all()
+
+    def wait_events(self, start, timeout=None):
+        """Return the events from index start, waiting at most timeout seconds
+        for new ones if there are none yet. The list is empty on timeout or
+        if the job finished."""
+
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > start or self.finished is not None, timeout)
+            return self.events[start:]
+
+    def status(self):
+        return {
+            "job id": self.identifier,
+            "state": self.state,
+            "phase": self.phase,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Parameters
+    ----------
+    max_workers : int
+        the number of jobs that run at the same time.
+    max_pending : int
+        the maximum number of jobs that are queued or running, QueueFull is
+        raised by submit beyond that.
+    ttl : float
+        the number of seconds a finished job is kept.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, ttl=3600):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, compute):
+        """Run compute(progress) in the pool and return the new Job. Its result
+        is what compute returns."""
+
+        with self._lock:
+            self._expire(time.time())
+            pending = self._pending()
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs are already pending")
+            job = Job(uuid.uuid4().hex, key)
+            # set before the job can be found, so that cancel always sees it
+            job.future = self._executor.submit(self._run, job, compute)
+            self._jobs[job.identifier] = job
+        return job
+
+    def _run(self, job, compute):
+        if job.cancelled.is_set():
+            job.set_state(CANCELLED)
+            return
+        job.set_state(RUNNING)
+        try:
+            job.result = compute(job.progress)
+        except Cancelled:
+            job.set_state(CANCELLED)
+        except Exception as exception:
+            job.error = f"{type(exception).__name__}: {exception}"
+            job.set_state(FAILED)
+        else:
+            job.set_state(DONE)
+
+    def get(self, identifier):
+        """Return the job given by its identifier, None if there is none."""
+
+        with self._lock:
+            self._expire(time.time())
+            return self._jobs.get(identifier)
+
+    def cancel(self, identifier):
+        """Ask the job given by its identifier to stop, return it (None if
+        there is none)."""
+
+        job = self.get(identifier)
+        if job is not None and job.finished is None:
+            job.cancelled.set()
+            if job.future.cancel():
+                job.set_state(CANCELLED)
+        return job
+
+    def shutdown(self):
+        """Cancel the jobs that did not finish and wait for the running ones to
+        stop."""
+
+        with self._lock:
+            identifiers = [identifier for identifier, job in self._jobs.items() if job.finished is None]
+        for identifier in identifiers:
+            self.cancel(identifier)
+        self._executor.shutdown(wait=True)
+
+    def pending(self):
+        """Return the number of jobs that are queued or running."""
+
+        with self._lock:
+            return self._pending()
+
+    def _pending(self):
+        return sum(1 for job in self._jobs.values() if job.finished is None)
+
+    def _expire(self, now):
+        expired = [
+            identifier for identifier, job in self._jobs.items()
+            if job.finished is not None and now - job.finished >= self.ttl
+        ]
+        for identifier in expired:
+            del self._jobs[identifier]
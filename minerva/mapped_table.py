@@ -0,0 +1,169 @@
+"""description:
+    Read-only string-keyed tables stored in a compact binary file that is
+    memory-mapped, so that every process of the server shares the same pages
+    instead of holding its own copy of the knowledge base and claims.
+
+    A table is compiled once from its JSON source and recompiled when the
+    source changes. Keys are sorted and looked up by binary search, values are
+    either strings or JSON documents decoded on access. The values of the
+    last keys looked up are kept decoded: they are shared between accesses
+    and must not be modified.
+
+    File layout (little-endian):
+        magic (8 bytes), value kind (uint64), n (uint64),
+        key offsets (n+1 uint64), value offsets (n+1 uint64),
+        keys (UTF-8), values (UTF-8).
+"""
+
+import collections.abc
+import functools
+import json
+import mmap
+import os
+import pathlib
+
+import numpy as np
+
+
+MAGIC = b"MNRVTBL1"
+_MISSING = object()
+STRING = 0
+JSON = 1
+
+
+def compile_table(mapping, path, kind=STRING):
+    """Write the mapping given in argument in path. Values must be strings if
+    kind is STRING, JSON serializable if kind is JSON."""
+
+    items = sorted((key.encode("utf-8"), value) for key, value in mapping.items())
+    keys = [key for key, value in items]
+    if kind == STRING:
+        values = [value.encode("utf-8") for key, value in items]
+    else:
+        values = [json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for key, value in items]
+
+    key_offsets = np.zeros(len(keys) + 1, dtype="<u8")
+    key_offsets[1:] = np.cumsum([len(key) for key in keys])
+    value_offsets = np.zeros(len(values) + 1, dtype="<u8")
+    value_offsets[1:] = np.cumsum([len(value) for value in values])
+
+    path = pathlib.Path(path)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as output_stream:
+        output_stream.write(MAGIC)
+        output_stream.write(np.array([kind, len(keys)], dtype="<u8").tobytes())
+        output_stream.write(key_offsets.tobytes())
+        output_stream.write(value_offsets.tobytes())
+        output_stream.write(b"".join(keys))
+        output_stream.write(b"".join(values))
+    os.replace(tmp_path, path)  # concurrent compilations give the same file
+
+
+class MappedTable(collections.abc.Mapping):
+    """A read-only mapping backed by a file written by compile_table. Tables
+    are pickled as their path, so that processes map the file themselves."""
+
+    def __init__(self, path, cache_size=1 << 16):
+        self.path = str(path)
+        self.cache_size = cache_size
+        with open(self.path, "rb") as input_stream:
+            self._mmap = mmap.mmap(input_stream.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:8] != MAGIC:
+            raise ValueError(f"not a table file: {self.path}")
+        self.kind, n = np.frombuffer(self._mmap, dtype="<u8", count=2, offset=8).tolist()
+        self._key_offsets = np.frombuffer(self._mmap, dtype="<u8", count=n + 1, offset=24)
+        self._value_offsets = np.frombuffer(self._mmap, dtype="<u8", count=n + 1, offset=24 + 8 * (n + 1))
+        self._keys_start = 24 + 16 * (n + 1)
+        self._values_start = self._keys_start + int(self._key_offsets[-1])
+        self._len = n
+        self._lookup = functools.lru_cache(maxsize=cache_size)(self._decoded)
+
+    def __reduce__(self):
+        return (MappedTable, (self.path, self.cache_size))
+
+    def _key(self, i):
+        start = self._keys_start + int(self._key_offsets[i])
+        end = self._keys_start + int(self._key_offsets[i + 1])
+        return self._mmap[start:end]
+
+    def _value(self, i):
+        start = self._values_start + int(self._value_offsets[i])
+        end = self._values_start + int(self._value_offsets[i + 1])
+        value = self._mmap[start:end].decode("utf-8")
+        return json.loads(value) if self.kind == JSON else value
+
+    def _search(self, key):
+        """Return the position of key, -1 if it is not in the table."""
+
+        target = key.encode("utf-8")
+        low, high = 0, self._len
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._len and self._key(low) == target:
+            return low
+        return -1
+
+    def _decoded(self, key):
+        """Return the decoded value of key, _MISSING if it is not in the
+        table."""
+
+        i = self._search(key)
+        return self._value(i) if i >= 0 else _MISSING
+
+    def __getitem__(self, key):
+        value = self._lookup(key) if isinstance(key, str) else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._lookup(key) if isinstance(key, str) else _MISSING
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._lookup(key) is not _MISSING
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self._key(i).decode("utf-8")
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        for i in range(self._len):
+            yield self._key(i).decode("utf-8"), self._value(i)
+
+
+def load_table(source, directory, select=None, kind=STRING):
+    """Return the MappedTable of a JSON file, compiling it in directory if it
+    was not yet or if the source changed since.
+
+    Parameters
+    ----------
+    source : str or pathlib.Path
+        the JSON file.
+    directory : str or pathlib.Path
+        where compiled tables are written.
+    select : str
+        the key of the mapping in the JSON document, the document itself if
+        None.
+    kind : int
+        STRING or JSON, the kind of the values.
+    """
+
+    source = pathlib.Path(source)
+    directory = pathlib.Path(directory)
+    stat = source.stat()
+    name = f"{source.stem}{'.' + select if select else ''}.{stat.st_size}-{stat.st_mtime_ns}.table"
+    path = directory / name
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(source) as input_stream:
+            data = json.load(input_stream)
+        compile_table(data[select] if select else data, path, kind=kind)
+    return MappedTable(path)
@@ -0,0 +1,130 @@
+"""description:
+    Markup of the entity mentions of sentences, based on character offsets.
+    Mentions are (text, annotation, start, end, qid) tuples sorted by start,
+    start and end being offsets in the text of the sentence, so that each
+    sentence gets its markup in a single pass and spans are never nested.
+
+    The text of sentences is normalized before it is shown, normalize_offsets
+    moves the offsets of mentions along.
+"""
+
+import bisect
+
+
+# the replacements done after stripping the text and capitalizing its first
+# letter, in order
+REPLACEMENTS = (("’", "'"), ("' ", "'"), ("D'", "d'"), ("L'", "l'"), (" De ", " de "), (" Di ", " di "))
+
+
+def read_mentions(element, tag):
+    """Return the text of the XML element given in argument (its text method
+    serialization, without tail) and the (text, annotation, start, end) of its
+    descendants with the given tag, in document order."""
+
+    parts = []
+    mentions = []
+    length = 0
+
+    def visit(node):
+        nonlocal length
+        if node.tag == tag:
+            position = len(mentions)
+            mentions.append(None)
+            start = length
+        if node.text:
+            parts.append(node.text)
+            length += len(node.text)
+        for child in node:
+            if isinstance(child.tag, str):  # not a comment or processing instruction
+                visit(child)
+            if child.tail:
+                parts.append(child.tail)
+                length += len(child.tail)
+        if node.tag == tag:
+            mentions[position] = (node.text or "", node.attrib.get("annotation", ""), start, length)
+
+    visit(element)
+    return "".join(parts), mentions
+
+
+def _replace(text, offsets, old, new):
+    """Return text.replace(old, new) and the offsets given in argument moved
+    accordingly. An offset inside a replaced occurrence stays inside its
+    replacement."""
+
+    if len(old) == len(new):
+        return text.replace(old, new), offsets
+
+    starts = []
+    i = text.find(old)
+    while i != -1:
+        starts.append(i)
+        i = text.find(old, i + len(old))
+    if not starts:
+        return text, offsets
+
+    delta = len(new) - len(old)
+    moved = []
+    for offset in offsets:
+        k = bisect.bisect_right(starts, offset - len(old))  # occurrences ending before offset
+        if k < len(starts) and starts[k] < offset:
+            moved.append(starts[k] + k * delta + min(offset - starts[k], len(new)))
+        else:
+            moved.append(offset + k * delta)
+    return text.replace(old, new), moved
+
+
+def normalize_offsets(text, offsets):
+    """Return the normalized text given in argument, as the normalize
+    functions of the processing modules do, and the offsets given in argument
+    moved to the same characters in the normalized text."""
+
+    stripped = text.lstrip()
+    lead = len(text) - len(stripped)
+    text = stripped.rstrip()
+    offsets = [min(max(offset - lead, 0), len(text)) for offset in offsets]
+    if not text:
+        return text, offsets
+
+    first = text[0].upper()
+    text = first + text[1:]
+    offsets = [offset + len(first) - 1 if offset > 0 else offset for offset in offsets]
+    for old, new in REPLACEMENTS:
+        text, offsets = _replace(text, offsets, old, new)
+    return text, offsets
+
+
+def make_spans(text, mentions, target_property):
+    """Return the text given in argument with a <span> around each mention.
+    Mentions with the same offsets are merged when target_property is set,
+    a mention overlapping the previous one is left out."""
+
+    if not mentions:
+        return text[:]
+
+    if target_property:
+        squashed = [mentions[0]]
+        for mention in mentions[1:]:
+            if mention[2] == squashed[-1][2] and mention[3] == squashed[-1][3]:  # same spans: merge annotations
+                squashed[-1] = (squashed[-1][0] + " | " + mention[0], squashed[-1][1], squashed[-1][2], squashed[-1][3], squashed[-1][4])
+            else:
+                squashed.append(mention)
+    else:
+        squashed = mentions[:]
+    kept = []
+    for mention in squashed:
+        if not kept or mention[2] >= kept[-1][3]:
+            kept.append(mention)
+    squashed = kept
+
+    prev = len(text)
+    parts = []
+    for mention, annotation, start, end, qid in squashed[::-1]:
+        parts.append(text[end:prev])
+        if target_property:
+            parts.append(f'<span id="Entity" title="{mention}">{text[start:end]}</span>')
+        else:
+            parts.append(f'<span id="Entity" title="{annotation}">{text[start:end]}</span>')
+        prev = start
+    parts.append(text[:prev])
+    return "".join(parts[::-1])
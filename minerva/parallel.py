@@ -0,0 +1,89 @@
+"""description:
+    Process the members of a zip archive independently, possibly in a pool of
+    processes, and merge their partial results in the order of the members so
+    that the output does not depend on the number of processes.
+"""
+
+import collections
+import concurrent.futures
+import io
+import os
+
+
+_worker_kwargs = {}
+
+
+def _init_worker(kwargs):
+    global _worker_kwargs
+    _worker_kwargs = kwargs
+
+
+def _run(function, name, data):
+    return function(name, io.BytesIO(data), **_worker_kwargs)
+
+
+def map_members(function, ziparchive, names, n_workers=1, **kwargs):
+    """Yield function(name, stream, **kwargs) for every name of the zip archive
+    given in argument, in the order of names.
+
+    If n_workers is not 1, members are processed in a pool of n_workers
+    processes (-1 to use every core). kwargs are then sent once to each
+    process and at most 2 * n_workers members are read in advance.
+    """
+
+    if n_workers == 1:
+        for name in names:
+            with ziparchive.open(name) as stream:
+                yield function(name, stream, **kwargs)
+        return
+
+    if n_workers < 1:
+        n_workers = os.cpu_count()
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_worker, initargs=(kwargs,)
+    ) as executor:
+        pending = collections.deque()
+        for name in names:
+            pending.append(executor.submit(_run, function, name, ziparchive.read(name)))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def track(items, progress, phase, total):
+    """Yield the items given in argument, calling progress(phase, done, total)
+    before the first one and each time the consumer asks for the next one.
+    Nothing is reported if progress is None."""
+
+    if progress is None:
+        yield from items
+        return
+
+    progress(phase, 0, total)
+    for done, item in enumerate(items, 1):
+        yield item
+        progress(phase, done, total)
+
+
+def merge_backtotext(backtotext, sentence_ids, partial_backtotext, partial_sentences):
+    """Add the back-to-text pointers of a partial result to the global ones.
+
+    Parameters
+    ----------
+    backtotext : dict[str, dict[int, None]]
+        name -> ordered set of global sentence ids, updated in place.
+    sentence_ids : dict[tuple[str, str], int]
+        (source, annotated text) -> global sentence id, updated in place.
+    partial_backtotext : dict[str, list[int]]
+        name -> local sentence ids of the partial result.
+    partial_sentences : list[tuple[str, str]]
+        the (source, annotated text) of each local sentence id.
+    """
+
+    ids = [sentence_ids.setdefault(sentence, len(sentence_ids)) for sentence in partial_sentences]
+    for name, pointers in partial_backtotext.items():
+        pointer_set = backtotext.setdefault(name, {})
+        for pointer in pointers:
+            pointer_set[ids[pointer]] = None
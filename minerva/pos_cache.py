@@ -0,0 +1,136 @@
+"""description:
+    On-disk cache of POS-tagged sentences. Sentences are keyed by a hash of
+    their (normalized) text and of the name and version of the spacy model
+    that tagged them, so that re-uploading a corpus with other filters does
+    not need spacy again.
+
+    The cache is a single SQLite file. It holds at most max_entries sentences,
+    the least recently used ones are evicted first. Each process keeps its own
+    count of the rows, the table is only counted again when it goes beyond
+    max_entries: processes sharing the file may briefly exceed it by the rows
+    the others added.
+"""
+
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+Token = collections.namedtuple("Token", ["text", "idx", "tag_"])
+
+
+def model_signature(nlp):
+    """Return the name and version of the spacy model given in argument."""
+
+    return meta_signature(nlp.meta)
+
+
+def meta_signature(meta):
+    """Same as model_signature, from the meta data of the model."""
+
+    return f"{meta['lang']}_{meta['name']}", meta["version"]
+
+
+def tokens_from_doc(document):
+    return [Token(token.text, token.idx, token.tag_) for token in document]
+
+
+class PosTagCache:
+    def __init__(self, path, model_name, model_version, max_entries=1_000_000):
+        self.path = str(path)
+        self.model_name = model_name
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS tags (key TEXT PRIMARY KEY, tokens TEXT NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS tags_last_used ON tags (last_used)")
+        self._connection.commit()
+        self._clock = self._connection.execute("SELECT COALESCE(MAX(last_used), 0) FROM tags").fetchone()[0]
+        self._size = self._connection.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+
+    def __getstate__(self):
+        # connections cannot be shared between processes: workers open their own.
+        return {
+            "path": self.path,
+            "model_name": self.model_name,
+            "model_version": self.model_version,
+            "max_entries": self.max_entries,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def key(self, text):
+        content = f"{self.model_name}\x00{self.model_version}\x00{text}"
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts):
+        """Return the list of cached tokens for each text, None when the text
+        is not in the cache."""
+
+        keys = [self.key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):  # stay below SQLite's parameter limit
+                chunk = keys[i: i+500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, tokens FROM tags WHERE key IN ({placeholders})", chunk
+                )
+                found.update(rows)
+            self._clock += 1
+            self._connection.executemany(
+                "UPDATE tags SET last_used = ? WHERE key = ?", [(self._clock, key) for key in found]
+            )
+            self._connection.commit()
+
+        results = []
+        for key in keys:
+            tokens = found.get(key)
+            if tokens is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append([Token(*token) for token in json.loads(tokens)])
+        return results
+
+    def put_many(self, items):
+        """Store (text, tokens) pairs, then evict the least recently used
+        sentences if the cache grew beyond max_entries."""
+
+        rows = [
+            (self.key(text), json.dumps([tuple(token) for token in tokens], ensure_ascii=False, separators=(",", ":")))
+            for text, tokens in items
+        ]
+        with self._lock:
+            self._clock += 1
+            rows = [(key, tokens, self._clock) for key, tokens in rows]
+            inserted = self._connection.executemany(
+                "INSERT OR IGNORE INTO tags (key, tokens, last_used) VALUES (?, ?, ?)", rows
+            ).rowcount
+            if inserted < len(rows):  # some were already there, stored by another process
+                self._connection.executemany(
+                    "UPDATE tags SET tokens = ?, last_used = ? WHERE key = ?",
+                    [(tokens, last_used, key) for key, tokens, last_used in rows]
+                )
+            self._size += inserted
+            if self._size > self.max_entries:
+                self._size = self._connection.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+            if self._size > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM tags WHERE key IN (SELECT key FROM tags ORDER BY last_used LIMIT ?)",
+                    (self._size - self.max_entries,)
+                )
+                self._size = self.max_entries
+            self._connection.commit()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
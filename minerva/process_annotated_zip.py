@@ -14,58 +14,12 @@ import pathlib
 import collections
 import re
 
-from lxml import etree
 
-import hashlib
-from wikidataintegrator import wdi_core
-
-
-datatype2url = {
-    "commonsMedia": "https://upload.wikimedia.org/wikipedia/commons"
-}
-
-
-def url_from_filename(filename, datatype="commonsMedia"):
-    name = filename.replace(" ", "_")
-    md5 = hashlib.md5(name.encode("utf-8")).hexdigest()
-    datatypeurl = datatype2url[datatype]
-    p1 = md5[:1]
-    p2 = md5[:2]
-    url = f"{datatypeurl}/{p1}/{p2}/{name}"
-
-    return url
-
-
-def url_from_qid(qid, kb=None):
-    """
-    Raises
-    ------
-    KeyError
-        - If the QID does not exist / is not present.
-        - if there are no image claims for QID.
-    """
-
-    if kb is None:
-        item = wdi_core.WDItemEngine(wd_item_id=qid).get_wd_json_representation()
-    else:
-        item = kb[qid]
-
-    snak = item["claims"]["P18"][0]["mainsnak"]
-    datatype = snak["datatype"]
-    filename = snak["datavalue"]["value"]
-    return url_from_filename(filename, datatype=datatype)
-
-
-def url_from_wikidata(qid):
-    """
-    Raises
-    ------
-    KeyError
-        - If the QID does not exist.
-        - if there are no image claims for QID.
-    """
-
-    return url_from_qid(qid, kb=None)
+from image_index import ImageIndex
+import tei_reader
+from parallel import map_members, merge_backtotext, track
+from instrumentation import Timings
+from markup import read_mentions, normalize_offsets, make_spans
 
 
 def normalize(name):
@@ -80,100 +34,195 @@ def normalize(name):
     return name
 
 
-def process_annotated_zip(
-    ziparchive, knowledge_base, annotation_filter="", author_xpath="",
-):
-    """
-    Parameters
-    ----------
-    ziparchive : zipfile.ZipFile
-    knowledge_base : dict
-    annotation_filter : str
-    """
+# The counts of one file of the corpus. Partial results are merged in the
+# order of files by process_annotated_zip. backtotext refers to sentences by
+# their index in the sentences list of the same partial result.
+OpinionPartial = collections.namedtuple(
+    "OpinionPartial",
+    ["links", "ne_set", "sentiment_set", "author_set", "backtotext", "sentences", "annotations"]
+)
 
-    data = {"nodes":[], "links":[]}
-    links = collections.Counter()
-    ne_set = set()
-    sentiment_set = set()
-    author_set = set()
-    backtotext = collections.defaultdict(list)
-    xmlns = "http://www.tei-c.org/ns/1.0"
-    images = {}
-    tried = set()
 
+def author_query(author_xpath):
+    """Return the ElementPath query (with namespaces) of the author XPath given
+    in argument, '' if there is none."""
+
+    xmlns = tei_reader.xmlns
     xpath_query = author_xpath or ''
     if xpath_query:
         xpath_query = xpath_query.replace("/", f"/{{{xmlns}}}")
         xpath_query = xpath_query.replace(f"/{{{xmlns}}}/{{{xmlns}}}", f"//{{{xmlns}}}")
         if xpath_query[0].isalpha():
             xpath_query = f"{{{xmlns}}}" + xpath_query
+    return xpath_query
 
-    to_qid = knowledge_base["qids"]
 
-    names = [name for name in ziparchive.namelist() if name.endswith(".xml")]
-    for filename in sorted(
-        names,
-        key=lambda x: [int(i) for i in pathlib.Path(x).stem.split("_")[:-3:-1]]
-    ):
-        basename = pathlib.Path(filename).name
-        tree = etree.fromstring(ziparchive.open(filename).read())
-        annotated_sentences = tree.findall(f".//{{{xmlns}}}s[@annotation]")
+def normalize_sentence(text, mentions):
+    """Return the normalized text of a sentence and its (text, annotation,
+    start, end) mentions with offsets in the normalized text."""
 
-        if xpath_query:
-            author = tree.findall(xpath_query)[0].text
-        else:
-            author = ''
+    content, offsets = normalize_offsets(text, [offset for mention in mentions for offset in mention[2:]])
+    mentions = [
+        (mention, annotation, offsets[2*i], offsets[2*i+1])
+        for i, (mention, annotation, start, end) in enumerate(mentions)
+    ]
+    return content, mentions
+
+
+def iter_sentences(stream, xpath_query=""):
+    """Yield the (author, annotation, content, mentions) tuples of the
+    annotated sentences of the XML-TEI file given in argument, mentions being
+    (text, annotation, start, end) tuples, offsets in content."""
+
+    xmlns = tei_reader.xmlns
+    for author, sentence in tei_reader.iter_sentences(stream, author_query=xpath_query):
+        if "annotation" not in sentence.attrib:
+            continue
+
+        content, mentions = normalize_sentence(*read_mentions(sentence, f"{{{xmlns}}}Entity"))
+        yield author, sentence.attrib["annotation"], content, mentions
+
+
+def iter_index_sentences(corpus_index, file_id, xpath_query=""):
+    """Yield the annotated sentences of a file of a corpus_index.CorpusIndex,
+    see iter_sentences."""
+
+    author = corpus_index.author(file_id, xpath_query)
+    for i in corpus_index.file_sentences(file_id):
+        sentence = corpus_index.sentence(i)
+        if sentence.annotation is None:
+            continue
+
+        content, mentions = normalize_sentence(sentence.text, sentence.mentions)
+        yield author, sentence.annotation, content, mentions
+
+
+def count_sentences(basename, sentences, annotation_filter=""):
+    """Return the OpinionPartial of the sentences given by iter_sentences."""
+
+    links = collections.Counter()
+    ne_set = set()
+    sentiment_set = set()
+    author_set = set()
+    backtotext = collections.defaultdict(dict)  # name -> ordered set of sentence ids
+    sentence_ids = {}  # (source, annotated text) -> sentence id
+    annotations = {}  # ordered set of annotations, for image lookup
+
+    for author, sentence_annotation, content, mentions in sentences:
         if author:
             author_set.add(author)
 
-        for sentence in annotated_sentences:
-            sentiments_raw = sorted(a.strip() for a in sentence.attrib["annotation"].split("|"))
-            sentiments = sentiments_raw[:]
-
-            content = normalize(etree.tostring(sentence, method="text", encoding="utf-8").decode("utf-8").strip())
-            mentions = set([
-                (normalize(entity.text), entity.attrib["annotation"])
-                for entity in sentence.findall(f".//{{{xmlns}}}Entity")
-            ])
-            mentions = set(
-                (mention, entity) for mention, entity in mentions
-                if '|' not in entity and annotation_filter in entity
-            )
-
-            if not mentions:
-                continue
-
-            annotated_content = content[:]
-            for mention, annotation in mentions:
-                annotated_content = annotated_content.replace(
-                    mention, f'<span id="Entity" title="{annotation}">{mention}</span>'
-                )
-
-            for text, annotation in mentions:
-                if annotation not in tried:
-                    tried.add(annotation)
-                    try:
-                        images[annotation] = url_from_wikidata(to_qid.get(annotation, "NIL"))
-                    except KeyError as ke:
-                        pass
-
-                ne_set.add((text, annotation))
-
-                data_pointer = {"source": basename, "text": annotated_content}
-                if data_pointer not in backtotext[text]:
-                    backtotext[text].append(data_pointer)
-                if author and data_pointer not in backtotext[author]:
-                    backtotext[author].append(data_pointer)
-                for sentiment in sentiments:
-                    if author:
-                        sentiment += f"_{text}_{author}"
-                        links[(author, sentiment)] += 1
-                    links[(text, sentiment)] += 1
-                    sentiment_set.add(sentiment)
-                    if data_pointer not in backtotext[sentiment]:
-                        backtotext[sentiment].append(data_pointer)
-
-    backtotext = dict(backtotext)
+        sentiments_raw = sorted(a.strip() for a in sentence_annotation.split("|"))
+        sentiments = sentiments_raw[:]
+
+        mentions = [
+            (normalize(text), annotation, start, end) for text, annotation, start, end in mentions
+            if '|' not in annotation and annotation_filter in annotation
+        ]
+
+        if not mentions:
+            continue
+
+        annotated_content = make_spans(
+            content, [(text, annotation, start, end, None) for text, annotation, start, end in mentions], None
+        )
+
+        for text, annotation in dict.fromkeys((text, annotation) for text, annotation, start, end in mentions):
+            annotations.setdefault(annotation, None)
+
+            ne_set.add((text, annotation))
+
+            data_pointer = sentence_ids.setdefault((basename, annotated_content), len(sentence_ids))
+            backtotext[text][data_pointer] = None
+            if author:
+                backtotext[author][data_pointer] = None
+            for sentiment in sentiments:
+                if author:
+                    sentiment += f"_{text}_{author}"
+                    links[(author, sentiment)] += 1
+                links[(text, sentiment)] += 1
+                sentiment_set.add(sentiment)
+                backtotext[sentiment][data_pointer] = None
+
+    return OpinionPartial(
+        links,
+        ne_set,
+        sentiment_set,
+        author_set,
+        {name: list(pointers) for name, pointers in backtotext.items()},
+        list(sentence_ids),
+        list(annotations),
+    )
+
+
+def process_file(filename, stream, annotation_filter="", xpath_query="", timings=None):
+    """Return the OpinionPartial of the XML-TEI file given in argument."""
+
+    if timings is None:
+        timings = Timings()
+    basename = pathlib.Path(filename).name
+    sentences = timings.timed(iter_sentences(stream, xpath_query=xpath_query), "parsing")
+    with timings.phase("counting"):
+        return count_sentences(basename, sentences, annotation_filter=annotation_filter)
+
+
+def sorted_names(names):
+    """Sort XML file names by the numbers at the end of their stem."""
+
+    return sorted(
+        (name for name in names if name.endswith(".xml")),
+        key=lambda x: [int(i) for i in pathlib.Path(x).stem.split("_")[:-3:-1]]
+    )
+
+
+def opinion_graph(partials, image_index, xpath_query="", progress=None, timings=None):
+    """Return the graph data of the OpinionPartial results given in argument,
+    merged in order. Entity images are looked up in image_index."""
+
+    if timings is None:
+        timings = Timings()
+
+    links = collections.Counter()
+    ne_set = set()
+    sentiment_set = set()
+    author_set = set()
+    backtotext = {}  # name -> ordered set of sentence ids
+    sentence_ids = {}  # (source, annotated text) -> sentence id
+    images = {}
+    tried = set()
+
+    with timings.phase("merging"):
+        for partial in partials:
+            links.update(partial.links)
+            ne_set.update(partial.ne_set)
+            sentiment_set.update(partial.sentiment_set)
+            author_set.update(partial.author_set)
+            merge_backtotext(backtotext, sentence_ids, partial.backtotext, partial.sentences)
+            with timings.phase("images"):
+                for annotation in partial.annotations:
+                    if annotation not in tried:
+                        tried.add(annotation)
+                        url = image_index.get(annotation)
+                        if url:
+                            images[annotation] = url
+
+    if progress is not None:
+        progress("graph", 0, 1)
+    with timings.phase("graph"):
+        graph = build_graph(links, ne_set, sentiment_set, author_set, backtotext, sentence_ids, images, xpath_query)
+    timings.count("sentences", len(sentence_ids))
+    timings.count("mentions", len(ne_set))
+    timings.count("images", len(images))
+    timings.count("links", len(graph["data"]["links"]))
+    return graph
+
+
+def build_graph(links, ne_set, sentiment_set, author_set, backtotext, sentence_ids, images, xpath_query=""):
+    """Return the graph data of merged OpinionPartial results."""
+
+    data = {"nodes":[], "links":[]}
+    backtotext = {name: list(pointers) for name, pointers in backtotext.items()}
+    sentences = [{"source": source, "text": text} for source, text in sentence_ids]
     author_set = set(link[0] for link in links if link[0] in author_set)  # remove authors that did not emit an opinion on target
     mention_set = set(ne[0] for ne in ne_set)
 
@@ -205,10 +254,84 @@ def process_annotated_zip(
     return {
         "data": data,
         "back_to_text": backtotext,
+        "sentences": sentences,
         "name2image" : images
     }
 
 
+def process_annotated_zip(
+    ziparchive, knowledge_base, annotation_filter="", author_xpath="", image_index=None, n_workers=1,
+    progress=None, timings=None,
+):
+    """
+    Parameters
+    ----------
+    ziparchive : zipfile.ZipFile
+    knowledge_base : dict
+    annotation_filter : str
+    image_index : image_index.ImageIndex
+        where entity images are looked up (default: no images).
+    n_workers : int
+        number of processes the files are processed in (-1 to use every core).
+    progress : callable
+        called as progress(phase, done, total) while files are read (phase
+        "reading") and when the graph is built (phase "graph").
+    timings : instrumentation.Timings
+        where the time spent in each phase and counters are added (default:
+        not reported). Parsing and counting are only detailed when n_workers
+        is 1.
+    """
+
+    if timings is None:
+        timings = Timings()
+    xpath_query = author_query(author_xpath)
+    if image_index is None:
+        image_index = ImageIndex(knowledge_base["qids"], {})
+
+    names = sorted_names(ziparchive.namelist())
+    kwargs = {"timings": timings} if n_workers == 1 else {}  # timings stay in this process
+    partials = map_members(
+        process_file,
+        ziparchive,
+        names,
+        n_workers=n_workers,
+        annotation_filter=annotation_filter,
+        xpath_query=xpath_query,
+        **kwargs,
+    )
+    partials = timings.timed(partials, "reading" if n_workers == 1 else "workers")
+    partials = track(partials, progress, "reading", len(names))
+    return opinion_graph(partials, image_index, xpath_query=xpath_query, progress=progress, timings=timings)
+
+
+def process_annotated_index(
+    corpus_index, knowledge_base, annotation_filter="", author_xpath="", image_index=None, progress=None,
+    timings=None,
+):
+    """Same as process_annotated_zip, reading a corpus_index.CorpusIndex built
+    from the zip instead of parsing it."""
+
+    if timings is None:
+        timings = Timings()
+
+    xpath_query = author_query(author_xpath)
+    if image_index is None:
+        image_index = ImageIndex(knowledge_base["qids"], {})
+
+    file_ids = {name: file_id for file_id, name in enumerate(corpus_index.names)}
+    names = sorted_names(corpus_index.names)
+    partials = (
+        count_sentences(
+            pathlib.Path(name).name,
+            timings.timed(iter_index_sentences(corpus_index, file_ids[name], xpath_query=xpath_query), "index"),
+            annotation_filter=annotation_filter,
+        )
+        for name in track(names, progress, "reading", len(names))
+    )
+    partials = timings.timed(partials, "counting")
+    return opinion_graph(partials, image_index, xpath_query=xpath_query, progress=progress, timings=timings)
+
+
 if __name__ == "__main__":
     import sys
     import argparse
@@ -12,67 +12,50 @@
 import json
 import pathlib
 import collections
+import itertools
 import re
 
-from lxml import etree
-
-import hashlib
-from wikidataintegrator import wdi_core
+from image_index import ImageIndex
+import tei_reader
+from parallel import map_members, merge_backtotext, track
+from association import CooccurrenceMatrix, MEASURES
 
 import math
 
-import spacy
+import threading
 
+import spacy
 
-tagger = spacy.load("fr_core_news_md", exclude=["ner", "parser"])
+from pos_cache import tokens_from_doc, meta_signature
+from instrumentation import Timings
+from markup import make_spans
 
 
-datatype2url = {
-    "commonsMedia": "https://upload.wikimedia.org/wikipedia/commons"
-}
+MODEL = "fr_core_news_md"
+_tagger = None
+_tagger_lock = threading.Lock()
 
 
-def url_from_filename(filename, datatype="commonsMedia"):
-    name = filename.replace(" ", "_")
-    md5 = hashlib.md5(name.encode("utf-8")).hexdigest()
-    datatypeurl = datatype2url[datatype]
-    p1 = md5[:1]
-    p2 = md5[:2]
-    url = f"{datatypeurl}/{p1}/{p2}/{name}"
+def get_tagger():
+    """Return the spacy tagger, loading it on first use."""
 
-    return url
+    global _tagger
+    if _tagger is None:
+        with _tagger_lock:
+            if _tagger is None:
+                _tagger = spacy.load(MODEL, exclude=["ner", "parser"])
+    return _tagger
 
 
-def url_from_qid(qid, kb=None):
-    """
-    Raises
-    ------
-    KeyError
-        - If the QID does not exist / is not present.
-        - if there are no image claims for QID.
-    """
+def tagger_loaded():
+    return _tagger is not None
 
-    if kb is None:
-        item = wdi_core.WDItemEngine(wd_item_id=qid).get_wd_json_representation()
-    else:
-        item = kb[qid]
 
-    snak = item["claims"]["P18"][0]["mainsnak"]
-    datatype = snak["datatype"]
-    filename = snak["datavalue"]["value"]
-    return url_from_filename(filename, datatype=datatype)
+def tagger_signature():
+    """Return the pos_cache.model_signature of the tagger, without loading
+    it."""
 
-
-def url_from_wikidata(qid):
-    """
-    Raises
-    ------
-    KeyError
-        - If the QID does not exist.
-        - if there are no image claims for QID.
-    """
-
-    return url_from_qid(qid, kb=None)
+    return meta_signature(spacy.info(MODEL))
 
 
 def normalize(name):
@@ -127,183 +110,444 @@ def preprocess_mentions(mentions, qid_to_claims, target_property):
     return remaining
 
 
-def make_spans(text, mentions, target_property):
-    if not mentions:
-        return text[:]
+def prune_outliers(single_count, links, nodes, backtotext, cooccurrent_set, mention_set):
+    """Remove every item seen only once from the counts, links, nodes and
+    back-to-text data given in argument. Each structure is filtered once,
+    the filtered versions are returned in the same order.
+    """
 
-    if target_property:
-        squashed = [mentions[0]]
-        for mention in mentions[1:]:
-            if mention[2] == squashed[-1][2] and mention[3] == squashed[-1][3]:  # same spans: merge annotations
-                squashed[-1] = (squashed[-1][0] + " | " + mention[0], squashed[-1][1], squashed[-1][2], squashed[-1][3], squashed[-1][4])
-            else:
-                squashed.append(mention)
-    else:
-        squashed = mentions[:]
+    singletons = set(item for item, count in single_count.items() if count == 1)
+    if not singletons:
+        return single_count, links, nodes, backtotext, cooccurrent_set, mention_set
 
-    prev = len(text)
-    parts = []
-    for mention, annotation, start, end, qid in squashed[::-1]:
-        parts.append(text[end:prev])
-        if target_property:
-            parts.append(f'<span id="Entity" title="{mention}">{text[start:end]}</span>')
-        else:
-            parts.append(f'<span id="Entity" title="{annotation}">{text[start:end]}</span>')
-        prev = start
-    parts.append(text[:prev])
-    return "".join(parts[::-1])
+    single_count = collections.Counter(
+        {item: count for item, count in single_count.items() if item not in singletons}
+    )
+    links = {
+        key: val for key, val in links.items()
+        if key[0] not in singletons and key[1] not in singletons
+    }
+    nodes = set((mention, annotation) for mention, annotation in nodes if mention not in singletons)
+    backtotext = {item: pointers for item, pointers in backtotext.items() if item not in singletons}
+    cooccurrent_set = cooccurrent_set - singletons
+    mention_set = mention_set - singletons
+    return single_count, links, nodes, backtotext, cooccurrent_set, mention_set
 
 
-def process_zip_cooc(
-    ziparchive, knowledge_base, qid_to_claims, pos_filter=set(), target_property=None, max_degree=10
-):
+def iter_sentences(filename, stream, to_qid, qid_to_claims, target_property, timings=None):
+    """Yield the (content, (basename, mentions)) pairs of every sentence of the
+    XML-TEI file given in argument that has mentions. The layout matches what
+    spacy's Language.pipe expects when as_tuples is True.
     """
-    Parameters
-    ----------
-    ziparchive : zipfile.ZipFile
-    knowledge_base : dict
-    pos_filter : set[str]
+
+    if timings is None:
+        timings = Timings()
+    basename = pathlib.Path(filename).name
+    for author, sentence in tei_reader.iter_sentences(stream):
+        with timings.phase("preprocessing"):
+            content, mentions = preprocess_sentence(sentence, to_qid)
+            mentions = preprocess_mentions(mentions, qid_to_claims, target_property)
+
+        if not content:
+            continue
+        if not mentions:
+            continue
+
+        yield content, (basename, mentions)
+
+
+def iter_zip_sentences(ziparchive, names, to_qid, qid_to_claims, target_property, timings=None):
+    """Yield the sentences of every file of the zip archive, see
+    iter_sentences."""
+
+    for filename in names:
+        with ziparchive.open(filename) as stream:
+            yield from iter_sentences(filename, stream, to_qid, qid_to_claims, target_property, timings=timings)
+
+
+def iter_index_sentences(corpus_index, file_ids, to_qid, qid_to_claims, target_property):
+    """Yield the tagged sentences of some files of a corpus_index.CorpusIndex,
+    with the layout of tag_sentences. Tokens come from the index, so spacy is
+    not needed.
     """
 
-    data = {"nodes":[], "links":[]}
+    for file_id in file_ids:
+        basename = pathlib.Path(corpus_index.names[file_id]).name
+        for i in corpus_index.file_sentences(file_id):
+            sentence = corpus_index.sentence(i)
+            if not sentence.valid:
+                raise ValueError(f"Non entity tag in annotated XML: {corpus_index.names[file_id]}")
+            mentions = [
+                (text, annotation, start, end, to_qid.get(annotation, "NIL"))
+                for text, annotation, start, end in sentence.mentions
+            ]
+            mentions = [mention for mention in mentions if mention[4] != "NIL"]
+            mentions = preprocess_mentions(mentions, qid_to_claims, target_property)
+
+            if not mentions:
+                continue
+            content = normalize(sentence.text) if sentence.text.strip() else ""
+            if not content:
+                continue
+
+            yield content, corpus_index.tokens(i, content), (basename, mentions)
+
+
+def tag_sentences(sentences, batch_size=1000, n_process=1, cache=None, progress=None):
+    """Tag sentences given by iter_sentences in batches, yielding
+    (content, tokens, (basename, mentions)) in the same order.
+
+    If a cache is given, sentences are looked up batch_size at a time (times
+    n_process) and only the ones missing from the cache go through the
+    tagger, in a single pipe so that its processes are started once. New
+    results are stored in the cache batch_size at a time and sentences are
+    yielded as soon as they and the ones before them are tagged. With or
+    without a cache, progress(phase, done, total) is called once per batch
+    (phase "tagging", total 0 as the number of sentences is not known in
+    advance).
+    """
+
+    if cache is None:
+        documents = get_tagger().pipe(sentences, as_tuples=True, batch_size=batch_size, n_process=n_process)
+        done = 0
+        for done, (document, context) in enumerate(documents, 1):
+            yield document.text, tokens_from_doc(document), context
+            if progress is not None and done % batch_size == 0:
+                progress("tagging", done, 0)
+        if progress is not None and done % batch_size:
+            progress("tagging", done, 0)
+        return
+
+    sentences = iter(sentences)
+    chunk_size = batch_size * max(n_process, 1)
+    pending = collections.deque()  # [content, tokens, context] in order, tokens are None until tagged
+    to_tag = {}  # sentence number -> its entry in pending, numbers are the contexts given to the tagger
+    new_entries = []
+
+    def missing():
+        # an empty text is given for batches without missing sentences, so
+        # that their cached sentences are yielded without waiting for the next
+        # missing one.
+        number = 0
+        while True:
+            batch = list(itertools.islice(sentences, chunk_size))
+            if not batch:
+                return
+            cached = cache.get_many([content for content, context in batch])
+            n_missing = 0
+            for (content, context), tokens in zip(batch, cached):
+                entry = [content, tokens, context]
+                pending.append(entry)
+                if tokens is None:
+                    to_tag[number] = entry
+                    n_missing += 1
+                    yield content, number
+                number += 1
+            if not n_missing:
+                yield "", None
+
+    def ready():
+        nonlocal done
+        while pending and pending[0][1] is not None:
+            content, tokens, context = pending.popleft()
+            yield content, tokens, context
+            done += 1
+            if progress is not None and done % chunk_size == 0:
+                progress("tagging", done, 0)
+
+    done = 0
+    try:
+        documents = get_tagger().pipe(missing(), as_tuples=True, batch_size=batch_size, n_process=n_process)
+        for document, number in documents:
+            if number is not None:
+                entry = to_tag.pop(number)
+                entry[1] = tokens_from_doc(document)
+                new_entries.append((entry[0], entry[1]))
+                if len(new_entries) >= batch_size:
+                    cache.put_many(new_entries)
+                    new_entries = []
+            yield from ready()
+        yield from ready()
+    finally:
+        if new_entries:
+            cache.put_many(new_entries)
+    if progress is not None and done % chunk_size:
+        progress("tagging", done, 0)
+
+
+# The counts of some sentences of the corpus, as computed by count_sentences.
+# Partial results are merged in the order of files by count_cooccurrences.
+# backtotext refers to sentences by their index in the sentences list of the
+# same partial result. n_tagged is the number of tagged sentences, tag cache
+# hits and misses are those of the cache of the process that tagged them.
+CooccurrencePartial = collections.namedtuple(
+    "CooccurrencePartial",
+    [
+        "nodes", "links", "single_count", "cooccurrent_set", "mention_set", "n_sentences",
+        "backtotext", "sentences", "annotations", "n_tagged", "tag_cache_hits", "tag_cache_misses",
+    ],
+    defaults=(0, 0, 0),
+)
+
+
+# The counts process_zip_cooc computes from a corpus, before any association
+# measure is applied. They do not depend on the measure or max_degree.
+CooccurrenceCounts = collections.namedtuple(
+    "CooccurrenceCounts",
+    ["nodes", "links", "single_count", "mention_set", "n_sentences", "backtotext", "sentences", "images"]
+)
+
+
+def count_sentences(tagged, pos_filter=set(), target_property=None):
+    """Return the CooccurrencePartial of the tagged sentences given by
+    tag_sentences."""
+
     nodes = set()
     links = collections.Counter()
     cooccurrent_set = set()
     mention_set = set()
-    global_quark = {}
-    backtotext = collections.defaultdict(list)
-    xmlns = "http://www.tei-c.org/ns/1.0"
+    backtotext = collections.defaultdict(dict)  # name -> ordered set of sentence ids
+    sentence_ids = {}  # (source, annotated text) -> sentence id
+    annotations = {}  # ordered set of annotations, for image lookup
+    single_count = collections.Counter()
+    n_sentences = 0
+    n_tagged = 0
+
+    for content, document, (basename, mentions) in tagged:
+        n_tagged += 1
+        pos_tokens = [
+            pos_token for pos_token in document
+            if not any(
+                mention[2] <= pos_token.idx and (pos_token.idx+len(pos_token.text)) <= mention[3]
+                for mention in mentions
+            )
+        ]
+        pos_tokens = [
+            pos_token.text for pos_token in document
+            if filter_in(pos_token.tag_, pos_filter)
+        ]
+        pos_tokens = [pos_token for pos_token in pos_tokens if not pos_token.isdigit()]
+        pos_tokens = set(pos_tokens)
+
+        single_count.update(pos_tokens)
+
+        if not pos_tokens:
+            continue
+
+        n_sentences += 1
+        annotated_content = make_spans(content, mentions, target_property)
+
+        for mention, annotation, start, end, qid in mentions:
+            single_count[mention] += 1
+            annotations.setdefault(annotation, None)
+
+            data_pointer = sentence_ids.setdefault((basename, annotated_content), len(sentence_ids))
+            backtotext[mention][data_pointer] = None
+            mention_set.add(mention)
+            nodes.add((mention, annotation))
+            for cooccurrent in pos_tokens:
+                links[(mention, cooccurrent)] += 1
+                cooccurrent_set.add(cooccurrent)
+                backtotext[cooccurrent][data_pointer] = None
+
+    return CooccurrencePartial(
+        nodes,
+        links,
+        single_count,
+        cooccurrent_set,
+        mention_set,
+        n_sentences,
+        {name: list(pointers) for name, pointers in backtotext.items()},
+        list(sentence_ids),
+        list(annotations),
+        n_tagged,
+    )
+
+
+def count_file(
+    filename, stream, to_qid=None, qid_to_claims=None, pos_filter=set(), target_property=None,
+    batch_size=1000, tag_cache=None,
+):
+    """Return the CooccurrencePartial of the XML-TEI file given in argument."""
+
+    hits, misses = (tag_cache.hits, tag_cache.misses) if tag_cache is not None else (0, 0)
+    sentences = iter_sentences(filename, stream, to_qid, qid_to_claims, target_property)
+    tagged = tag_sentences(sentences, batch_size=batch_size, cache=tag_cache)
+    partial = count_sentences(tagged, pos_filter=pos_filter, target_property=target_property)
+    if tag_cache is not None:  # in a worker process, its counters are sent back with the result
+        partial = partial._replace(tag_cache_hits=tag_cache.hits - hits, tag_cache_misses=tag_cache.misses - misses)
+    return partial
+
+
+def merge_partials(partials, image_index, progress=None, timings=None):
+    """Return the CooccurrenceCounts of the CooccurrencePartial results given
+    in argument, merged in order. Entity images are looked up in
+    image_index."""
+
+    if timings is None:
+        timings = Timings()
+
+    nodes = set()
+    links = collections.Counter()
+    cooccurrent_set = set()
+    mention_set = set()
+    backtotext = {}  # name -> ordered set of sentence ids
+    sentence_ids = {}  # (source, annotated text) -> sentence id
     images = {}
     tried = set()
     single_count = collections.Counter()
+    n_sentences = 0
+
+    with timings.phase("merging"):
+        for partial in partials:
+            nodes.update(partial.nodes)
+            links.update(partial.links)
+            single_count.update(partial.single_count)
+            cooccurrent_set.update(partial.cooccurrent_set)
+            mention_set.update(partial.mention_set)
+            n_sentences += partial.n_sentences
+            merge_backtotext(backtotext, sentence_ids, partial.backtotext, partial.sentences)
+            with timings.phase("images"):
+                for annotation in partial.annotations:
+                    if annotation not in tried:
+                        tried.add(annotation)
+                        url = image_index.get(annotation)
+                        if url:
+                            images[annotation] = url
+
+        backtotext = {name: list(pointers) for name, pointers in backtotext.items()}
+        sentences = [{"source": source, "text": text} for source, text in sentence_ids]
+    timings.count("sentences", n_sentences)
+    timings.count("mentions", len(mention_set))
+    timings.count("cooccurrences", len(links))
+    timings.count("images", len(images))
+
+    # removing outliers
+    if progress is not None:
+        progress("pruning", 0, 1)
+    with timings.phase("pruning"):
+        single_count, links, nodes, backtotext, cooccurrent_set, mention_set = prune_outliers(
+            single_count, links, nodes, backtotext, cooccurrent_set, mention_set
+        )
+
+    return CooccurrenceCounts(nodes, links, single_count, mention_set, n_sentences, backtotext, sentences, images)
+
+
+def count_cooccurrences(
+    ziparchive, knowledge_base, qid_to_claims, pos_filter=set(), target_property=None,
+    batch_size=1000, n_process=1, tag_cache=None, image_index=None, n_workers=1, progress=None, timings=None,
+):
+    """Return the CooccurrenceCounts of the corpus given in argument. See
+    process_zip_cooc for the parameters."""
+
+    if timings is None:
+        timings = Timings()
 
     to_qid = knowledge_base["qids"]
+    if image_index is None:
+        image_index = ImageIndex(to_qid, qid_to_claims)
+
+    names = sorted(name for name in ziparchive.namelist() if name.endswith(".xml"))
+    if n_workers == 1:
+        # a single pass over the whole corpus, so that tagging batches span files.
+        tracked = track(names, progress, "reading", len(names))
+        sentences = iter_zip_sentences(ziparchive, tracked, to_qid, qid_to_claims, target_property, timings=timings)
+        sentences = timings.timed(sentences, "parsing")
+        tagged = tag_sentences(
+            sentences, batch_size=batch_size, n_process=n_process, cache=tag_cache, progress=progress
+        )
+        tagged = timings.timed(tagged, "tagging")
+        hits, misses = (tag_cache.hits, tag_cache.misses) if tag_cache is not None else (0, 0)
+        with timings.phase("counting"):
+            partials = [count_sentences(tagged, pos_filter=pos_filter, target_property=target_property)]
+        if tag_cache is not None:
+            timings.count("tag cache hits", tag_cache.hits - hits)
+            timings.count("tag cache misses", tag_cache.misses - misses)
+    else:
+        partials = map_members(
+            count_file,
+            ziparchive,
+            names,
+            n_workers=n_workers,
+            to_qid=to_qid,
+            qid_to_claims=qid_to_claims,
+            pos_filter=pos_filter,
+            target_property=target_property,
+            batch_size=batch_size,
+            tag_cache=tag_cache,
+        )
+        partials = track(partials, progress, "reading", len(names))
+        partials = timings.timed(partials, "workers")
+        partials = worker_partials(partials, tag_cache, progress, timings)
+
+    return merge_partials(partials, image_index, progress=progress, timings=timings)
+
+
+def worker_partials(partials, tag_cache, progress, timings):
+    """Yield the partial results of worker processes, reporting the progress
+    of tagging after each one and adding the counters of the tag caches of
+    the workers to tag_cache and timings."""
+
+    n_tagged = 0
+    for partial in partials:
+        n_tagged += partial.n_tagged
+        if progress is not None:
+            progress("tagging", n_tagged, 0)
+        if tag_cache is not None:
+            tag_cache.hits += partial.tag_cache_hits
+            tag_cache.misses += partial.tag_cache_misses
+            timings.count("tag cache hits", partial.tag_cache_hits)
+            timings.count("tag cache misses", partial.tag_cache_misses)
+        yield partial
+
+
+def count_index_cooccurrences(
+    corpus_index, knowledge_base, qid_to_claims, pos_filter=set(), target_property=None, image_index=None,
+    progress=None, timings=None,
+):
+    """Same as count_cooccurrences, reading a corpus_index.CorpusIndex built
+    from the zip instead of parsing and tagging it."""
 
-    names = [name for name in ziparchive.namelist() if name.endswith(".xml")]
-    for filename in sorted(names):
-        basename = pathlib.Path(filename).name
-        tree = etree.fromstring(ziparchive.open(filename).read())
-        sentences = tree.findall(f".//{{{xmlns}}}s")
-        for sentence in sentences:
-            content, mentions = preprocess_sentence(sentence, to_qid)
-            mentions = preprocess_mentions(mentions, qid_to_claims, target_property)
+    if timings is None:
+        timings = Timings()
 
-            if not content:
-                continue
-            if not mentions:
-                continue
+    to_qid = knowledge_base["qids"]
+    if image_index is None:
+        image_index = ImageIndex(to_qid, qid_to_claims)
 
-            document = tagger(content)
+    file_ids = sorted(
+        (file_id for file_id, name in enumerate(corpus_index.names) if name.endswith(".xml")),
+        key=lambda file_id: corpus_index.names[file_id]
+    )
+    file_ids = track(file_ids, progress, "reading", len(file_ids))
+    tagged = iter_index_sentences(corpus_index, file_ids, to_qid, qid_to_claims, target_property)
+    tagged = timings.timed(tagged, "index")
+    with timings.phase("counting"):
+        partial = count_sentences(tagged, pos_filter=pos_filter, target_property=target_property)
+    return merge_partials([partial], image_index, progress=progress, timings=timings)
 
-            pos_tokens = [
-                pos_token for pos_token in document
-                if not any(
-                    mention[2] <= pos_token.idx and (pos_token.idx+len(pos_token)) <= mention[3]
-                    for mention in mentions
-                )
-            ]
-            pos_tokens = [
-                pos_token.text for pos_token in document
-                if filter_in(pos_token.tag_, pos_filter)
-            ]
-            pos_tokens = [pos_token for pos_token in pos_tokens if not pos_token.isdigit()]
-            pos_tokens = set(pos_tokens)
 
-            single_count.update(pos_tokens)
+def cooccurrence_graph(counts, target_property=None, max_degree=10, measure="smoothed_dice"):
+    """Return the graph data of the CooccurrenceCounts given in argument, links
+    being scored by measure (a key of association.MEASURES)."""
 
-            if not pos_tokens:
-                continue
+    data = {"nodes":[], "links":[]}
+    global_quark = {}
 
-            annotated_content = make_spans(content, mentions, target_property)
-
-            for mention, annotation, start, end, qid in mentions:
-                single_count[mention] += 1
-                if annotation not in tried:
-                    tried.add(annotation)
-                    try:
-                        images[annotation] = url_from_wikidata(to_qid.get(annotation, "NIL"))
-                    except KeyError as ke:
-                        pass
-
-                data_pointer = {"source": basename, "text": annotated_content}
-                if data_pointer not in backtotext[mention]:
-                    backtotext[mention].append(data_pointer)
-                mention_set.add(mention)
-                nodes.add((mention, annotation))
-                for cooccurrent in pos_tokens:
-                    links[(mention, cooccurrent)] += 1
-                    cooccurrent_set.add(cooccurrent)
-                    if data_pointer not in backtotext[cooccurrent]:
-                        backtotext[cooccurrent].append(data_pointer)
-
-    backtotext = dict(backtotext)
+    matrix = CooccurrenceMatrix(counts.links, counts.single_count, counts.mention_set, n=counts.n_sentences)
+    scores = matrix.scores(measure, contrast=bool(target_property))
 
-    # removing outliers
-    counts = list(single_count.items())
-    for item, count in counts:
-        if count == 1:
-            try:
-                del single_count[item]
-            except KeyError:
-                pass
-            try:
-                del backtotext[item]
-            except KeyError:
-                pass
-            try:
-                cooccurrent_set.remove(item)
-            except KeyError:
-                pass
-            try:
-                mention_set.remove(item)
-            except KeyError:
-                pass
-            links = {key: val for key, val in links.items() if item not in key}
-            nodes = set((mention, annotation) for mention, annotation in nodes if item != mention)
-
-    # ~ correlation = {}
-    # ~ k = len(single_count)
-    # ~ for key, val in links.items():
-        # ~ mention, cooccurrent = key
-        # ~ ki = single_count[mention]
-        # ~ kj = single_count[cooccurrent]
-        # ~ kij = val
-        # ~ coeff = 2 * kij / (ki+kj)  # dice coefficient -- nice because results are "per one"
-        # ~ correlation[key] = coeff
-    correlation = {}
-    k = len(single_count)
-    smooth = 1
-    for key, val in links.items():
-        mention, cooccurrent = key
-        ki = single_count[mention]
-        kj = single_count[cooccurrent]
-        kij = val
-        coeff = (2 * kij + smooth) / (ki + kj + smooth)  # smoothed dice coefficient
-        if not target_property:
-            correlation[key] = coeff
-        else:
-            links_bar = {key: val for key, val in links.items() if key[0] != mention and key[1] == cooccurrent}
-            ki_bar = sum(single_count.get(other, 0) for other in mention_set if other != mention)
-            kij_bar = sum(links_bar.values())
-            coeff_bar = (2 * kij_bar + smooth) / (ki_bar + kj + smooth)  # smoothed dice coefficient
-            correlation[key] = coeff / coeff_bar
-
-    threshold = 0.02  # used given some examples
-    scale_factor = 1.0 / (threshold * 2)
-    links = {key: val for key,val in links.items() if correlation[key] >= threshold}
-    per_mentions = collections.defaultdict(list)
-    for mention, cooccurrent in links:
-        per_mentions[mention].append((mention, cooccurrent))
-    remaining = []
-    for key in per_mentions:
-        remaining.extend(
-            sorted(per_mentions[key], key=lambda x: correlation[x], reverse=True)[: max_degree]
-        )
-    correlation = {key: correlation[key] for key in remaining}
+    threshold = MEASURES[measure].threshold
+    scale_factor = MEASURES[measure].scale
+    remaining = matrix.top_k(scores, threshold, max_degree)
+    correlation = {matrix.keys[i]: score for i, score in zip(remaining.tolist(), scores[remaining].tolist())}
     cooccurrent_set = set(key[1] for key in correlation)
     mention_set = set(key[0] for key in correlation)
+    per_mentions = collections.defaultdict(list)
+    for mention, cooccurrent in correlation:
+        per_mentions[mention].append(cooccurrent)
 
-    nodes = set((mention, entity) for mention, entity in nodes if mention in mention_set)
+    nodes = set((mention, entity) for mention, entity in counts.nodes if mention in mention_set)
     nodes = sorted(nodes, key=lambda x: x[::-1])
     for cooccurrent in sorted(cooccurrent_set):
         global_quark.setdefault(cooccurrent, len(global_quark))
@@ -317,18 +561,121 @@ def process_zip_cooc(
     for mention, entity in sorted(nodes, key=lambda x: x[::-1]):
         data["nodes"].append({"id": mention, "name": mention, "group": entity, "class": "entity"})
 
-        for cooccurrent in cooccurrents:
-            weight = correlation.get((mention, cooccurrent), 0) * scale_factor
+        for cooccurrent in sorted(per_mentions[mention]):
+            weight = correlation[(mention, cooccurrent)] * scale_factor
             if weight:
                 data["links"].append({"source": mention, "target": cooccurrent, "value": math.ceil(weight),})
 
     return {
         "data": data,
-        "back_to_text": backtotext,
-        "name2image": images,
+        "back_to_text": counts.backtotext,
+        "sentences": counts.sentences,
+        "name2image": counts.images,
     }
 
 
+def score_cooccurrences(
+    counts, target_property=None, max_degree=10, measure="smoothed_dice", progress=None, timings=None,
+):
+    """Return the graph data of the CooccurrenceCounts given in argument, see
+    cooccurrence_graph, reporting it as the "scoring" phase of progress and
+    timings."""
+
+    if timings is None:
+        timings = Timings()
+
+    if progress is not None:
+        progress("scoring", 0, 1)
+    with timings.phase("scoring"):
+        graph = cooccurrence_graph(counts, target_property=target_property, max_degree=max_degree, measure=measure)
+    timings.count("links", len(graph["data"]["links"]))
+    return graph
+
+
+def process_zip_cooc(
+    ziparchive, knowledge_base, qid_to_claims, pos_filter=set(), target_property=None, max_degree=10,
+    batch_size=1000, n_process=1, tag_cache=None, image_index=None, measure="smoothed_dice", n_workers=1,
+    progress=None, timings=None,
+):
+    """
+    Parameters
+    ----------
+    ziparchive : zipfile.ZipFile
+    knowledge_base : dict
+    pos_filter : set[str]
+    batch_size : int
+        number of sentences given to the tagger at once.
+    n_process : int
+        number of tagging processes (-1 to use every core). Only used when
+        n_workers is 1.
+    tag_cache : pos_cache.PosTagCache
+        cache of already tagged sentences (default: no cache).
+    image_index : image_index.ImageIndex
+        where entity images are looked up (default: built from qid_to_claims).
+    measure : str
+        the association measure used to score links, a key of
+        association.MEASURES.
+    n_workers : int
+        number of processes the files are processed in (-1 to use every core).
+    progress : callable
+        called as progress(phase, done, total) while files are read (phase
+        "reading"), while sentences missing from tag_cache are tagged (phase
+        "tagging"), when outliers are removed (phase "pruning") and when links
+        are scored (phase "scoring").
+    timings : instrumentation.Timings
+        where the time spent in each phase and counters are added (default:
+        not reported).
+    """
+
+    if timings is None:
+        timings = Timings()
+
+    counts = count_cooccurrences(
+        ziparchive,
+        knowledge_base,
+        qid_to_claims,
+        pos_filter=pos_filter,
+        target_property=target_property,
+        batch_size=batch_size,
+        n_process=n_process,
+        tag_cache=tag_cache,
+        image_index=image_index,
+        n_workers=n_workers,
+        progress=progress,
+        timings=timings,
+    )
+    return score_cooccurrences(
+        counts, target_property=target_property, max_degree=max_degree, measure=measure, progress=progress,
+        timings=timings,
+    )
+
+
+def process_index_cooc(
+    corpus_index, knowledge_base, qid_to_claims, pos_filter=set(), target_property=None, max_degree=10,
+    image_index=None, measure="smoothed_dice", progress=None, timings=None,
+):
+    """Same as process_zip_cooc, reading a corpus_index.CorpusIndex built from
+    the zip instead of parsing and tagging it."""
+
+    if timings is None:
+        timings = Timings()
+
+    counts = count_index_cooccurrences(
+        corpus_index,
+        knowledge_base,
+        qid_to_claims,
+        pos_filter=pos_filter,
+        target_property=target_property,
+        image_index=image_index,
+        progress=progress,
+        timings=timings,
+    )
+    return score_cooccurrences(
+        counts, target_property=target_property, max_degree=max_degree, measure=measure, progress=progress,
+        timings=timings,
+    )
+
+
 if __name__ == "__main__":
     import sys
     import argparse
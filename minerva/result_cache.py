@@ -0,0 +1,153 @@
+"""description:
+    Cache of finished responses, keyed by a fingerprint of the uploaded corpus
+    and of the parameters of the analysis. Recent responses are kept in memory,
+    all of them are also written on disk. Entries expire after ttl seconds and
+    the least recently used ones are evicted first.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+
+
+# the version of the results of analyses, to be increased when they change
+# for the same corpus and parameters, so that older results are not reused
+FORMAT_VERSION = 1
+
+
+def fingerprint(stream, route, params, signature=(), chunk_size=1 << 20):
+    """Return a key for the analysis of the uploaded file given in argument.
+    The stream is read entirely then rewound.
+
+    Parameters
+    ----------
+    stream : file-like object
+        the uploaded zip, opened in binary mode. None when the analysis reads
+        a corpus index, params should then hold its identifier.
+    route : str
+        the name of the analysis.
+    params : dict
+        the normalized parameters of the analysis, values must be JSON
+        serializable.
+    signature : sequence
+        what the analysis depends on besides the corpus and its parameters
+        (data files, tagger), JSON serializable.
+    """
+
+    digest = hashlib.sha256()
+    digest.update(route.encode("utf-8"))
+    digest.update(json.dumps([FORMAT_VERSION, signature, params], sort_keys=True).encode("utf-8"))
+    if stream is not None:
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            digest.update(chunk)
+        stream.seek(0)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Parameters
+    ----------
+    directory : str or pathlib.Path
+        where responses are written.
+    max_entries : int
+        the maximum number of responses kept in memory.
+    max_disk_bytes : int
+        the maximum size of the responses written on disk.
+    ttl : float
+        the number of seconds a response stays valid.
+    suffix : str
+        the extension of the files responses are written in.
+    """
+
+    def __init__(self, directory, max_entries=32, max_disk_bytes=1 << 30, ttl=7 * 24 * 3600, suffix=".json"):
+        self.directory = pathlib.Path(directory)
+        self.suffix = suffix
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()  # key -> (creation time, body)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key):
+        """Return the body stored for key, None if there is none or if it
+        expired."""
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, body = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return body
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            created = path.stat().st_mtime
+            if now - created >= self.ttl:
+                path.unlink()
+                raise FileNotFoundError(path)
+            body = path.read_bytes()
+            os.utime(path, (now, created))  # access time is used for eviction
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, created, body)
+        return body
+
+    def put(self, key, body):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, body)
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(body)
+        os.replace(tmp_path, path)
+        self._evict_disk(now)
+
+    def _remember(self, key, created, body):
+        self._memory[key] = (created, body)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        entries = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime >= self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for atime, size, path in entries)
+        for atime, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
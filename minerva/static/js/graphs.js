@@ -3,33 +3,91 @@
 //==============================================================================
 
 
-function jointext(back_to_text, name) {
+function jointext(back_to_text, sentences, name) {
     return "<p>"
-        + back_to_text[name].map(item => item.text).join("</p><p>")
+        + back_to_text[name].map(id => sentences[id].text).join("</p><p>")
         + "</p>"
     ;
 }
 
 
-function jointextsource(back_to_text, name) {
+function jointextsource(back_to_text, sentences, name) {
     return "<p>"
-        + back_to_text[name].map(item => "<pre>"+item.source+"</pre>" + item.text).join("</p><p>")
+        + back_to_text[name].map(id => sentences[id]).map(item => "<pre>"+item.source+"</pre>" + item.text).join("</p><p>")
         + "</p>"
     ;
 }
 
 
-function jointextsourcetable(back_to_text, name) {
+function jointextsourcetable(back_to_text, sentences, name) {
     return '<table id="sourcetext" style="width:100%">'
         + "<tr><th>source</th><th>text</th></tr>"
         + "<tr>"
-        + back_to_text[name].map(item => "<td>"+item.source+"</td>" + "<td>"+item.text+"</td>").join("</tr><tr>")
+        + back_to_text[name].map(id => sentences[id]).map(item => "<td>"+item.source+"</td>" + "<td>"+item.text+"</td>").join("</tr><tr>")
         + "</tr>"
         + "</table>"
     ;
 }
 
 
+const TYPED_ARRAYS = {"int8": Int8Array, "int16": Int16Array, "int32": Int32Array, "float64": Float64Array};
+
+
+function typedArray(array) {
+    const bytes = Uint8Array.from(atob(array.data), c => c.charCodeAt(0));
+    return new TYPED_ARRAYS[array.type](bytes.buffer);
+}
+
+
+function decodeCompactGraph(compact) {
+    // see compact_graph.py for the layout
+    const strings = compact.strings;
+    const source_data = {};
+    for (const key in compact) {
+        if (! ["format", "strings", "nodes", "links", "back_to_text", "sentences"].includes(key)) {
+            source_data[key] = compact[key];
+        }
+    }
+
+    const attributes = {};
+    for (const attribute in compact.nodes) {
+        attributes[attribute] = typedArray(compact.nodes[attribute]);
+    }
+    const n_nodes = attributes.name.length;
+    const nodes = [];
+    for (let i = 0; i < n_nodes; i++) {
+        let node = {"id": strings[i]};
+        for (const attribute in attributes) {
+            if (attributes[attribute][i] >= 0) {
+                node[attribute] = strings[attributes[attribute][i]];
+            }
+        }
+        nodes.push(node);
+    }
+
+    const sources = typedArray(compact.links.source);
+    const targets = typedArray(compact.links.target);
+    const values = typedArray(compact.links.value);
+    const links = [];
+    for (let i = 0; i < sources.length; i++) {
+        links.push({"source": strings[sources[i]], "target": strings[targets[i]], "value": values[i]});
+    }
+    source_data.data = {"nodes": nodes, "links": links};
+
+    const names = typedArray(compact.back_to_text.names);
+    const offsets = typedArray(compact.back_to_text.offsets);
+    const pointers = typedArray(compact.back_to_text.sentences);
+    source_data.back_to_text = {};
+    for (let i = 0; i < names.length; i++) {
+        source_data.back_to_text[strings[names[i]]] = Array.from(pointers.subarray(offsets[i], offsets[i + 1]));
+    }
+
+    const sentence_sources = typedArray(compact.sentences.source);
+    source_data.sentences = compact.sentences.text.map((text, i) => ({"source": strings[sentence_sources[i]], "text": text}));
+    return source_data;
+}
+
+
 function xyShift(scale) {
     return {"x": scale * (2 * Math.random() - 1), "y": scale * (2 * Math.random() - 1)};
 }
@@ -181,7 +239,7 @@ function update() {
             .style("stroke", function(d) { return groupColor(d[0]); })
         .on("click", function(event, d) {
             let mynodes = graph_data.data.nodes.filter(item => item.group == d[0]).map(item => item.id);  // .group() gives array[key, value] <=> key. TODO: change to better accomodate mentions
-            mynodes = mynodes.map(item => "<h3>"+item+"</h3>" + jointextsourcetable(graph_data.back_to_text, item));
+            mynodes = mynodes.map(item => "<h3>"+item+"</h3>" + jointextsourcetable(graph_data.back_to_text, graph_data.sentences, item));
             let imageurl = graph_data.name2image[d[0]];
             imageurl = imageurl ? imageurl : DEFAULT_IMAGE;
             document.getElementById("backtotext").innerHTML = 
@@ -229,7 +287,7 @@ function update() {
             imageurl = imageurl ? imageurl : DEFAULT_IMAGE;
             document.getElementById("backtotext").innerHTML =
                 "<h2>" + d.id + "</h2>"
-                + jointextsourcetable(graph_data.back_to_text, d.id)  // TODO: change to better accomodate mentions
+                + jointextsourcetable(graph_data.back_to_text, graph_data.sentences, d.id)  // TODO: change to better accomodate mentions
             ;
             document.getElementById("image").innerHTML =
                 "<img src=\""
@@ -335,6 +393,10 @@ window.init = function init(source_data) {
         simulation.stop();
     }
 
+    if (source_data.format === "compact") {
+        source_data = decodeCompactGraph(source_data);
+    }
     graph_data = source_data;
     makeGraph(source_data.data);
+    return source_data;
 }
@@ -0,0 +1,176 @@
+"""description:
+    Generate synthetic XML-TEI corpora (.zip) shaped like the annotated Mercure
+    de France: files of <s> sentences with an "annotation" attribute
+    (sentiments) and <Entity> mentions with an "annotation" attribute. Entity
+    names are drawn from the knowledge base, mentions use their aliases, so
+    that the generated corpus goes through the same code paths as a real one.
+
+    The same parameters and seed always give the same zip.
+"""
+
+import json
+import pathlib
+import random
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+
+WORDS = (
+    "le la les un une des de du et à en dans sur pour avec par son sa ses ce cette qui que "
+    "poète poésie roman vers livre œuvre drame critique style auteur lecteur revue chronique "
+    "beau grand triste jeune vieux nouveau célèbre obscur admirable médiocre charmant "
+    "écrit publie chante aime traduit admire raconte rappelle dédie "
+    "Italie Rome Paris Florence Naples Milan siècle année 1897 1902"
+).split()
+
+SENTIMENTS = ["opinion.positive", "opinion.negative", "opinion.neutral"]
+
+
+def entity_vocabulary(knowledge_base, size=None, nil_names=0, rng=random):
+    """Return (entity, surface forms) pairs drawn from the knowledge base.
+
+    Parameters
+    ----------
+    knowledge_base : dict
+        the content of mdf-knowledge-base.json.
+    size : int
+        number of entities, all of them if None.
+    nil_names : int
+        number of extra entities that are not in the knowledge base.
+    """
+
+    forms = {}
+    for alias, name in knowledge_base["aliases"].items():
+        if name in knowledge_base["qids"]:
+            forms.setdefault(name, set()).add(alias)
+    names = sorted(knowledge_base["qids"])
+    if size is not None:
+        names = rng.sample(names, min(size, len(names)))
+    vocabulary = []
+    for name in names:
+        surface = set(forms.get(name, ()))
+        surface.add(name)
+        surface.add(name.split()[-1])
+        vocabulary.append((name, sorted(surface)))
+    for i in range(nil_names):
+        vocabulary.append((f"Inconnu {i}", [f"Inconnu {i}"]))
+    return vocabulary
+
+
+def make_sentence(rng, vocabulary, sentiments, min_words, max_words, max_mentions, annotation_rate):
+    """Return the XML of one <s> element."""
+
+    words = rng.randint(min_words, max_words)
+    n_mentions = rng.randint(0, max_mentions)
+    positions = sorted(rng.sample(range(words + 1), min(n_mentions, words + 1)))
+    parts = []
+    previous = 0
+    for position in positions:
+        parts.append(escape(" ".join(rng.choices(WORDS, k=position - previous))))
+        name, surface = rng.choice(vocabulary)
+        parts.append(f" <Entity annotation={quoteattr(name)}>{escape(rng.choice(surface))}</Entity> ")
+        previous = position
+    parts.append(escape(" ".join(rng.choices(WORDS, k=words - previous))) + ".")
+
+    attributes = ""
+    if rng.random() < annotation_rate:
+        labels = rng.sample(sentiments, rng.randint(1, min(2, len(sentiments))))
+        attributes = f" annotation={quoteattr('|'.join(labels))}"
+    return f"<s{attributes}>{''.join(parts).strip()}</s>"
+
+
+def make_file(rng, author, vocabulary, sentiments, sentences, min_words, max_words, max_mentions, annotation_rate):
+    """Return the XML of one TEI file."""
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<TEI xmlns="http://www.tei-c.org/ns/1.0">',
+        "<teiHeader><profileDesc><textClass><keywords>"
+        f'<term type="author">{escape(author)}</term>'
+        "</keywords></textClass></profileDesc></teiHeader>",
+        "<text><body><p>",
+    ]
+    for _ in range(sentences):
+        lines.append(make_sentence(rng, vocabulary, sentiments, min_words, max_words, max_mentions, annotation_rate))
+    lines.append("</p></body></text>")
+    lines.append("</TEI>")
+    return "\n".join(lines)
+
+
+def generate(
+    output, knowledge_base, n_files=12, sentences=40, min_words=2, max_words=20, max_mentions=3,
+    n_entities=None, nil_names=1, sentiments=SENTIMENTS, annotation_rate=0.6, n_authors=3, seed=0,
+):
+    """Write a synthetic corpus in the zip file output.
+
+    Parameters
+    ----------
+    output : str or file-like object
+    knowledge_base : dict
+        the content of mdf-knowledge-base.json.
+    n_files : int
+        number of XML files, named like the Mercure de France issues.
+    sentences : int
+        number of sentences per file.
+    min_words, max_words : int
+        bounds of the number of words per sentence, mentions excluded.
+    max_mentions : int
+        maximum number of mentions per sentence.
+    n_entities : int
+        size of the entity vocabulary, the whole knowledge base if None.
+    nil_names : int
+        number of extra entities missing from the knowledge base.
+    sentiments : list[str]
+        the sentiment labels.
+    annotation_rate : float
+        the proportion of sentences with an "annotation" attribute.
+    n_authors : int
+        number of distinct authors in the teiHeaders.
+    seed : int
+    """
+
+    rng = random.Random(seed)
+    vocabulary = entity_vocabulary(knowledge_base, size=n_entities, nil_names=nil_names, rng=rng)
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as ziparchive:
+        for i in range(n_files):
+            year, month = 1890 + i // 12, i % 12 + 1
+            content = make_file(
+                rng, f"Auteur {i % n_authors}", vocabulary, sentiments, sentences, min_words, max_words,
+                max_mentions, annotation_rate,
+            )
+            ziparchive.writestr(f"corpus/mdf_{year}_{month:02d}.xml", content)
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("output", help="The output .zip file")
+    parser.add_argument(
+        "--knowledge-base",
+        default=pathlib.Path(__file__).parent / "static" / "json" / "mdf-knowledge-base.json",
+        help="The knowledge base with aliases and Wikidata IDs (default: %(default)s)"
+    )
+    parser.add_argument("-f", "--n-files", type=int, default=12, help="Number of files (default: %(default)s)")
+    parser.add_argument("-s", "--sentences", type=int, default=40, help="Sentences per file (default: %(default)s)")
+    parser.add_argument("--min-words", type=int, default=2, help="Minimum words per sentence (default: %(default)s)")
+    parser.add_argument("--max-words", type=int, default=20, help="Maximum words per sentence (default: %(default)s)")
+    parser.add_argument("--max-mentions", type=int, default=3, help="Maximum mentions per sentence (default: %(default)s)")
+    parser.add_argument("-e", "--n-entities", type=int, help="Number of entities (default: the whole knowledge base)")
+    parser.add_argument("--nil-names", type=int, default=1, help="Entities missing from the knowledge base (default: %(default)s)")
+    parser.add_argument(
+        "--sentiments", type=lambda x: x.split(","), default=SENTIMENTS,
+        help="Comma separated sentiment labels (default: %(default)s)"
+    )
+    parser.add_argument("--annotation-rate", type=float, default=0.6, help="Proportion of annotated sentences (default: %(default)s)")
+    parser.add_argument("--n-authors", type=int, default=3, help="Number of authors (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: %(default)s)")
+
+    args = vars(parser.parse_args())
+    with open(args.pop("knowledge_base")) as input_stream:
+        knowledge_base = json.load(input_stream)
+    generate(args.pop("output"), knowledge_base, **args)
+    sys.exit(0)
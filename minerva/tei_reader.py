@@ -0,0 +1,59 @@
+"""description:
+    Incremental reading of XML-TEI files. Sentences (<s> tags) are given one at
+    a time and dropped from memory once they have been processed, so that the
+    memory needed depends on the size of sentences rather than the size of
+    files.
+"""
+
+from lxml import etree
+
+
+xmlns = "http://www.tei-c.org/ns/1.0"
+
+
+def _free(element):
+    """Remove the element given in argument and everything that was read before
+    it from the tree being built."""
+
+    element.clear(keep_tail=True)
+    for ancestor in element.iterancestors():
+        while ancestor.getprevious() is not None:
+            del ancestor.getparent()[0]
+    while element.getprevious() is not None:
+        del element.getparent()[0]
+
+
+def iter_elements(stream):
+    """Yield the teiHeader and <s> elements of the XML-TEI stream given in
+    argument, in document order. Each element is removed from memory once the
+    next one is requested.
+    """
+
+    events = etree.iterparse(stream, events=("end",), tag=(f"{{{xmlns}}}teiHeader", f"{{{xmlns}}}s"))
+    for event, element in events:
+        yield element
+        _free(element)
+
+
+def iter_sentences(stream, author_query=""):
+    """Yield the (author, sentence) pairs of the XML-TEI stream given in
+    argument, sentence being an <s> element.
+
+    Parameters
+    ----------
+    stream : file-like object
+        the XML file, opened in binary mode.
+    author_query : str
+        an ElementPath query (with namespaces) for the author of the document,
+        evaluated from the root once the teiHeader has been read. The author
+        is '' if no query is given.
+    """
+
+    author = ''
+    for element in iter_elements(stream):
+        if element.tag == f"{{{xmlns}}}teiHeader":
+            if author_query:
+                author = element.getparent().findall(author_query)[0].text
+            continue
+
+        yield author, element
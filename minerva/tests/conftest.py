@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# the modules of minerva are imported flat, as app.py does
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
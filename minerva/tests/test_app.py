@@ -0,0 +1,114 @@
+import io
+import json
+import time
+import zipfile
+
+import pytest
+import spacy
+
+import app as minerva
+import corpus_index
+import process_zip_annotated_cooc
+import tei_reader
+from result_cache import ResultCache
+
+
+DOCUMENT = (
+    f'<TEI xmlns="{tei_reader.xmlns}"><text><body><p>'
+    '<s annotation="Opinion.pos">Le poète <Entity annotation="Giosuè Carducci">Carducci</Entity> écrit.</s>'
+    '<s annotation="Opinion.neg">Puis <Entity annotation="Ada Negri">Ada Negri</Entity> lit.</s>'
+    '</p></body></text></TEI>'
+)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    minerva.configure({"TESTING": True})
+    # caches on disk outlive a test run
+    monkeypatch.setattr(minerva, "result_cache", ResultCache(tmp_path / "results"))
+    monkeypatch.setattr(minerva, "counts_cache", ResultCache(tmp_path / "counts", suffix=".pickle"))
+    return minerva.app.test_client()
+
+
+def corpus():
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as output_zip:
+        output_zip.writestr("mdf_1890_01.xml", DOCUMENT)
+    return stream.getvalue()
+
+
+def post_zip(client, headers=None, **form):
+    data = {"input zip": (io.BytesIO(corpus()), "corpus.zip"), **form}
+    return client.post("/process_zip", data=data, headers=headers or {})
+
+
+def test_etag_revalidation(client):
+    first = post_zip(client)
+    assert first.status_code == 200
+    etag = first.headers["ETag"].strip('"')
+
+    assert post_zip(client, {"If-None-Match": f'"{etag}"'}).status_code == 304
+
+
+def test_timings_are_never_not_modified(client):
+    etag = post_zip(client).headers["ETag"].strip('"')
+
+    response = post_zip(client, {"If-None-Match": f'"{etag}"'}, timings="1")
+    assert response.status_code == 200
+    assert "timings" in response.json
+    timed_etag = response.headers["ETag"].strip('"')
+    assert timed_etag != etag
+
+    response = post_zip(client, {"If-None-Match": f'"{timed_etag}"'}, timings="1")
+    assert response.status_code == 200
+    assert "timings" in response.json
+
+
+@pytest.mark.parametrize("last_event_id", ["abc", "-5", ""])
+def test_job_events_malformed_last_event_id(client, last_event_id):
+    response = client.post("/process_zip/jobs", data={"input zip": (io.BytesIO(corpus()), "corpus.zip")})
+    assert response.status_code == 202
+
+    response = client.get(response.json["events url"], headers={"Last-Event-ID": last_event_id})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).startswith("id: 0\n")
+
+
+def wait(client, job):
+    for _ in range(200):
+        status = client.get(job["status url"]).json
+        if status["state"] not in ("queued", "running"):
+            return status
+        time.sleep(0.05)
+    raise TimeoutError(job["status url"])
+
+
+def test_ingest_is_a_job(client, monkeypatch):
+    monkeypatch.setattr(minerva, "get_tagger", lambda: spacy.blank("fr"))
+    assert client.post("/ingest", data={}).status_code == 400
+
+    upload = corpus()
+    response = client.post("/ingest", data={"input zip": (io.BytesIO(upload), "corpus.zip"), "n process": "1"})
+    assert response.status_code == 202
+    assert wait(client, response.json)["state"] == "done"
+    result = client.get(response.json["result url"]).json
+    assert result == {"index id": corpus_index.index_id(io.BytesIO(upload)), "n files": 1, "n sentences": 2}
+
+
+def test_counts_are_reused_across_measures(client):
+    upload = corpus()
+    form = {"POS filter": "", "target property": "", "max degree": "5"}
+    measures = {}
+    for measure in ("smoothed_dice", "pmi"):
+        data = {"input zip": (io.BytesIO(upload), "corpus.zip"), "association measure": measure, **form}
+        response = client.post("/process_zip_cooc", data=data)
+        assert response.status_code == 200
+        measures[measure] = response.json
+    assert (minerva.counts_cache.misses, minerva.counts_cache.hits) == (1, 1)
+
+    with zipfile.ZipFile(io.BytesIO(upload)) as ziparchive:
+        expected = process_zip_annotated_cooc.process_zip_cooc(
+            ziparchive, minerva.knowledge_base, minerva.qid_to_claims, max_degree=5, measure="pmi",
+            image_index=minerva.image_index,
+        )
+    assert measures["pmi"] == json.loads(minerva.app.json.dumps(expected))
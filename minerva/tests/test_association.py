@@ -0,0 +1,61 @@
+import collections
+import random
+
+import numpy as np
+import pytest
+
+from association import CooccurrenceMatrix
+
+
+def random_counts(seed=0, n_mentions=8, n_words=30, n_links=120):
+    rng = random.Random(seed)
+    mentions = [f"Q{i}" for i in range(n_mentions)]
+    words = [f"mot{i}_NOUN" for i in range(n_words)]
+    links = {}
+    for _ in range(n_links):
+        links[(rng.choice(mentions), rng.choice(words))] = rng.randint(1, 6)
+    single_count = collections.Counter()
+    for (mention, word), count in links.items():
+        single_count[mention] = max(single_count[mention], count) + rng.randint(0, 2)
+        single_count[word] = max(single_count[word], count) + rng.randint(0, 2)
+    return links, single_count, set(mentions[:-1])  # a mention outside of the contrast set
+
+
+def legacy_scores(links, single_count, mention_set, contrast):
+    # the per-link loop process_zip_cooc used before the matrix
+    smooth = 1
+    correlation = {}
+    for (mention, cooccurrent), kij in links.items():
+        ki, kj = single_count[mention], single_count[cooccurrent]
+        coeff = (2 * kij + smooth) / (ki + kj + smooth)
+        if not contrast:
+            correlation[(mention, cooccurrent)] = coeff
+            continue
+        kij_bar = sum(val for key, val in links.items() if key[0] != mention and key[1] == cooccurrent)
+        ki_bar = sum(single_count.get(other, 0) for other in mention_set if other != mention)
+        correlation[(mention, cooccurrent)] = coeff / ((2 * kij_bar + smooth) / (ki_bar + kj + smooth))
+    return correlation
+
+
+def legacy_top_k(correlation, threshold, max_degree):
+    per_mentions = collections.defaultdict(list)
+    for key, score in correlation.items():
+        if score >= threshold:
+            per_mentions[key[0]].append(key)
+    return {
+        key for keys in per_mentions.values()
+        for key in sorted(keys, key=lambda x: correlation[x], reverse=True)[:max_degree]
+    }
+
+
+@pytest.mark.parametrize("contrast", [False, True])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_smoothed_dice_matches_legacy_loop(seed, contrast):
+    links, single_count, mention_set = random_counts(seed)
+    matrix = CooccurrenceMatrix(links, single_count, mention_set)
+    scores = matrix.scores("smoothed_dice", contrast=contrast)
+    expected = legacy_scores(links, single_count, mention_set, contrast)
+    np.testing.assert_allclose(scores, [expected[key] for key in matrix.keys])
+
+    remaining = matrix.top_k(scores, 0.02, 3)
+    assert set(matrix.keys[i] for i in remaining) == legacy_top_k(expected, 0.02, 3)
@@ -0,0 +1,87 @@
+import base64
+
+import numpy as np
+
+import compact_graph
+
+
+def typed_array(array):
+    return np.frombuffer(base64.b64decode(array["data"]), dtype=np.dtype(array["type"]).newbyteorder("<")).tolist()
+
+
+def decode(compact):
+    # same as decodeCompactGraph in static/js/graphs.js
+    strings = compact["strings"]
+    result = {
+        key: value for key, value in compact.items()
+        if key not in ("format", "strings", "nodes", "links", "back_to_text", "sentences")
+    }
+    attributes = {attribute: typed_array(values) for attribute, values in compact["nodes"].items()}
+    nodes = []
+    for i in range(len(attributes["name"])):
+        node = {"id": strings[i]}
+        for attribute, positions in attributes.items():
+            if positions[i] >= 0:
+                node[attribute] = strings[positions[i]]
+        nodes.append(node)
+    links = [
+        {"source": strings[source], "target": strings[target], "value": value}
+        for source, target, value in zip(*(typed_array(compact["links"][key]) for key in ("source", "target", "value")))
+    ]
+    result["data"] = {"nodes": nodes, "links": links}
+    names = typed_array(compact["back_to_text"]["names"])
+    offsets = typed_array(compact["back_to_text"]["offsets"])
+    pointers = typed_array(compact["back_to_text"]["sentences"])
+    result["back_to_text"] = {strings[name]: pointers[offsets[i]:offsets[i + 1]] for i, name in enumerate(names)}
+    sources = typed_array(compact["sentences"]["source"])
+    result["sentences"] = [
+        {"source": strings[source], "text": text} for source, text in zip(sources, compact["sentences"]["text"])
+    ]
+    return result
+
+
+def graph(n_sentences=3, value=0.25):
+    return {
+        "data": {
+            "nodes": [
+                {"id": "Ada Negri", "name": "Ada Negri", "label": "Ada Negri", "group": "1", "class": "entity"},
+                {"id": "poésie", "name": "poésie", "group": "2"},
+                {"id": "Giosuè Carducci", "name": "Giosuè Carducci", "label": "Ada Negri", "group": "1"},
+            ],
+            "links": [
+                {"source": "Ada Negri", "target": "poésie", "value": value},
+                {"source": "poésie", "target": "Giosuè Carducci", "value": 3.0},
+            ],
+        },
+        "back_to_text": {
+            "Ada Negri": [0, 1],
+            "poésie": list(range(n_sentences)),
+            "Giosuè Carducci": [n_sentences - 1],
+        },
+        "sentences": [
+            {"source": f"mdf_1890_{i % 12 + 1:02d}.xml", "text": f"Phrase « {i} » d'Ada Negri."}
+            for i in range(n_sentences)
+        ],
+        "measure": "smoothed_dice",
+    }
+
+
+def test_round_trip():
+    result = graph()
+    compact = compact_graph.encode(result)
+    assert compact["format"] == "compact"
+    assert decode(compact) == result
+
+
+def test_round_trip_wide_values():
+    result = graph(n_sentences=70000, value=-1.5e-9)
+    compact = compact_graph.encode(result)
+    assert compact["back_to_text"]["sentences"]["type"] == "int32"
+    assert compact["links"]["value"]["type"] == "float64"
+    assert decode(compact) == result
+
+
+def test_integer_values_stay_integers():
+    compact = compact_graph.encode(graph(value=2.0))
+    assert compact["links"]["value"]["type"] == "int8"
+    assert [link["value"] for link in decode(compact)["data"]["links"]] == [2, 3]
@@ -0,0 +1,66 @@
+import io
+import json
+import zipfile
+
+import spacy
+
+import corpus_index
+import process_annotated_zip
+import tei_reader
+
+
+SENTENCES = [
+    '<s annotation="Opinion.pos">Le poète <hi><Entity annotation="Giosuè Carducci">Carducci</Entity></hi> écrit.</s>',
+    '<s annotation="Opinion.neg">Un vers<lb/> coupé puis <Entity annotation="Ada Negri">Ada Negri</Entity> lit.</s>',
+    '<s annotation="Opinion.pos">  l\' <Entity annotation="Ada Negri">Ada Negri</Entity> et'
+    ' <Entity annotation="Giosuè Carducci">Carducci</Entity>.</s>',
+]
+DOCUMENT = f'<TEI xmlns="{tei_reader.xmlns}"><text><body><p>{"".join(SENTENCES)}</p></body></text></TEI>'
+
+
+def read_sentences():
+    # sentences are freed once the next one is read
+    stream = io.BytesIO(DOCUMENT.encode("utf-8"))
+    return [corpus_index.read_sentence(sentence) for author, sentence in tei_reader.iter_sentences(stream)]
+
+
+def test_read_sentence_offsets():
+    read = read_sentences()
+    assert [sentence.valid for sentence in read] == [False, False, True]
+    for sentence in read:
+        assert sentence.mentions
+        for text, annotation, start, end in sentence.mentions:
+            assert sentence.text[start:end] == text
+
+
+def test_read_sentence_matches_zip_path():
+    stream = io.BytesIO(DOCUMENT.encode("utf-8"))
+    from_zip = [(content, mentions) for author, annotation, content, mentions in process_annotated_zip.iter_sentences(stream)]
+    from_index = [
+        process_annotated_zip.normalize_sentence(sentence.text, sentence.mentions)
+        for sentence in read_sentences()
+    ]
+    assert from_index == from_zip
+    assert from_zip[1][0][slice(*from_zip[1][1][0][2:])] == "Ada Negri"
+
+
+def test_ingest_rebuilds_outdated_index(tmp_path):
+    archive = tmp_path / "corpus.zip"
+    with zipfile.ZipFile(archive, "w") as output_zip:
+        output_zip.writestr("mdf_1890_01.xml", DOCUMENT)
+    tagger = spacy.blank("fr")
+    with zipfile.ZipFile(archive) as ziparchive:
+        index = corpus_index.ingest(ziparchive, tmp_path / "indexes", "x", tagger)
+        assert len(index) == len(SENTENCES)
+
+        meta_path = tmp_path / "indexes" / "x" / "meta.json"
+        with open(meta_path) as input_stream:
+            meta = json.load(input_stream)
+        meta["model"] = ["fr_other", "0.0.0"]
+        with open(meta_path, "w") as output_stream:
+            json.dump(meta, output_stream)
+        assert corpus_index.CorpusIndex(tmp_path / "indexes" / "x").model == ("fr_other", "0.0.0")
+
+        index = corpus_index.ingest(ziparchive, tmp_path / "indexes", "x", tagger)
+        assert index.model != ("fr_other", "0.0.0")
+    assert [path.name for path in (tmp_path / "indexes").iterdir()] == ["x"]
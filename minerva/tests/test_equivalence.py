@@ -0,0 +1,63 @@
+import json
+import pathlib
+import zipfile
+
+import pytest
+
+import corpus_index
+import synthetic_corpus
+from process_annotated_zip import process_annotated_zip, process_annotated_index
+from process_zip_annotated_cooc import process_zip_cooc, process_index_cooc, get_tagger
+
+
+STATIC = pathlib.Path(__file__).resolve().parent.parent / "static" / "json"
+
+
+@pytest.fixture(scope="module")
+def data():
+    with open(STATIC / "mdf-knowledge-base.json") as input_stream:
+        knowledge_base = json.load(input_stream)
+    with open(STATIC / "qid_to_claims.json") as input_stream:
+        qid_to_claims = json.load(input_stream)
+    return knowledge_base, qid_to_claims
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory, data):
+    knowledge_base, qid_to_claims = data
+    directory = tmp_path_factory.mktemp("corpus")
+    path = directory / "corpus.zip"
+    synthetic_corpus.generate(path, knowledge_base, n_files=4, sentences=30, n_entities=15, seed=3)
+    with zipfile.ZipFile(path) as ziparchive:
+        index = corpus_index.ingest(ziparchive, directory / "indexes", "synthetic", get_tagger())
+    return path, index
+
+
+@pytest.mark.parametrize("target_property", [None, "P27"])
+def test_cooc_serial_parallel_index(corpus, data, target_property):
+    knowledge_base, qid_to_claims = data
+    path, index = corpus
+    results = []
+    for n_workers in (1, 2):
+        with zipfile.ZipFile(path) as ziparchive:
+            results.append(process_zip_cooc(
+                ziparchive, knowledge_base, qid_to_claims, target_property=target_property, n_workers=n_workers
+            ))
+    results.append(process_index_cooc(index, knowledge_base, qid_to_claims, target_property=target_property))
+
+    assert results[0]["data"]["links"]
+    assert results[1] == results[0]
+    assert results[2] == results[0]
+
+
+def test_opinions_serial_parallel_index(corpus, data):
+    knowledge_base, qid_to_claims = data
+    path, index = corpus
+    results = []
+    for n_workers in (1, 2):
+        with zipfile.ZipFile(path) as ziparchive:
+            results.append(process_annotated_zip(ziparchive, knowledge_base, n_workers=n_workers))
+    results.append(process_annotated_index(index, knowledge_base))
+
+    assert results[1] == results[0]
+    assert results[2] == results[0]
@@ -0,0 +1,158 @@
+import csv
+import gzip
+import io
+import json
+import xml.etree.ElementTree as ElementTree
+import zipfile
+
+import pytest
+
+import graph_export
+
+
+RESULT = {
+    "back_to_text": {"Ada Negri": [0, 1], "poésie_NOUN": [1]},
+    "data": {
+        "links": [
+            {"source": "Ada Negri", "target": "poésie_NOUN", "value": 3},
+            {"source": {"id": "Giosuè \"Enotrio\" Carducci", "index": 2}, "target": "poésie_NOUN", "value": 1.5e-3},
+            {"source": "Ada Negri", "target": "vers]}_NOUN", "value": -12345678901},
+        ],
+        "nodes": [
+            {"id": "poésie_NOUN", "name": "poésie_NOUN", "label": "poésie", "group": "cooccurrences"},
+            {"id": "vers]}_NOUN", "name": "vers]}_NOUN", "label": "vers]}", "group": "cooccurrences"},
+            {"id": "Ada Negri", "name": "Ada Negri", "group": "Ada Negri", "class": "entity"},
+            {"id": "Giosuè \"Enotrio\" Carducci", "name": "Giosuè \"Enotrio\" Carducci", "group": "<Giosuè & co>", "class": "entity"},
+        ],
+    },
+    "name2image": {"Ada Negri": "https://commons.wikimedia.org/wiki/File:Ada_Negri.jpg"},
+    "sentences": [
+        {"source": "mdf_1890_01.xml", "text": "Des accolades } ] { [ et un \\\" échappé, \\u00e9 \\\\"},
+        {"source": "mdf_1890_02.xml", "text": "La poésie d'Ada Negri."},
+    ],
+}
+
+
+def body(result=RESULT, **kwargs):
+    # keys are sorted, as the page posts them
+    return json.dumps(result, sort_keys=True, **kwargs).encode("utf-8")
+
+
+def expected_items(result=RESULT):
+    return [("links", link) for link in result["data"]["links"]] + [("nodes", node) for node in result["data"]["nodes"]]
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_every_chunk_boundary(ensure_ascii):
+    data = body(ensure_ascii=ensure_ascii, indent=1)
+    expected = expected_items()
+    for chunk_size in range(1, 64):
+        assert list(graph_export.iter_graph_items(io.BytesIO(data), chunk_size=chunk_size)) == expected
+
+
+def test_numbers_cut_by_chunks():
+    result = {"links": [{"source": "a", "target": "b", "value": value} for value in (12345678901, -0.5, 1e-07, 0)]}
+    data = json.dumps(result, separators=(",", ":")).encode("utf-8")
+    for chunk_size in range(1, 20):
+        items = list(graph_export.iter_graph_items(io.BytesIO(data), chunk_size=chunk_size))
+        assert [item["value"] for name, item in items] == [12345678901, -0.5, 1e-07, 0]
+
+
+def test_top_level_arrays_and_empty_objects():
+    data = b'{"nodes": [], "other": {}, "links": [{"source": "a", "target": "b", "value": 1}], "data": {}}'
+    assert list(graph_export.iter_graph_items(io.BytesIO(data), chunk_size=3)) == [
+        ("links", {"source": "a", "target": "b", "value": 1})
+    ]
+
+
+@pytest.mark.parametrize("data", [b'{"data": {"links": [1, 2}}', b'{"links": [', b'{"links": []} []', b'[]'])
+def test_invalid_json(data):
+    with pytest.raises(ValueError):
+        list(graph_export.iter_graph_items(io.BytesIO(data), chunk_size=4))
+
+
+def test_tsv():
+    text = "".join(graph_export.iter_tsv(graph_export.iter_graph_items(io.BytesIO(body()))))
+    rows = list(csv.reader(io.StringIO(text), delimiter="\t"))
+    assert rows == [
+        ["source", "target", "strength"],
+        ["Ada Negri", "poésie_NOUN", "3"],
+        ['Giosuè "Enotrio" Carducci', "poésie_NOUN", "0.0015"],
+        ["Ada Negri", "vers]}_NOUN", "-12345678901"],
+    ]
+
+
+def test_gexf():
+    text = "".join(graph_export.iter_gexf(graph_export.iter_graph_items(io.BytesIO(body()))))
+    namespace = {"gexf": "http://gexf.net/1.3"}
+    root = ElementTree.fromstring(text.encode("utf-8"))
+    nodes = {
+        node.get("id"): (node.get("label"), {value.get("for"): value.get("value") for value in node.iter("{http://gexf.net/1.3}attvalue")})
+        for node in root.iterfind(".//gexf:node", namespace)
+    }
+    assert nodes == {
+        "Ada Negri": ("Ada Negri", {"group": "Ada Negri", "class": "entity"}),
+        "poésie_NOUN": ("poésie", {"group": "cooccurrences"}),
+        'Giosuè "Enotrio" Carducci': ('Giosuè "Enotrio" Carducci', {"group": "<Giosuè & co>", "class": "entity"}),
+        "vers]}_NOUN": ("vers]}", {"group": "cooccurrences"}),
+    }
+    edges = [(edge.get("source"), edge.get("target"), float(edge.get("weight"))) for edge in root.iterfind(".//gexf:edge", namespace)]
+    assert edges == [
+        ("Ada Negri", "poésie_NOUN", 3),
+        ('Giosuè "Enotrio" Carducci', "poésie_NOUN", 1.5e-3),
+        ("Ada Negri", "vers]}_NOUN", -12345678901),
+    ]
+
+
+def test_graphml():
+    text = "".join(graph_export.iter_graphml(graph_export.iter_result_items(RESULT)))
+    namespace = {"graphml": "http://graphml.graphdrawing.org/xmlns"}
+    root = ElementTree.fromstring(text.encode("utf-8"))
+    nodes = {
+        node.get("id"): {data.get("key"): data.text for data in node}
+        for node in root.iterfind(".//graphml:node", namespace)
+    }
+    assert nodes['Giosuè "Enotrio" Carducci'] == {
+        "label": 'Giosuè "Enotrio" Carducci', "group": "<Giosuè & co>", "class": "entity"
+    }
+    assert nodes["poésie_NOUN"] == {"label": "poésie", "group": "cooccurrences"}
+    assert len(nodes) == 4
+    edges = [
+        (edge.get("source"), edge.get("target"), float(edge.find("graphml:data", namespace).text))
+        for edge in root.iterfind(".//graphml:edge", namespace)
+    ]
+    assert edges == [
+        ("Ada Negri", "poésie_NOUN", 3),
+        ('Giosuè "Enotrio" Carducci', "poésie_NOUN", 1.5e-3),
+        ("Ada Negri", "vers]}_NOUN", -12345678901),
+    ]
+
+
+def test_gzip_chunks():
+    chunks = graph_export.iter_tsv(graph_export.iter_result_items(RESULT))
+    text = "".join(graph_export.iter_tsv(graph_export.iter_result_items(RESULT)))
+    assert gzip.decompress(b"".join(graph_export.gzip_chunks(chunks))).decode("utf-8") == text
+
+
+def test_zip_of_tables():
+    data = b"".join(graph_export.iter_zip(RESULT, "csv"))
+    with zipfile.ZipFile(io.BytesIO(data)) as ziparchive:
+        assert ziparchive.namelist() == ["nodes.csv", "links.csv", "back_to_text.csv"]
+        rows = list(csv.reader(io.StringIO(ziparchive.read("back_to_text.csv").decode("utf-8"))))
+    assert rows[0] == ["name", "sentence", "source", "text"]
+    assert rows[1:] == [
+        ["Ada Negri", "0", "mdf_1890_01.xml", RESULT["sentences"][0]["text"]],
+        ["Ada Negri", "1", "mdf_1890_02.xml", "La poésie d'Ada Negri."],
+        ["poésie_NOUN", "1", "mdf_1890_02.xml", "La poésie d'Ada Negri."],
+    ]
+
+
+def test_parquet_links():
+    parquet = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(graph_export.iter_table(RESULT, "links", "parquet"))
+    table = parquet.read_table(io.BytesIO(data))
+    assert table.to_pylist() == [
+        {"source": "Ada Negri", "target": "poésie_NOUN", "value": 3.0},
+        {"source": 'Giosuè "Enotrio" Carducci', "target": "poésie_NOUN", "value": 1.5e-3},
+        {"source": "Ada Negri", "target": "vers]}_NOUN", "value": -12345678901.0},
+    ]
@@ -0,0 +1,39 @@
+import threading
+
+import jobs
+
+
+def test_cancel_queued_job_releases_its_resources():
+    queue = jobs.JobQueue(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking(progress):
+        started.set()
+        release.wait(10)
+        return "first"
+
+    first = queue.submit("first", blocking)
+    started.wait(10)
+    ran = []
+    second = queue.submit("second", lambda progress: ran.append(True))
+    closed = threading.Event()
+    second.future.add_done_callback(lambda future: closed.set())
+
+    assert queue.cancel(second.identifier) is second
+    assert second.state == jobs.CANCELLED
+    assert closed.is_set()
+
+    release.set()
+    queue.shutdown()
+    assert first.state == jobs.DONE and first.result == "first"
+    assert not ran
+
+
+def test_cancel_right_after_submit():
+    queue = jobs.JobQueue(max_workers=1)
+    for i in range(50):
+        job = queue.submit(str(i), lambda progress: progress("reading", 0, 1))
+        assert queue.cancel(job.identifier) is job
+    queue.shutdown()
+    assert queue.pending() == 0
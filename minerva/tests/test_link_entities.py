@@ -0,0 +1,70 @@
+import pathlib
+import sys
+
+import spacy
+from lxml import etree
+
+# the scripts of mercure-de-france are imported flat, as link_entities.py does
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2] / "mercure-de-france" / "scripts"))
+
+import link_entities  # noqa: E402
+from link_entities import iter_gold_sentences, normalize, xmlns  # noqa: E402
+
+
+FILES = {
+    "mdf_1890_01.xml": [
+        'Le poète <Entity annotation="Giosuè Carducci">Carducci</Entity> écrit.',
+        "Une phrase sans mention.",
+        '  l’ œuvre de <Entity annotation="Ada Negri">Ada Negri</Entity> et de <Entity>G. Carducci</Entity>.',
+    ],
+    "mdf_1890_02.xml": [
+        'D’après <Entity annotation="Ada Negri">A. Negri</Entity>, <hi>dit-on</hi>.',
+    ],
+}
+
+
+def write_corpus(directory):
+    for name, sentences in FILES.items():
+        body = "".join(f"<s>{sentence}</s>" for sentence in sentences)
+        (directory / name).write_text(f'<TEI xmlns="{xmlns}"><text><body><p>{body}</p></body></text></TEI>')
+    return sorted(directory.glob("*.xml"))
+
+
+def per_sentence(inputfiles):
+    # what link_entities did before the batched pass: nlp on each sentence
+    nlp = spacy.blank("fr")
+    for inputfile in inputfiles:
+        root = etree.parse(str(inputfile))
+        for sentence in root.iterfind(f".//{{{xmlns}}}s"):
+            entities_gold = set(node.text for node in sentence.iterfind(f"{{{xmlns}}}Entity"))
+            if not entities_gold:
+                continue
+            text = normalize(etree.tostring(sentence, method="text", encoding="utf-8").decode("utf-8").strip())
+            yield nlp(text).text, inputfile, entities_gold
+
+
+def test_batched_pass_matches_per_sentence(tmp_path, monkeypatch):
+    monkeypatch.setattr(link_entities, "tqdm", lambda iterable: iterable)
+    inputfiles = write_corpus(tmp_path)
+    trees = {}
+    records = {}
+    sentences = iter_gold_sentences(inputfiles, trees, records)
+    batched = [
+        (document.text, inputfile, entities_gold)
+        for document, (inputfile, entities_gold) in spacy.blank("fr").pipe(sentences, as_tuples=True, batch_size=2)
+    ]
+    assert batched == list(per_sentence(inputfiles))
+    assert batched[1] == (
+        "L'œuvre de Ada Negri et de G. Carducci.", inputfiles[0], {"Ada Negri", "G. Carducci"}
+    )
+    assert list(trees) == list(records) == inputfiles
+    assert records[inputfiles[1]] == {"found": {}, "remaining": set()}
+
+
+def test_files_are_read_lazily(tmp_path, monkeypatch):
+    monkeypatch.setattr(link_entities, "tqdm", lambda iterable: iterable)
+    inputfiles = write_corpus(tmp_path)
+    trees = {}
+    sentences = iter_gold_sentences(inputfiles, trees, {})
+    next(sentences)
+    assert list(trees) == inputfiles[:1]
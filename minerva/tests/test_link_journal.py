@@ -0,0 +1,36 @@
+import hashlib
+import pathlib
+import sys
+
+# the scripts of mercure-de-france are imported flat, as link_entities.py does
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2] / "mercure-de-france" / "scripts"))
+
+from link_journal import LinkJournal, file_digest  # noqa: E402
+
+
+def test_file_digest_in_chunks(tmp_path):
+    path = tmp_path / "mdf_1890_01.xml"
+    content = b"<TEI/>" * 1000
+    path.write_bytes(content)
+    assert file_digest(path, chunk_size=7) == hashlib.sha256(content).hexdigest()
+    empty = tmp_path / "empty.xml"
+    empty.write_bytes(b"")
+    assert file_digest(empty) == hashlib.sha256(b"").hexdigest()
+
+
+def test_resume_after_close(tmp_path):
+    first, second = tmp_path / "mdf_1890_01.xml", tmp_path / "mdf_1890_02.xml"
+    first.write_text("<TEI>Carducci</TEI>")
+    second.write_text("<TEI>Negri</TEI>")
+
+    journal = LinkJournal(tmp_path / "journal.sqlite3")
+    journal.put(first.name, file_digest(first), {"Giosuè Carducci": "Q191305"}, ["Carducci"])
+    journal.close()  # the run stops before the second file
+
+    journal = LinkJournal(tmp_path / "journal.sqlite3")
+    assert journal.get(first.name, file_digest(first)) == ({"Giosuè Carducci": "Q191305"}, ["Carducci"])
+    assert journal.get(second.name, file_digest(second)) is None
+
+    first.write_text("<TEI>Giosuè Carducci</TEI>")  # changed since: linked again
+    assert journal.get(first.name, file_digest(first)) is None
+    journal.close()
@@ -0,0 +1,28 @@
+import pickle
+
+from mapped_table import MappedTable, compile_table, JSON, STRING
+
+
+CLAIMS = {"Q1": {"P21": ["Q6581072"]}, "Q2": {"P21": ["Q6581097"], "P27": ["Q38"]}, "Q10": {}}
+
+
+def test_json_table(tmp_path):
+    compile_table(CLAIMS, tmp_path / "claims.table", kind=JSON)
+    table = MappedTable(tmp_path / "claims.table")
+    assert dict(table.items()) == CLAIMS
+    assert sorted(table) == sorted(CLAIMS)
+    assert table["Q2"] == CLAIMS["Q2"]
+    assert table.get("Q3") is None
+    assert table.get("Q3", {}) == {}
+    assert table.get(2) is None
+    assert "Q10" in table and "Q3" not in table
+    # decoded values are cached, not decoded again on each access
+    assert table.get("Q2") is table["Q2"]
+
+
+def test_string_table(tmp_path):
+    compile_table({"Ada Negri": "Q346250", "Éric": "Q1"}, tmp_path / "qids.table", kind=STRING)
+    table = MappedTable(tmp_path / "qids.table")
+    assert table["Éric"] == "Q1"
+    assert len(table) == 2
+    assert dict(pickle.loads(pickle.dumps(table)).items()) == dict(table.items())
@@ -0,0 +1,37 @@
+import random
+
+from markup import make_spans, normalize_offsets
+from process_annotated_zip import normalize
+
+
+def test_normalize_offsets_matches_normalize():
+    rng = random.Random(0)
+    alphabet = ["a", "b", " ", "'", "’", "D", "L", "De", "Di", "é", "ß", "\n"]
+    for _ in range(20000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+        if not text.strip():
+            continue
+        normalized, offsets = normalize_offsets(text, list(range(len(text) + 1)))
+        assert normalized == normalize(text)
+        assert offsets == sorted(offsets)
+        assert 0 <= offsets[0] and offsets[-1] <= len(normalized)
+
+
+def test_normalize_offsets_moves_mentions():
+    text = "  l' Giosuè Carducci et D'Annunzio"
+    start = text.index("Giosuè")
+    normalized, (start, end) = normalize_offsets(text, [start, start + len("Giosuè Carducci")])
+    assert normalized == "l'Giosuè Carducci et d'Annunzio"
+    assert normalized[start:end] == "Giosuè Carducci"
+
+
+def test_make_spans_never_nests():
+    text = "Giosuè Carducci et Carducci"
+    mentions = [
+        ("Giosuè Carducci", "A", 0, 15, None),
+        ("Carducci", "B", 7, 15, None),
+        ("Carducci", "B", 19, 27, None),
+    ]
+    assert make_spans(text, mentions, None) == (
+        '<span id="Entity" title="A">Giosuè Carducci</span> et <span id="Entity" title="B">Carducci</span>'
+    )
@@ -0,0 +1,39 @@
+import pathlib
+import sys
+
+# the scripts of mercure-de-france are imported flat, as link_entities.py does
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2] / "mercure-de-france" / "scripts"))
+
+from mention_index import MentionIndex, expand_aliases, is_short  # noqa: E402
+
+
+def test_is_short():
+    assert is_short("Aganoor")
+    assert is_short("V. Aganoor")
+    assert not is_short("Vittoria Aganoor")
+
+
+def test_lookup():
+    index = MentionIndex(["Vittoria Aganoor", "Ada Negri", "Virginia Negri", "Vittoria Aganoor", "Angelo Negri"])
+    assert index.candidates("Negri") == ["Ada Negri", "Angelo Negri", "Virginia Negri"]
+    assert index.candidates("A. Negri") == ["Ada Negri", "Angelo Negri"]
+    assert index.candidates("V. Aganoor") == ["Vittoria Aganoor"]
+    assert index.resolve("negri") == "Ada Negri"
+    assert index.resolve("Carducci") is None
+    assert index.resolve("G. Negri") is None
+
+
+def test_expand_aliases_only_adds_unambiguous_forms():
+    aliases = {
+        "Vittoria Aganoor-Pompily": "Vittoria Aganoor",
+        "Vittoria Aganoor": "Vittoria Aganoor",
+        "Ada Negri": "Ada Negri",
+        "Angelo Negri": "Angelo Negri",
+        "Carducci": "Giosuè Carducci",
+    }
+    expanded = expand_aliases(aliases)
+    assert expanded["V. Aganoor-Pompily"] == "Vittoria Aganoor"
+    assert expanded["Aganoor"] == "Vittoria Aganoor"
+    assert expanded["Ada Negri"] == "Ada Negri"
+    assert "Negri" not in expanded and "A. Negri" not in expanded
+    assert expanded["Carducci"] == "Giosuè Carducci"
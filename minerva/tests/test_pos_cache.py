@@ -0,0 +1,40 @@
+from pos_cache import PosTagCache, Token
+
+
+def tokens(text):
+    return [Token(word, 0, "NOUN") for word in text.split()]
+
+
+def count(cache):
+    return cache._connection.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+
+
+def test_eviction_keeps_recent_sentences(tmp_path):
+    cache = PosTagCache(tmp_path / "tags.sqlite3", "fr_test", "0", max_entries=5)
+    cache.put_many([(f"phrase {i}", tokens(f"phrase {i}")) for i in range(4)])
+    cache.get_many(["phrase 0"])  # used again: evicted last
+    cache.put_many([(f"phrase {i}", tokens(f"phrase {i}")) for i in range(4, 7)])
+    assert count(cache) == 5
+    assert [result is not None for result in cache.get_many([f"phrase {i}" for i in range(7)])] == [
+        True, False, False, True, True, True, True
+    ]
+
+
+def test_existing_sentences_are_not_counted_twice(tmp_path):
+    cache = PosTagCache(tmp_path / "tags.sqlite3", "fr_test", "0", max_entries=3)
+    for _ in range(3):
+        cache.put_many([("phrase 0", tokens("autre")), ("phrase 1", tokens("phrase 1"))])
+    assert cache._size == count(cache) == 2
+    assert cache.get_many(["phrase 0"]) == [tokens("autre")]
+
+
+def test_shared_file(tmp_path):
+    first = PosTagCache(tmp_path / "tags.sqlite3", "fr_test", "0", max_entries=4)
+    second = PosTagCache(tmp_path / "tags.sqlite3", "fr_test", "0", max_entries=4)
+    first.put_many([(f"phrase {i}", tokens(f"phrase {i}")) for i in range(3)])
+    second.put_many([(f"phrase {i}", tokens(f"phrase {i}")) for i in range(2, 5)])
+    assert (first._size, second._size, count(first)) == (3, 2, 5)  # rows of the other process are not seen
+
+    first.put_many([("phrase 5", tokens("phrase 5")), ("phrase 6", tokens("phrase 6"))])
+    assert first._size == count(first) == 4  # counted again once beyond max_entries
+    assert PosTagCache(tmp_path / "tags.sqlite3", "fr_test", "0")._size == 4
@@ -0,0 +1,25 @@
+import copy
+
+import pytest
+
+from benchmark import legacy_prune_outliers, synthetic_cooc_counts
+from process_zip_annotated_cooc import prune_outliers
+
+
+@pytest.mark.parametrize("vocabulary", [1, 50, 400])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_same_output_as_legacy(vocabulary, seed):
+    counts = synthetic_cooc_counts(vocabulary, seed=seed)
+    expected = legacy_prune_outliers(*copy.deepcopy(counts))
+    pruned = prune_outliers(*copy.deepcopy(counts))
+    assert pruned == expected
+    assert any(count == 1 for count in counts[0].values())
+    assert len(pruned[1]) < len(counts[1])
+
+
+def test_nothing_to_prune():
+    counts = synthetic_cooc_counts(50, seed=0)
+    single_count = counts[0]
+    for item in single_count:
+        single_count[item] += 1
+    assert prune_outliers(*copy.deepcopy(counts)) == counts
@@ -0,0 +1,16 @@
+import io
+
+import result_cache
+from result_cache import fingerprint
+
+
+def test_fingerprint_depends_on_signature_and_format(monkeypatch):
+    upload = io.BytesIO(b"PK corpus")
+    key = fingerprint(upload, "process_zip", {"annotation filter": ""}, ["qids.1-2.table", "fr_core_news_md", "3.7.0"])
+    assert upload.tell() == 0
+    assert key == fingerprint(upload, "process_zip", {"annotation filter": ""}, ["qids.1-2.table", "fr_core_news_md", "3.7.0"])
+    assert key != fingerprint(upload, "process_zip", {"annotation filter": ""}, ["qids.1-3.table", "fr_core_news_md", "3.7.0"])
+    assert key != fingerprint(upload, "process_zip", {"annotation filter": ""}, ["qids.1-2.table", "fr_core_news_md", "3.8.0"])
+
+    monkeypatch.setattr(result_cache, "FORMAT_VERSION", result_cache.FORMAT_VERSION + 1)
+    assert key != fingerprint(upload, "process_zip", {"annotation filter": ""}, ["qids.1-2.table", "fr_core_news_md", "3.7.0"])
@@ -0,0 +1,103 @@
+import spacy
+
+import process_zip_annotated_cooc
+from pos_cache import PosTagCache
+
+
+TEXTS = [f"Phrase numéro {i} du Mercure de France." for i in range(25)]
+
+
+def sentences(read):
+    for i, text in enumerate(TEXTS):
+        read.append(i)
+        yield text, ("mdf_1890_01.xml", [])
+
+
+def test_cached_tagging_is_streamed(tmp_path, monkeypatch):
+    tagger = spacy.blank("fr")
+    monkeypatch.setattr(process_zip_annotated_cooc, "get_tagger", lambda: tagger)
+    expected = list(process_zip_annotated_cooc.tag_sentences(sentences([]), batch_size=4))
+
+    cache = PosTagCache(tmp_path / "tags.sqlite3", "fr_blank", "0")
+    read = []
+    reports = []
+    tagged = process_zip_annotated_cooc.tag_sentences(
+        sentences(read), batch_size=4, cache=cache, progress=lambda *report: reports.append(report)
+    )
+    first = next(tagged)
+    assert len(read) == 4  # only the first batch was read
+    assert [first, *tagged] == expected
+    assert reports == [("tagging", done, 0) for done in (4, 8, 12, 16, 20, 24, 25)]
+    assert (cache.hits, cache.misses) == (0, len(TEXTS))
+
+    assert list(process_zip_annotated_cooc.tag_sentences(sentences([]), batch_size=4, cache=cache)) == expected
+    assert cache.hits == len(TEXTS)
+
+
+def test_uncached_tagging_progress(monkeypatch):
+    tagger = spacy.blank("fr")
+    monkeypatch.setattr(process_zip_annotated_cooc, "get_tagger", lambda: tagger)
+    reports = []
+    tagged = process_zip_annotated_cooc.tag_sentences(
+        sentences([]), batch_size=10, progress=lambda *report: reports.append(report)
+    )
+    assert len(list(tagged)) == len(TEXTS)
+    assert reports == [("tagging", 10, 0), ("tagging", 20, 0), ("tagging", 25, 0)]
+
+
+class CountingTagger:
+    def __init__(self):
+        self.tagger = spacy.blank("fr")
+        self.texts = []
+        self.calls = 0
+
+    def pipe(self, texts, **kwargs):
+        self.calls += 1
+
+        def counted():
+            for text, context in texts:
+                self.texts.append(text)
+                yield text, context
+
+        return self.tagger.pipe(counted(), **kwargs)
+
+
+def test_single_pipe_over_cache_misses(tmp_path, monkeypatch):
+    tagger = CountingTagger()
+    monkeypatch.setattr(process_zip_annotated_cooc, "get_tagger", lambda: tagger)
+    cache = PosTagCache(tmp_path / "tags.sqlite3", "fr_blank", "0")
+    expected = list(process_zip_annotated_cooc.tag_sentences(sentences([]), batch_size=4))
+    cache.put_many([(content, tokens) for content, tokens, context in expected[::3]])
+    tagger.calls = 0
+    tagger.texts = []
+
+    tagged = list(process_zip_annotated_cooc.tag_sentences(sentences([]), batch_size=4, cache=cache))
+    assert tagged == expected
+    assert tagger.calls == 1
+    assert [text for text in tagger.texts if text] == [
+        content for i, (content, tokens, context) in enumerate(expected) if i % 3
+    ]
+    assert cache.get_many(TEXTS) == [tokens for content, tokens, context in expected]
+
+
+def test_cached_sentences_do_not_wait(tmp_path, monkeypatch):
+    tagger = CountingTagger()
+    monkeypatch.setattr(process_zip_annotated_cooc, "get_tagger", lambda: tagger)
+    cache = PosTagCache(tmp_path / "tags.sqlite3", "fr_blank", "0")
+    list(process_zip_annotated_cooc.tag_sentences(sentences([]), batch_size=4, cache=cache))
+
+    read = []
+    tagged = process_zip_annotated_cooc.tag_sentences(sentences(read), batch_size=4, cache=cache)
+    next(tagged)
+    assert len(read) <= 8  # not the whole corpus
+    tagged.close()
+
+
+def test_cached_tagging_in_processes(tmp_path, monkeypatch):
+    tagger = spacy.blank("fr")
+    monkeypatch.setattr(process_zip_annotated_cooc, "get_tagger", lambda: tagger)
+    expected = list(process_zip_annotated_cooc.tag_sentences(sentences([]), batch_size=4))
+    cache = PosTagCache(tmp_path / "tags.sqlite3", "fr_blank", "0")
+    cache.put_many([(content, tokens) for content, tokens, context in expected[:10]])
+    tagged = process_zip_annotated_cooc.tag_sentences(sentences([]), batch_size=4, n_process=2, cache=cache)
+    assert list(tagged) == expected
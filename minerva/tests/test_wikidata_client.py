@@ -0,0 +1,58 @@
+import pathlib
+import sys
+
+# the scripts of mercure-de-france are imported flat, as link_entities.py does
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2] / "mercure-de-france" / "scripts"))
+
+from wikidata_client import WikidataClient  # noqa: E402
+
+
+class FakeAPI:
+    """Answers wbsearchentities and wbgetentities like the Wikidata API."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, params):
+        self.calls.append(params)
+        if params["action"] == "wbsearchentities":
+            if params["language"] == "it" and params["search"] == "Ada Negri":
+                return {"search": [{"id": "Q346250"}]}
+            return {"search": []}
+        entities = {qid: {"id": qid, "claims": {}} for qid in params["ids"].split("|") if qid != "Q0"}
+        entities["Q0"] = {"id": "Q0", "missing": ""}
+        return {"entities": entities}
+
+
+def client(tmp_path, api):
+    wikidata = WikidataClient(tmp_path / "cache.sqlite3", max_workers=4, rate=0)
+    wikidata._get = api
+    return wikidata
+
+
+def test_search_many_is_cached(tmp_path):
+    api = FakeAPI()
+    wikidata = client(tmp_path, api)
+    terms = ["Carducci", "Ada Negri", "Carducci"]
+    assert wikidata.search_many(terms) == {"Carducci": [], "Ada Negri": [{"id": "Q346250"}]}
+    n_calls = len(api.calls)
+    assert n_calls == 3 + 2  # every language for Carducci, fr then it for Ada Negri
+    wikidata.close()
+
+    wikidata = client(tmp_path, api)
+    assert list(wikidata.search_many(reversed(terms))) == ["Carducci", "Ada Negri"]
+    assert len(api.calls) == n_calls
+    assert wikidata.cache_hits == 5
+    wikidata.close()
+
+
+def test_entities_are_cached(tmp_path):
+    api = FakeAPI()
+    wikidata = client(tmp_path, api)
+    entities = wikidata.entities(["Q346250", "Q0", "Q191305", "Q346250"])
+    assert list(entities) == ["Q346250", "Q191305"]  # Q0 is missing
+    assert len(api.calls) == 1
+
+    assert wikidata.entities(["Q0", "Q191305"]) == {"Q191305": entities["Q191305"]}
+    assert len(api.calls) == 1
+    wikidata.close()